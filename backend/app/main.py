@@ -1,15 +1,37 @@
+from contextlib import asynccontextmanager
 from pathlib import Path
 
 from dotenv import load_dotenv
 
 load_dotenv(Path(__file__).resolve().parent.parent / ".env")
 
-from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
+from app.services import startup
 
-from app.routers import convert, translate, library
+# 匯入耗時逐一記錄，可由 /api/health/startup 查看
+with startup.record_import("fastapi"):
+    from fastapi import FastAPI
+    from fastapi.middleware.cors import CORSMiddleware
 
-app = FastAPI(title="PDF Furigana Tool")
+with startup.record_import("app.routers.convert"):
+    from app.routers import convert
+with startup.record_import("app.routers.translate"):
+    from app.routers import translate
+with startup.record_import("app.routers.library"):
+    from app.routers import library
+
+from app.services import furigana_pool
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 重量級套件與 tagger 在背景暖機，/api/health 不必等待
+    startup.start_warmup()
+    startup.mark_ready()
+    yield
+    furigana_pool.shutdown_pool()
+
+
+app = FastAPI(title="PDF Furigana Tool", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -26,3 +48,9 @@ app.include_router(library.router)
 @app.get("/api/health")
 def health_check():
     return {"status": "ok"}
+
+
+@app.get("/api/health/startup")
+def startup_report():
+    """啟動報告：各模組匯入與暖機耗時（毫秒）"""
+    return startup.startup_report()
@@ -1,35 +1,152 @@
-import tempfile
-from pathlib import Path
+import json
+from typing import Iterator, Optional
 
-from fastapi import APIRouter, File, HTTPException, UploadFile
+from fastapi import APIRouter, File, Form, HTTPException, Response, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
 
-from app.services.html_generator import generate_html, generate_html_from_script_txt
-from app.services.pdf_extractor import extract_text_by_pages
+from app.services import convert_cache, furigana, reading_overrides
+from app.services.converter import (
+    OUTPUT_FORMATS,
+    convert_pdf,
+    convert_txt,
+    stream_convert_pdf,
+    stream_convert_txt,
+)
+from app.services.html_generator import (
+    TXT_PAGINATE_MODES,
+    generate_html_from_script_txt,
+    generate_page_html,
+)
+from app.services.pdf_extractor import LAYOUTS, PdfSource, iter_text_by_pages
+from app.services.timing import server_timing
+from app.services.upload_ingest import ingest_pdf_upload, release_pdf_source
 
 router = APIRouter()
 
 
+class ReadingOverride(BaseModel):
+    reading: str
+
+
+class ReadingOverrides(BaseModel):
+    entries: dict[str, str]
+
+
+def _check_layout(layout: str) -> None:
+    if layout not in LAYOUTS:
+        raise HTTPException(status_code=400, detail=f"layout 必須為 {'、'.join(LAYOUTS)}")
+
+
+def _check_paginate(paginate: str, page_lines: Optional[int]) -> None:
+    if paginate not in TXT_PAGINATE_MODES:
+        raise HTTPException(status_code=400, detail=f"paginate 必須為 {'、'.join(TXT_PAGINATE_MODES)}")
+    if page_lines is not None and page_lines < 1:
+        raise HTTPException(status_code=400, detail="page_lines 必須大於 0")
+
+
 @router.post("/convert")
-async def convert_file(file: UploadFile = File(...)):
+async def convert_file(
+    response: Response,
+    file: UploadFile = File(...),
+    layout: str = Form("auto"),
+    first_page: int = Form(1),
+    last_page: Optional[int] = Form(None),
+    output: str = Form("html"),
+    paginate: str = Form("none"),
+    page_lines: Optional[int] = Form(None),
+):
+    """PDF／TXT → 振り仮名。TXT 可用 paginate（none | separator | lines）與
+    page_lines 分成多個虛擬頁面。"""
     if not file.filename:
         raise HTTPException(status_code=400, detail="請選擇檔案")
+    _check_layout(layout)
+    _check_paginate(paginate, page_lines)
+    if output not in OUTPUT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"output 必須為 {'、'.join(OUTPUT_FORMATS)}")
 
     name_lower = file.filename.lower()
 
+    # HTML 輸出以串流回應逐頁送出，整份 HTML 不需同時存在於記憶體中
+    stream = output == "html"
+    metrics: dict = {}
     if name_lower.endswith(".pdf"):
-        with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as tmp:
-            content = await file.read()
-            tmp.write(content)
-            tmp_path = tmp.name
-
+        source = await ingest_pdf_upload(file)
         try:
-            pages = extract_text_by_pages(tmp_path)
-            html = generate_html(pages)
-            return {"html": html, "page_count": len(pages)}
+            if stream:
+                result = await run_in_threadpool(
+                    stream_convert_pdf, source, layout, metrics, first_page, last_page
+                )
+            else:
+                result = await run_in_threadpool(
+                    convert_pdf, source, layout, metrics, first_page, last_page, output
+                )
         except Exception as e:
             raise HTTPException(status_code=400, detail=f"PDF 處理失敗: {str(e)}")
         finally:
-            Path(tmp_path).unlink(missing_ok=True)
+            release_pdf_source(source)
+
+    elif name_lower.endswith(".txt"):
+        content = await file.read()
+        try:
+            if stream:
+                result = await run_in_threadpool(
+                    stream_convert_txt, content, metrics, paginate, page_lines
+                )
+            else:
+                result = await run_in_threadpool(
+                    convert_txt, content, metrics, output, paginate, page_lines
+                )
+        except UnicodeDecodeError:
+            raise HTTPException(status_code=400, detail="TXT 檔案必須為 UTF-8 編碼")
+
+    else:
+        raise HTTPException(status_code=400, detail="只接受 PDF 或 TXT 檔案")
+
+    if stream:
+        # 第一批振り仮名已於回傳前產生並計入 Server-Timing，其餘於串流時產生
+        return StreamingResponse(
+            result, media_type="application/json", headers={"Server-Timing": server_timing(metrics)}
+        )
+    response.headers["Server-Timing"] = server_timing(metrics)
+    return result
+
+
+def _ndjson(event: dict) -> str:
+    return json.dumps(event, ensure_ascii=False) + "\n"
+
+
+def _stream_pdf_pages(source: PdfSource, layout: str) -> Iterator[str]:
+    """逐頁擷取並產生振り仮名 HTML，每頁完成即送出一行 NDJSON"""
+    page_count = 0
+    try:
+        for page in iter_text_by_pages(source, layout=layout):
+            page_count += 1
+            yield _ndjson({"page_num": page["page_num"], "html": generate_page_html(page)})
+        yield _ndjson({"done": True, "page_count": page_count})
+    except Exception as e:
+        yield _ndjson({"error": f"PDF 處理失敗: {str(e)}"})
+    finally:
+        release_pdf_source(source)
+
+
+@router.post("/convert/stream")
+async def convert_file_stream(file: UploadFile = File(...), layout: str = Form("auto")):
+    """串流版 /convert：回傳 NDJSON，每行為一頁 {"page_num", "html"}，
+    最後一行為 {"done": true, "page_count"}；處理中發生錯誤則送出 {"error"}。
+    """
+    if not file.filename:
+        raise HTTPException(status_code=400, detail="請選擇檔案")
+    _check_layout(layout)
+
+    name_lower = file.filename.lower()
+
+    if name_lower.endswith(".pdf"):
+        source = await ingest_pdf_upload(file)
+        return StreamingResponse(
+            _stream_pdf_pages(source, layout), media_type="application/x-ndjson"
+        )
 
     elif name_lower.endswith(".txt"):
         content = await file.read()
@@ -38,8 +155,70 @@ async def convert_file(file: UploadFile = File(...)):
         except UnicodeDecodeError:
             raise HTTPException(status_code=400, detail="TXT 檔案必須為 UTF-8 編碼")
 
-        html = generate_html_from_script_txt(text)
-        return {"html": html, "page_count": 1}
+        def stream_txt() -> Iterator[str]:
+            yield _ndjson({"page_num": 1, "html": generate_html_from_script_txt(text)})
+            yield _ndjson({"done": True, "page_count": 1})
+
+        return StreamingResponse(stream_txt(), media_type="application/x-ndjson")
 
     else:
         raise HTTPException(status_code=400, detail="只接受 PDF 或 TXT 檔案")
+
+
+@router.get("/convert/cache")
+def get_cache_stats():
+    """轉換快取的命中／未命中統計"""
+    return convert_cache.cache_stats()
+
+
+@router.get("/furigana/cache")
+def get_furigana_cache_stats():
+    """振り仮名段落快取、詞素快取與 tagger pool 的統計"""
+    return {
+        **furigana.furigana_cache_stats(),
+        "morphemes": furigana.morpheme_cache_stats(),
+        "taggers": furigana.tagger_pool_stats(),
+    }
+
+
+def _check_override(surface: str, reading: str) -> None:
+    if not surface or not reading:
+        raise HTTPException(status_code=400, detail="詞與讀音皆不可為空")
+
+
+def _overrides_changed() -> None:
+    # 段落與轉換快取的鍵已含詞條雜湊，舊詞條的段落不會再被命中，直接清掉釋放記憶體。
+    # process pool 不在此關閉（會取消其他請求進行中的工作），下次取用時依詞條雜湊重建
+    furigana.clear_furigana_cache()
+
+
+@router.get("/furigana/overrides")
+def list_reading_overrides():
+    """自訂讀音：{表層形: 讀音}"""
+    return reading_overrides.list_overrides()
+
+
+@router.put("/furigana/overrides")
+def replace_reading_overrides(body: ReadingOverrides):
+    """以整份詞條取代現有的自訂讀音（匯入用）"""
+    for surface, reading in body.entries.items():
+        _check_override(surface, reading)
+    reading_overrides.replace_overrides(body.entries)
+    _overrides_changed()
+    return {"count": len(body.entries)}
+
+
+@router.put("/furigana/overrides/{surface}")
+def set_reading_override(surface: str, body: ReadingOverride):
+    _check_override(surface, body.reading)
+    reading_overrides.set_override(surface, body.reading)
+    _overrides_changed()
+    return {"surface": surface, "reading": body.reading}
+
+
+@router.delete("/furigana/overrides/{surface}")
+def delete_reading_override(surface: str):
+    if not reading_overrides.delete_override(surface):
+        raise HTTPException(status_code=404, detail="Override not found")
+    _overrides_changed()
+    return {"ok": True}
@@ -1,13 +1,31 @@
-import tempfile
-from pathlib import Path
+import gzip
 from typing import List, Optional
 
-from fastapi import APIRouter, File, HTTPException, UploadFile
+from fastapi import APIRouter, File, Form, Header, HTTPException, Response, UploadFile
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 
 from app.services import library_service as lib_svc
-from app.services.html_generator import generate_html, generate_html_from_script_txt
-from app.services.pdf_extractor import extract_text_by_pages
+from app.services.converter import (
+    DOCUMENT_FORMATS,
+    convert_pdf,
+    convert_txt_incremental,
+    fragment_version,
+    lazy_page_window,
+    render_lazy_pages,
+    store_document,
+)
+from app.services.furigana import READING_SCRIPTS, RUBY_STYLES
+from app.services.html_generator import (
+    TXT_PAGINATE_MODES,
+    generate_html_from_analysis,
+    generate_html_from_tokens,
+    script_fragments,
+    split_page_sections,
+)
+from app.services.pdf_extractor import LAYOUTS, count_pages
+from app.services.timing import server_timing, timed
+from app.services.upload_ingest import ingest_pdf_upload, release_pdf_source
 
 router = APIRouter(prefix="/api/library", tags=["library"])
 
@@ -50,11 +68,19 @@ class TranslationUpdate(BaseModel):
     translations: dict
 
 
+class RenderOptions(BaseModel):
+    reading: str = "hiragana"
+    ruby: str = "full"
+    known_kanji: str = ""
+    start: Optional[int] = None
+    end: Optional[int] = None
+
+
 # ── Endpoints ─────────────────────────────────────────────────────────────────
 
 @router.get("")
 def get_library():
-    return lib_svc.load_library()
+    return Response(content=lib_svc.library_json(), media_type="application/json")
 
 
 @router.post("/folders")
@@ -119,53 +145,227 @@ def delete_document(doc_id: str):
 
 
 @router.post("/documents/{doc_id}/upload")
-async def upload_document(doc_id: str, file: UploadFile = File(...)):
-    library = lib_svc.load_library()
-    doc = next((d for d in library["documents"] if d["id"] == doc_id), None)
-    if doc is None:
+async def upload_document(
+    doc_id: str,
+    response: Response,
+    file: UploadFile = File(...),
+    layout: str = Form("auto"),
+    first_page: int = Form(1),
+    last_page: Optional[int] = Form(None),
+    lazy: bool = Form(False),
+    output: str = Form("html"),
+    paginate: str = Form("none"),
+    page_lines: Optional[int] = Form(None),
+):
+    """上傳並轉換文件。lazy=true 時（僅 PDF）只保存原始檔與頁數，
+    頁面於 GET /html 時依需求轉換。output="tokens" 時以精簡的 token 格式儲存，
+    GET /tokens 取得原始 token，GET /html 時才轉為 HTML。
+    非 lazy 上傳一律另存斷詞結果，可用 POST /render 以不同選項重新產生 HTML。
+    TXT 可用 paginate（none | separator | lines）與 page_lines 分成多個虛擬頁面，
+    之後以 GET /html 的 start / end 逐段取得。
+    TXT 重新上傳時只有內容改變的行重新斷詞，回應的 fragments 為
+    {"reused": 沿用行數, "regenerated": 重新斷詞行數}。"""
+    if layout not in LAYOUTS:
+        raise HTTPException(status_code=400, detail=f"layout 必須為 {'、'.join(LAYOUTS)}")
+    if output not in DOCUMENT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"output 必須為 {'、'.join(DOCUMENT_FORMATS)}")
+    if paginate not in TXT_PAGINATE_MODES:
+        raise HTTPException(status_code=400, detail=f"paginate 必須為 {'、'.join(TXT_PAGINATE_MODES)}")
+    if page_lines is not None and page_lines < 1:
+        raise HTTPException(status_code=400, detail="page_lines 必須大於 0")
+
+    if lib_svc.get_document(doc_id) is None:
         raise HTTPException(status_code=404, detail="Document not found")
 
     if not file.filename:
         raise HTTPException(status_code=400, detail="請選擇檔案")
 
     name_lower = file.filename.lower()
-    content = await file.read()
 
-    if name_lower.endswith(".pdf"):
-        with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as tmp:
-            tmp.write(content)
-            tmp_path = tmp.name
+    metrics: dict = {}
+    if name_lower.endswith(".pdf") and lazy:
+        source = await ingest_pdf_upload(file)
+        try:
+            page_count = await run_in_threadpool(count_pages, source)
+            updated = await run_in_threadpool(lib_svc.set_document_source, doc_id, source, page_count, layout)
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f"PDF 處理失敗: {e}")
+        finally:
+            release_pdf_source(source)
+        return {**updated, "page_count": page_count}
+    elif name_lower.endswith(".pdf"):
+        source = await ingest_pdf_upload(file)
         try:
-            pages = extract_text_by_pages(tmp_path)
-            html = generate_html(pages)
-            page_count = len(pages)
+            result = await run_in_threadpool(
+                convert_pdf, source, layout, metrics, first_page, last_page, "analysis"
+            )
         except Exception as e:
             raise HTTPException(status_code=400, detail=f"PDF 處理失敗: {e}")
         finally:
-            Path(tmp_path).unlink(missing_ok=True)
+            release_pdf_source(source)
     elif name_lower.endswith(".txt"):
+        content = await file.read()
+        # 重新上傳時沿用上次斷詞結果中內容未改變的行
+        version = fragment_version()
+        keys = await run_in_threadpool(lib_svc.get_document_fragment_keys, doc_id, version)
+        previous = await run_in_threadpool(lib_svc.get_document_analysis, doc_id) if keys else None
+        fragments = await run_in_threadpool(script_fragments, previous, keys) if previous else {}
         try:
-            text = content.decode("utf-8")
+            result = await run_in_threadpool(
+                convert_txt_incremental, content, fragments, metrics, paginate, page_lines
+            )
         except UnicodeDecodeError:
             raise HTTPException(status_code=400, detail="TXT 必須為 UTF-8 編碼")
-        html = generate_html_from_script_txt(text)
-        page_count = 1
     else:
         raise HTTPException(status_code=400, detail="只接受 PDF 或 TXT 檔案")
 
-    updated = lib_svc.set_document_html(doc_id, html)
-    return {**updated, "page_count": page_count}
+    # 斷詞只做一次：由斷詞結果產生 HTML／token 並寫入文件庫，另外保存斷詞結果
+    with timed(metrics, "render"):
+        await run_in_threadpool(store_document, doc_id, result["analysis"], output)
+    response.headers["Server-Timing"] = server_timing(metrics)
+    updated = await run_in_threadpool(lib_svc.save_document_analysis, doc_id, result["analysis"])
+    if "fragment_keys" in result:
+        updated = await run_in_threadpool(
+            lib_svc.save_document_fragment_keys, doc_id, version, result["fragment_keys"]
+        )
+        return {**updated, "page_count": result["page_count"], "fragments": result["fragments"]}
+    return {**updated, "page_count": result["page_count"]}
 
 
 @router.get("/documents/{doc_id}/html")
-def get_document_html(doc_id: str):
+def get_document_html(
+    doc_id: str,
+    start: Optional[int] = None,
+    end: Optional[int] = None,
+    window: bool = False,
+    accept: Optional[str] = Header(None),
+    accept_encoding: Optional[str] = Header(None),
+):
+    """取得文件 HTML。指定 start / end（頁碼，含頭尾）時只回傳該範圍的頁面；
+    延遲轉換的文件，或 window=true 時（例如分頁的 TXT），未指定範圍時回傳
+    lastPage 前後數頁。page_count 一律為總頁數。
+
+    Accept 含 text/html 且未指定範圍時，儲存為 HTML 的文件直接以 text/html 回傳
+    儲存的檔案（同 GET /html/raw，壓縮檔原樣以 Content-Encoding: gzip 送出）；
+    其餘情況回傳 JSON。"""
+    doc = lib_svc.get_document(doc_id)
+    if (
+        start is None and end is None and not window
+        and "text/html" in (accept or "")
+        and doc is not None and not doc.get("lazy") and not doc.get("tokensFile")
+    ):
+        stored = lib_svc.get_document_stored(doc_id, "htmlFile")
+        if stored is None:
+            raise HTTPException(status_code=404, detail="Document HTML not found")
+        response = _stored_response(stored, accept_encoding, "text/html; charset=utf-8")
+        response.headers["Vary"] = "Accept, Accept-Encoding"
+        return response
+    if doc is not None and doc.get("lazy"):
+        start, end = lazy_page_window(doc, start, end)
+        html = render_lazy_pages(doc, start, end)
+        return {"html": html, "page_count": doc["pageCount"], "start": start, "end": end}
+    if doc is not None and doc.get("tokensFile"):
+        tokens = lib_svc.get_document_tokens(doc_id)
+        if tokens is None:
+            raise HTTPException(status_code=404, detail="Document HTML not found")
+        page_count = len(tokens["pages"])
+        if window and start is None and end is None:
+            start, end = lazy_page_window({**doc, "pageCount": page_count})
+        html = generate_html_from_tokens(tokens, start, end)
+        if start is None and end is None:
+            return {"html": html, "page_count": page_count}
+        return {"html": html, "page_count": page_count, "start": start or 1, "end": end or page_count}
+
     html = lib_svc.get_document_html(doc_id)
     if html is None:
         raise HTTPException(status_code=404, detail="Document HTML not found")
     page_count = html.count('<section class="page"')
     if page_count == 0:
         page_count = 1
-    return {"html": html, "page_count": page_count}
+    if window and start is None and end is None and doc is not None:
+        start, end = lazy_page_window({**doc, "pageCount": page_count})
+    if start is None and end is None:
+        return {"html": html, "page_count": page_count}
+
+    start, end = start or 1, end or page_count
+    sections = [sec for num, sec in split_page_sections(html) if start <= num <= end]
+    return {"html": "\n".join(sections), "page_count": page_count, "start": start, "end": end}
+
+
+@router.post("/documents/{doc_id}/render")
+def render_document_html(doc_id: str, body: RenderOptions):
+    """以不同呈現選項從保存的斷詞結果重新產生 HTML（不重新斷詞、不覆寫文件）。
+
+    reading: hiragana | katakana；ruby: full | simple | paren | none；
+    known_kanji: 已會的漢字（詞中漢字皆已會時不標讀音）；start / end: 頁碼範圍
+    """
+    if body.reading not in READING_SCRIPTS:
+        raise HTTPException(status_code=400, detail=f"reading 必須為 {'、'.join(READING_SCRIPTS)}")
+    if body.ruby not in RUBY_STYLES:
+        raise HTTPException(status_code=400, detail=f"ruby 必須為 {'、'.join(RUBY_STYLES)}")
+    analysis = lib_svc.get_document_analysis(doc_id)
+    if analysis is None:
+        raise HTTPException(status_code=404, detail="Document analysis not found")
+    html = generate_html_from_analysis(
+        analysis, body.start, body.end,
+        reading=body.reading, ruby=body.ruby, known_kanji=body.known_kanji,
+    )
+    return {"html": html, "page_count": len(analysis["pages"])}
+
+
+def _accepts_gzip(accept_encoding: Optional[str]) -> bool:
+    """明確列出的 gzip 優先於萬用字元 *，與兩者在標頭中的順序無關"""
+    qualities = {}
+    for item in (accept_encoding or "").split(","):
+        coding, _, params = item.strip().partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities.setdefault(coding.strip().lower(), quality)
+    return qualities.get("gzip", qualities.get("*", 0.0)) > 0
+
+
+def _stored_response(
+    stored: Optional[tuple[bytes, Optional[str]]], accept_encoding: Optional[str], media_type: str
+) -> Response:
+    """壓縮儲存的內容在客戶端接受 gzip 時原樣送出（不解壓縮再壓縮），否則解壓縮"""
+    content, encoding = stored
+    headers = {"Vary": "Accept-Encoding"}
+    if encoding == "gzip":
+        if _accepts_gzip(accept_encoding):
+            headers["Content-Encoding"] = "gzip"
+        else:
+            content = gzip.decompress(content)
+    return Response(content=content, media_type=media_type, headers=headers)
+
+
+@router.get("/documents/{doc_id}/tokens")
+def get_document_tokens(doc_id: str, accept_encoding: Optional[str] = Header(None)):
+    """取得以 token 格式儲存的文件（原始 JSON，不重新序列化）"""
+    stored = lib_svc.get_document_stored(doc_id, "tokensFile")
+    if stored is None:
+        raise HTTPException(status_code=404, detail="Document tokens not found")
+    return _stored_response(stored, accept_encoding, "application/json")
+
+
+@router.get("/documents/{doc_id}/html/raw")
+def get_document_html_raw(doc_id: str, accept_encoding: Optional[str] = Header(None)):
+    """以 text/html 取得儲存的完整 HTML；壓縮儲存的檔案直接以 Content-Encoding: gzip 送出"""
+    stored = lib_svc.get_document_stored(doc_id, "htmlFile")
+    if stored is None:
+        raise HTTPException(status_code=404, detail="Document HTML not found")
+    return _stored_response(stored, accept_encoding, "text/html; charset=utf-8")
+
+
+@router.post("/migrate/compress")
+def migrate_compressed_documents():
+    """將既有未壓縮的文件檔案改存為 gzip"""
+    return {"migrated": lib_svc.migrate_compressed_documents()}
 
 
 @router.patch("/documents/{doc_id}/translations")
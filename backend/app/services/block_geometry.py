@@ -0,0 +1,155 @@
+"""以 NumPy 陣列處理頁面 block 幾何運算的版面重建引擎。
+
+輸入為 page.get_text("blocks") 中的文字 block，輸出段落與
+pdf_extractor._extract_vertical / _extract_horizontal 完全相同，
+但分行、分欄、間距判斷與平均高度都以向量運算完成，適合 block 數量龐大的頁面
+（例如小字級的字幕傾印）。
+"""
+import numpy as np
+
+COLUMN_THRESHOLD = 20  # px：x0 差距在此範圍內視為同一欄（同 _extract_vertical）
+
+
+def load_blocks(text_blocks: list) -> tuple[np.ndarray, list[str]]:
+    """將 block tuple 轉為 (n, 4) 座標陣列與對應文字列表"""
+    coords = np.array([b[:4] for b in text_blocks], dtype=np.float64).reshape(-1, 4)
+    texts = [b[4] for b in text_blocks]
+    return coords, texts
+
+
+def _sequential_mean(values: np.ndarray) -> float:
+    # cumsum 逐項累加，與 Python sum() 的浮點結果一致（np.sum 為 pairwise，會有誤差）
+    return float(np.cumsum(values)[-1] / len(values))
+
+
+def _line_count(text: str) -> int:
+    """非空行數，等同 len([ln for ln in text.strip().split("\n") if ln])"""
+    text = text.strip()
+    if not text:
+        return 0
+    if "\n\n" not in text:
+        return text.count("\n") + 1
+    return sum(1 for ln in text.split("\n") if ln)
+
+
+def avg_char_height(coords: np.ndarray, texts: list[str]) -> float:
+    """縦書き平均字高：block 高度 ÷ 非空行數"""
+    line_counts = np.array([_line_count(t) for t in texts], dtype=np.float64)
+    mask = line_counts > 0
+    if not mask.any():
+        return 14.0
+    heights = (coords[mask, 3] - coords[mask, 1]) / line_counts[mask]
+    return _sequential_mean(heights)
+
+
+def avg_block_height(coords: np.ndarray) -> float:
+    """橫書き平均 block 高度（忽略高度 ≤ 0 的 block）"""
+    heights = coords[:, 3] - coords[:, 1]
+    heights = heights[heights > 0]
+    if not len(heights):
+        return 12.0
+    return _sequential_mean(heights)
+
+
+def _group_bounds(breaks: np.ndarray, n: int) -> tuple[list[int], list[int]]:
+    """breaks[i] 為 True 表示第 i+1 個元素開始新群組，回傳各群組 [start, end)"""
+    starts = np.concatenate(([0], np.flatnonzero(breaks) + 1))
+    ends = np.append(starts[1:], n)
+    return starts.tolist(), ends.tolist()
+
+
+def _join_groups(cleaned: list[str], order: list[int], starts: list[int], ends: list[int]) -> list[str]:
+    return ["".join(cleaned[j] for j in order[a:b]) for a, b in zip(starts, ends)]
+
+
+def extract_vertical(coords: np.ndarray, texts: list[str], avg_char_h: float) -> list[str]:
+    """縦書き：右欄優先、欄內由上到下，欄內間距 ≤ 平均字高即合併"""
+    n = len(texts)
+    if n == 0:
+        return []
+    x0, y0, y1 = coords[:, 0], coords[:, 1], coords[:, 3]
+
+    # 右欄優先（x 降序），同欄內由上到下（y 升序）
+    order = np.lexsort((y0, -x0))
+    sx0 = x0[order]
+    neg_x0 = -sx0
+
+    # 依欄首 x0 分欄：欄內 x0 單調遞減，以 searchsorted 找下一欄起點
+    col_ids = np.empty(n, dtype=np.int64)
+    start, col = 0, 0
+    while start < n:
+        ref = sx0[start]
+        end = int(np.searchsorted(neg_x0, neg_x0[start] + COLUMN_THRESHOLD, side="right"))
+        # searchsorted 的比較式與原本的 abs(x0 - ref) <= 20 可能差一個浮點誤差，逐步校正
+        end = max(end, start + 1)
+        while end > start + 1 and abs(sx0[end - 1] - ref) > COLUMN_THRESHOLD:
+            end -= 1
+        while end < n and abs(sx0[end] - ref) <= COLUMN_THRESHOLD:
+            end += 1
+        col_ids[start:end] = col
+        start, col = end, col + 1
+
+    # 同欄內依 y0 升序（穩定排序，保留原本同 y0 的先後）
+    within = np.lexsort((y0[order], col_ids))
+    order = order[within]
+    col_ids = col_ids[within]
+    sy0, sy1 = y0[order], y1[order]
+
+    gaps = sy0[1:] - sy1[:-1]
+    breaks = (col_ids[1:] != col_ids[:-1]) | (gaps > avg_char_h)
+    starts, ends = _group_bounds(breaks, n)
+
+    cleaned = [t.strip().replace("\n", "") for t in texts]
+    return [text for text in _join_groups(cleaned, order.tolist(), starts, ends) if text]
+
+
+def extract_horizontal(coords: np.ndarray, texts: list[str], avg_height: float) -> list[str]:
+    """橫書き：合併 Y 重疊的 block 為同一行，再依行距分段"""
+    n = len(texts)
+    if n == 0:
+        return []
+    order = np.lexsort((coords[:, 0], coords[:, 1]))
+    sx0 = coords[order, 0]
+    sy0 = coords[order, 1]
+    sy1 = coords[order, 3]
+
+    if np.any(sy1 <= sy0):
+        # 高度 ≤ 0 的 block 會讓「群組起點」影響分行結果，無法向量化，交回逐一比對
+        from app.services.pdf_extractor import _extract_horizontal
+        blocks = [(*coords[i].tolist(), texts[i]) for i in range(n)]
+        return _extract_horizontal(blocks, avg_height)
+
+    # y0 已排序，因此「與目前行重疊」等價於 y0 < 之前所有 block 的 y1 最大值
+    running_y1 = np.maximum.accumulate(sy1)
+    breaks = sy0[1:] >= running_y1[:-1]
+    starts, ends = _group_bounds(breaks, n)
+
+    # 行內依 x0 排序（穩定排序）
+    line_ids = np.repeat(np.arange(len(starts)), np.subtract(ends, starts))
+    within = np.lexsort((sx0, line_ids))
+    line_order = order[within]
+
+    cleaned = [t.strip().replace("\n", "") for t in texts]
+    line_texts = _join_groups(cleaned, line_order.tolist(), starts, ends)
+    line_y0 = sy0[starts]
+    line_y1 = np.maximum.reduceat(sy1, starts)
+
+    keep = np.array([bool(t) for t in line_texts])
+    if not keep.any():
+        return []
+    line_texts = [t for t in line_texts if t]
+    line_y0, line_y1 = line_y0[keep], line_y1[keep]
+
+    gap_threshold = avg_height * 0.5
+    para_breaks = (line_y0[1:] - line_y1[:-1]) > gap_threshold
+    p_starts, p_ends = _group_bounds(para_breaks, len(line_texts))
+    paragraphs = ["".join(line_texts[a:b]) for a, b in zip(p_starts, p_ends)]
+    return [p for p in paragraphs if p]
+
+
+def extract_paragraphs(text_blocks: list, vertical: bool) -> list[str]:
+    """以向量化引擎重建單頁段落（含平均高度計算）"""
+    coords, texts = load_blocks(text_blocks)
+    if vertical:
+        return extract_vertical(coords, texts, avg_char_height(coords, texts))
+    return extract_horizontal(coords, texts, avg_block_height(coords))
@@ -0,0 +1,173 @@
+import hashlib
+import importlib.util
+import json
+import os
+import shutil
+import threading
+import uuid
+from contextlib import contextmanager
+from importlib import metadata
+from pathlib import Path
+from typing import Callable, Iterator, Optional
+
+from app.services.library_service import DATA_DIR
+from app.services.pdf_extractor import PdfSource
+
+# 轉換結果快取：以上傳內容的 SHA-256 為鍵，存放於 DATA_DIR/cache/<版本>/
+CACHE_DIR = DATA_DIR / "cache"
+CACHE_MAX_BYTES = int(os.getenv("CONVERT_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+# 影響轉換結果的模組：原始碼一變動，快取版本就跟著改變
+# （只讀取原始檔，不匯入模組，避免為了算版本而載入 NumPy 等套件）
+_VERSIONED_MODULES = (
+    "app.services.pdf_extractor",
+    "app.services.block_geometry",
+    "app.services.furigana",
+    "app.services.reading_overrides",
+    "app.services.tokenizers",
+    "app.services.html_generator",
+)
+_VERSIONED_PACKAGES = ("PyMuPDF", "fugashi", "unidic-lite", "janome", "SudachiPy", "SudachiDict-core")
+
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "evictions": 0}
+_version: Optional[str] = None
+
+
+def cache_version() -> str:
+    """由擷取／振り仮名相關原始碼與套件版本組成的版本鍵"""
+    global _version
+    if _version is None:
+        digest = hashlib.sha256()
+        for module in _VERSIONED_MODULES:
+            digest.update(Path(importlib.util.find_spec(module).origin).read_bytes())
+        for package in _VERSIONED_PACKAGES:
+            try:
+                digest.update(f"{package}={metadata.version(package)}".encode())
+            except metadata.PackageNotFoundError:
+                digest.update(f"{package}=?".encode())
+        _version = digest.hexdigest()[:16]
+    return _version
+
+
+def _hash_source(source: PdfSource) -> str:
+    digest = hashlib.sha256()
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        digest.update(source)
+    else:
+        with open(source, "rb") as f:
+            while chunk := f.read(1024 * 1024):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+def make_key(source: PdfSource, **params) -> str:
+    """內容雜湊 + 轉換參數（kind、layout 等）組成快取鍵"""
+    options = json.dumps(params, sort_keys=True)
+    return hashlib.sha256(f"{_hash_source(source)}:{options}".encode()).hexdigest()
+
+
+def _entry_path(key: str) -> Path:
+    return CACHE_DIR / cache_version() / f"{key}.json"
+
+
+def _temp_path(path: Path) -> Path:
+    """同一項目的暫存檔名也不重複：串流產生器可能在不同（或同一）執行緒上交錯執行"""
+    return path.with_name(f"{path.stem}.{uuid.uuid4().hex}.tmp")
+
+
+def get(key: str) -> Optional[dict]:
+    """讀取快取；命中時更新 mtime 作為 LRU 的最近使用時間"""
+    path = _entry_path(key)
+    try:
+        result = json.loads(path.read_text(encoding="utf-8"))
+        os.utime(path)
+    except (OSError, ValueError):
+        with _lock:
+            _stats["misses"] += 1
+        return None
+    with _lock:
+        _stats["hits"] += 1
+    return result
+
+
+def put(key: str, result: dict) -> None:
+    """寫入快取，並清除舊版本目錄、依 LRU 淘汰超出 CACHE_MAX_BYTES 的項目"""
+    path = _entry_path(key)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = _temp_path(path)
+    tmp.write_text(json.dumps(result, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp, path)
+    with _lock:
+        _purge_old_versions()
+        _evict()
+
+
+@contextmanager
+def stream_writer(key: str) -> Iterator[Callable[[str], object]]:
+    """逐段寫入快取項目（內容須為完整的 JSON 物件文字）：
+
+        with stream_writer(key) as write:
+            for chunk in chunks:
+                write(chunk)
+
+    區塊正常結束才放入快取；中途發生例外（包括串流被中斷）時丟棄暫存檔。
+    """
+    path = _entry_path(key)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = _temp_path(path)
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            yield f.write
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+    os.replace(tmp, path)
+    with _lock:
+        _purge_old_versions()
+        _evict()
+
+
+def _purge_old_versions() -> None:
+    for child in CACHE_DIR.iterdir():
+        if child.is_dir() and child.name != cache_version():
+            shutil.rmtree(child, ignore_errors=True)
+
+
+def _entries() -> list[tuple[Path, os.stat_result]]:
+    version_dir = CACHE_DIR / cache_version()
+    if not version_dir.exists():
+        return []
+    return [(p, p.stat()) for p in version_dir.glob("*.json")]
+
+
+def _evict() -> None:
+    entries = sorted(_entries(), key=lambda e: e[1].st_mtime)
+    total = sum(st.st_size for _, st in entries)
+    for path, st in entries:
+        if total <= CACHE_MAX_BYTES:
+            break
+        path.unlink(missing_ok=True)
+        total -= st.st_size
+        _stats["evictions"] += 1
+
+
+def cache_stats() -> dict:
+    """命中／未命中／淘汰次數，以及目前項目數與佔用大小"""
+    with _lock:
+        entries = _entries()
+        return {
+            **_stats,
+            "entries": len(entries),
+            "bytes": sum(st.st_size for _, st in entries),
+            "max_bytes": CACHE_MAX_BYTES,
+            "version": cache_version(),
+        }
+
+
+def clear() -> None:
+    """清空快取與統計（測試與維護用）"""
+    with _lock:
+        shutil.rmtree(CACHE_DIR, ignore_errors=True)
+        for name in _stats:
+            _stats[name] = 0
@@ -0,0 +1,316 @@
+import itertools
+import json
+import os
+from typing import Iterator, Optional
+
+from app.services import convert_cache
+from app.services import library_service as lib_svc
+from app.services import reading_overrides, tokenizers
+from app.services.html_generator import (
+    TXT_PAGE_LINES,
+    analysis_to_token_document,
+    generate_analysis,
+    generate_analysis_from_script_txt,
+    generate_html,
+    generate_html_from_script_txt,
+    generate_page_html,
+    generate_tokens,
+    generate_tokens_from_script_txt,
+    iter_html,
+    iter_html_from_analysis,
+    iter_html_from_script_txt,
+    regenerate_analysis_from_script_txt,
+    script_line_keys,
+    script_page_count,
+)
+from app.services.pdf_extractor import PdfSource, extract_text_by_pages
+from app.services.timing import timed
+
+# 延遲轉換模式下，未指定範圍時以 lastPage 為中心前後各轉換幾頁
+LAZY_PAGE_WINDOW = int(os.getenv("LAZY_PAGE_WINDOW", "5"))
+# 輸出格式：ruby HTML、精簡的 token 格式（見 html_generator.generate_tokens），
+# 或完整的斷詞結果（見 html_generator.generate_analysis）
+OUTPUT_FORMATS = ("html", "tokens", "analysis")
+# 文件庫可儲存的格式（斷詞結果一律另外保存）
+DOCUMENT_FORMATS = ("html", "tokens")
+
+_PAGE_RENDERERS = {"html": generate_html, "tokens": generate_tokens, "analysis": generate_analysis}
+_SCRIPT_RENDERERS = {
+    "html": generate_html_from_script_txt,
+    "tokens": generate_tokens_from_script_txt,
+    "analysis": generate_analysis_from_script_txt,
+}
+
+
+def _pdf_key(
+    source: PdfSource, layout: str, first_page: int, last_page: Optional[int], output: str
+) -> str:
+    return convert_cache.make_key(
+        source, kind="pdf", layout=layout, first_page=first_page, last_page=last_page,
+        output=output, overrides=reading_overrides.fingerprint(),
+        tokenizer=tokenizers.active_backend(),
+    )
+
+
+def _txt_key(content: bytes, output: str, paginate: str, page_lines: Optional[int]) -> str:
+    return convert_cache.make_key(
+        content, kind="txt", output=output, overrides=reading_overrides.fingerprint(),
+        tokenizer=tokenizers.active_backend(), paginate=paginate,
+        page_lines=(page_lines or TXT_PAGE_LINES) if paginate == "lines" else None,
+    )
+
+
+def convert_pdf(
+    source: PdfSource,
+    layout: str = "auto",
+    metrics: Optional[dict] = None,
+    first_page: int = 1,
+    last_page: Optional[int] = None,
+    output: str = "html",
+) -> dict:
+    """PDF → 振り仮名 HTML。相同內容與參數命中快取時略過擷取與振り仮名。
+
+    Args:
+        source: PDF 檔案路徑或 bytes
+        layout: "auto" | "vertical" | "horizontal"
+        metrics: 若提供，寫入各階段耗時（毫秒），供 Server-Timing 使用
+        first_page / last_page: 只轉換此頁碼範圍（1-based，含頭尾）
+        output: OUTPUT_FORMATS 之一；結果放在同名欄位（"html" / "tokens" / "analysis"）
+
+    Returns:
+        {"html": str, "page_count": 轉換頁數, "total_pages": PDF 總頁數,
+         "layout": str, "cached": bool}
+    """
+    metrics = {} if metrics is None else metrics
+    with timed(metrics, "cache"):
+        key = _pdf_key(source, layout, first_page, last_page, output)
+        cached = convert_cache.get(key)
+    if cached is not None:
+        return {**cached, "cached": True}
+
+    stats: dict = {}
+    with timed(metrics, "extract"):
+        pages = extract_text_by_pages(
+            source, layout=layout, stats=stats, first_page=first_page, last_page=last_page
+        )
+    metrics["layout"] = stats["detect_ms"]
+    with timed(metrics, "furigana"):
+        rendered = _PAGE_RENDERERS[output](pages)
+
+    result = {
+        output: rendered,
+        "page_count": len(pages),
+        "total_pages": stats["total_pages"],
+        "layout": stats["layout"],
+    }
+    convert_cache.put(key, result)
+    return {**result, "cached": False}
+
+
+def convert_txt(
+    content: bytes,
+    metrics: Optional[dict] = None,
+    output: str = "html",
+    paginate: str = "none",
+    page_lines: Optional[int] = None,
+) -> dict:
+    """UTF-8 TXT 腳本 → 振り仮名 HTML（解碼失敗時拋出 UnicodeDecodeError）。
+
+    Args:
+        paginate / page_lines: 虛擬分頁方式，見 html_generator.generate_html_from_script_txt
+
+    Returns:
+        {"html": str, "page_count": int, "cached": bool}
+        （結果欄位名稱同 output，見 convert_pdf）
+    """
+    metrics = {} if metrics is None else metrics
+    text = content.decode("utf-8")
+    with timed(metrics, "cache"):
+        key = _txt_key(content, output, paginate, page_lines)
+        cached = convert_cache.get(key)
+    if cached is not None:
+        return {**cached, "cached": True}
+
+    with timed(metrics, "furigana"):
+        result = {
+            output: _SCRIPT_RENDERERS[output](text, paginate, page_lines),
+            "page_count": script_page_count(text, paginate, page_lines),
+        }
+
+    convert_cache.put(key, result)
+    return {**result, "cached": False}
+
+
+def fragment_version() -> str:
+    """片段表的版本：斷詞相關原始碼、斷詞後端或自訂讀音改變時，舊片段不再沿用"""
+    return f"{convert_cache.cache_version()}:{tokenizers.active_backend()}:{reading_overrides.fingerprint()}"
+
+
+def convert_txt_incremental(
+    content: bytes,
+    fragments: dict[str, list],
+    metrics: Optional[dict] = None,
+    paginate: str = "none",
+    page_lines: Optional[int] = None,
+) -> dict:
+    """convert_txt(output="analysis") 的增量版本：fragments 中已有的行不重新斷詞。
+
+    Args:
+        content: UTF-8 TXT 腳本（解碼失敗時拋出 UnicodeDecodeError）
+        fragments: {line_key: 詞素列表}，見 html_generator.script_fragments
+        paginate / page_lines: 虛擬分頁方式，見 convert_txt
+
+    Returns:
+        {"analysis": dict, "page_count": int, "cached": bool,
+         "fragment_keys": 各日文行的 line_key,
+         "fragments": {"reused": 沿用行數, "regenerated": 重新斷詞行數}}
+        （轉換快取命中時所有行都算沿用）
+    """
+    metrics = {} if metrics is None else metrics
+    text = content.decode("utf-8")
+    with timed(metrics, "cache"):
+        key = _txt_key(content, "analysis", paginate, page_lines)
+        cached = convert_cache.get(key)
+    if cached is not None:
+        keys = script_line_keys(text)
+        counts = {"reused": len(keys), "regenerated": 0}
+        return {**cached, "cached": True, "fragment_keys": keys, "fragments": counts}
+
+    with timed(metrics, "furigana"):
+        analysis, keys, counts = regenerate_analysis_from_script_txt(
+            text, fragments, paginate, page_lines
+        )
+    result = {"analysis": analysis, "page_count": len(analysis["pages"])}
+    convert_cache.put(key, result)
+    return {**result, "cached": False, "fragment_keys": keys, "fragments": counts}
+
+
+def _json_chunks(head: dict, fragments: Iterator[str]) -> Iterator[str]:
+    """{**head, "html": "".join(fragments), "cached": false} 的 JSON 文字，逐段產生"""
+    yield json.dumps(head, ensure_ascii=False)[:-1] + ', "html": "'
+    for fragment in fragments:
+        yield json.dumps(fragment, ensure_ascii=False)[1:-1]
+    yield '", "cached": false}'
+
+
+def _stream_result(key: str, head: dict, fragments: Iterator[str], metrics: dict) -> Iterator[str]:
+    """先產生第一批振り仮名 HTML 再回傳串流：大部分錯誤（tagger 載入、斷詞失敗）在
+    回應送出前就會拋出，呼叫端仍可回傳錯誤狀態碼。metrics["furigana"] 為第一批的耗時，
+    文字量不超過 HTML_STREAM_BATCH_CHARS 的文件即為全部的振り仮名時間。"""
+    fragments = iter(fragments)
+    with timed(metrics, "furigana"):
+        first = next(fragments, None)
+    return _write_stream(key, head, itertools.chain(() if first is None else (first,), fragments))
+
+
+def _write_stream(key: str, head: dict, fragments: Iterator[str]) -> Iterator[str]:
+    # 送出的 JSON 同時寫入轉換快取（"cached" 欄位於讀取時覆寫）
+    try:
+        with convert_cache.stream_writer(key) as write:
+            for chunk in _json_chunks(head, fragments):
+                write(chunk)
+                yield chunk
+    except Exception as e:
+        # 狀態碼已送出：結束 html 字串並以 "error" 欄位回報，回應仍是完整的 JSON（不寫入快取）
+        error = json.dumps(f"振り仮名處理失敗: {e}", ensure_ascii=False)
+        yield f'", "error": {error}, "cached": false}}'
+
+
+def _cached_json(cached: dict) -> Iterator[str]:
+    yield json.dumps({**cached, "cached": True}, ensure_ascii=False)
+
+
+def stream_convert_pdf(
+    source: PdfSource,
+    layout: str = "auto",
+    metrics: Optional[dict] = None,
+    first_page: int = 1,
+    last_page: Optional[int] = None,
+) -> Iterator[str]:
+    """convert_pdf(output="html") 的串流版：回傳 JSON 文字片段的 iterator，
+    解析後與 convert_pdf 的結果相同。
+
+    快取查詢、文字擷取與第一批振り仮名在呼叫時完成（失敗時直接拋出），其餘
+    振り仮名 HTML 於迭代時逐批產生，整份 HTML 不會同時存在於記憶體中。
+    """
+    metrics = {} if metrics is None else metrics
+    with timed(metrics, "cache"):
+        key = _pdf_key(source, layout, first_page, last_page, "html")
+        cached = convert_cache.get(key)
+    if cached is not None:
+        return _cached_json(cached)
+
+    stats: dict = {}
+    with timed(metrics, "extract"):
+        pages = extract_text_by_pages(
+            source, layout=layout, stats=stats, first_page=first_page, last_page=last_page
+        )
+    metrics["layout"] = stats["detect_ms"]
+    head = {"page_count": len(pages), "total_pages": stats["total_pages"], "layout": stats["layout"]}
+    return _stream_result(key, head, iter_html(pages), metrics)
+
+
+def stream_convert_txt(
+    content: bytes,
+    metrics: Optional[dict] = None,
+    paginate: str = "none",
+    page_lines: Optional[int] = None,
+) -> Iterator[str]:
+    """convert_txt(output="html") 的串流版（解碼失敗時直接拋出 UnicodeDecodeError）"""
+    metrics = {} if metrics is None else metrics
+    text = content.decode("utf-8")
+    with timed(metrics, "cache"):
+        key = _txt_key(content, "html", paginate, page_lines)
+        cached = convert_cache.get(key)
+    if cached is not None:
+        return _cached_json(cached)
+    head = {"page_count": script_page_count(text, paginate, page_lines)}
+    return _stream_result(key, head, iter_html_from_script_txt(text, paginate, page_lines), metrics)
+
+
+def store_document(doc_id: str, analysis: dict, output: str) -> Optional[dict]:
+    """由斷詞結果產生文件內容並存入文件庫：token 格式，或逐頁串流寫入檔案的 HTML"""
+    if output == "tokens":
+        return lib_svc.set_document_tokens(doc_id, analysis_to_token_document(analysis))
+    return lib_svc.set_document_html(doc_id, iter_html_from_analysis(analysis))
+
+
+def lazy_page_window(doc: dict, start: Optional[int] = None, end: Optional[int] = None) -> tuple[int, int]:
+    """決定延遲轉換文件要回傳的頁碼範圍；未指定時為 lastPage ± LAZY_PAGE_WINDOW。
+    只指定 start 或 end 其中之一時，另一端同樣只延伸 2 * LAZY_PAGE_WINDOW 頁，
+    不會一次轉換其後（或其前）的所有頁面。"""
+    total = doc["pageCount"]
+    if start is None and end is None:
+        center = max(doc.get("lastPage") or 1, 1)
+        start, end = center - LAZY_PAGE_WINDOW, center + LAZY_PAGE_WINDOW
+    elif end is None:
+        end = start + 2 * LAZY_PAGE_WINDOW
+    elif start is None:
+        start = end - 2 * LAZY_PAGE_WINDOW
+    start = min(max(start or 1, 1), max(total, 1))
+    end = max(min(total if end is None else end, total), start - 1)  # end < start 表示空範圍
+    return start, end
+
+
+def render_lazy_pages(doc: dict, start: int, end: int) -> str:
+    """延遲轉換：回傳第 start ~ end 頁的 HTML。
+
+    已轉換過的頁面直接讀取，其餘只擷取缺少的頁碼範圍並存起來供之後使用。
+    """
+    page_nums = range(start, end + 1)
+    sections = lib_svc.load_page_html(doc["id"], page_nums)
+    missing = [n for n in page_nums if n not in sections]
+    if missing:
+        pages = extract_text_by_pages(
+            lib_svc.document_source_path(doc["id"]),
+            layout=doc.get("layout", "auto"),
+            first_page=missing[0],
+            last_page=missing[-1],
+        )
+        for page in pages:
+            if page["page_num"] in sections:
+                continue
+            html = generate_page_html(page)
+            lib_svc.save_page_html(doc["id"], page["page_num"], html)
+            sections[page["page_num"]] = html
+    return "\n".join(sections[n] for n in page_nums)
@@ -1,38 +1,476 @@
+import os
 import re
+import sys
+import threading
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Callable, Iterable, Iterator, Optional
 
-import fugashi
+from app.services import reading_overrides, tokenizers
 
-_tagger = fugashi.Tagger()
+# 主 tagger 於第一次使用（或啟動暖機）時才建立，見 get_tagger
+_tagger = None
+_tagger_init_lock = threading.Lock()
+
+# tagger pool：MeCab 實例不可跨執行緒共用，每次斷詞從池中借出一個，
+# 不足時以 _tagger_factory 建立新實例，總數不超過 FURIGANA_TAGGER_POOL_SIZE。
+# 預設使用 FURIGANA_TOKENIZER 指定的斷詞後端（見 tokenizers）。
+# 池只保證執行緒安全並限制實例數（記憶體）；斷詞持有 GIL，並行的轉換請求
+# 不會因此用到多核心，大型文件的平行斷詞由 furigana_pool 的 process pool 負責
+FURIGANA_TAGGER_POOL_SIZE = int(os.getenv("FURIGANA_TAGGER_POOL_SIZE", "4"))
+
+_tagger_factory: Optional[Callable[[], object]] = tokenizers.backend_factory(
+    tokenizers.FURIGANA_TOKENIZER
+)
+_pool_cond = threading.Condition()
+_idle_taggers: list = []
+_tagger_count = 0
+_tagger_generation = 0
+_tagger_waits = 0
+
+# 段落層級快取：腳本中重複的台詞、角色名、SE/BGM 提示不必重新斷詞
+FURIGANA_CACHE_SIZE = int(os.getenv("FURIGANA_CACHE_SIZE", "4096"))
+
+_cache_lock = threading.Lock()
+_dictionary_key_for: tuple = (None, ())
+
+# 詞素層級快取：(表層形, 讀音) → 完成的 ruby 片段，以估計佔用位元組數設上限
+FURIGANA_MORPHEME_CACHE_BYTES = int(
+    os.getenv("FURIGANA_MORPHEME_CACHE_BYTES", str(8 * 1024 * 1024))
+)
+
+_morphemes: dict[tuple[str, str], str] = {}
+_morpheme_lock = threading.Lock()
+_morpheme_stats = {"hits": 0, "misses": 0, "evictions": 0, "bytes": 0}
+
+_KANJI_RE = re.compile(r"[\u4e00-\u9fff]")
+_KATA_TO_HIRA = str.maketrans(
+    {chr(c): chr(c - 0x60) for c in range(ord("\u30a1"), ord("\u30f6") + 1)}
+)
+_HIRA_TO_KATA = str.maketrans(
+    {chr(c): chr(c + 0x60) for c in range(ord("\u3041"), ord("\u3096") + 1)}
+)
+
+# 斷詞結果中來自自訂讀音（reading_overrides）的詞素所標的品詞
+OVERRIDE_POS = "override"
+
+# 每個執行緒一個輸出緩衝區，批次處理時重複使用，不必每段落配置新 list
+_buffers = threading.local()
 
 
 def contains_kanji(text: str) -> bool:
     """判斷文字中是否包含漢字"""
-    return bool(re.search(r"[\u4e00-\u9fff]", text))
+    return _KANJI_RE.search(text) is not None
 
 
 def kata_to_hira(text: str) -> str:
     """片假名轉平假名"""
-    return "".join(
-        chr(ord(c) - 0x60) if "\u30a1" <= c <= "\u30f6" else c for c in text
-    )
+    return text.translate(_KATA_TO_HIRA)
+
+
+def get_tagger():
+    """取得主 tagger，第一次呼叫時建立並放入 tagger pool"""
+    global _tagger, _tagger_count
+    if _tagger is None:
+        with _tagger_init_lock:
+            if _tagger is None:
+                tagger = _tagger_factory()
+                with _pool_cond:
+                    _idle_taggers.append(tagger)
+                    _tagger_count += 1
+                    _pool_cond.notify()
+                _tagger = tagger
+    return _tagger
+
+
+@contextmanager
+def _checkout_tagger() -> Iterator[object]:
+    """借出一個 tagger；池已滿且無閒置實例時等待其他執行緒歸還"""
+    global _tagger_count, _tagger_waits
+    get_tagger()
+    with _pool_cond:
+        while True:
+            if _idle_taggers:
+                tagger = _idle_taggers.pop()
+                break
+            if _tagger_factory is not None and _tagger_count < FURIGANA_TAGGER_POOL_SIZE:
+                tagger = None
+                _tagger_count += 1
+                break
+            _tagger_waits += 1
+            _pool_cond.wait()
+        factory, generation = _tagger_factory, _tagger_generation
+
+    if tagger is None:
+        # 載入辭典較慢，在鎖外建立
+        try:
+            tagger = factory()
+        except BaseException:
+            with _pool_cond:
+                if generation == _tagger_generation:
+                    _tagger_count -= 1
+                _pool_cond.notify()
+            raise
+
+    try:
+        yield tagger
+    finally:
+        with _pool_cond:
+            # set_tagger 之後歸還的舊實例直接丟棄
+            if generation == _tagger_generation:
+                _idle_taggers.append(tagger)
+            _pool_cond.notify()
+
+
+def _dictionary_key() -> tuple:
+    """目前 tagger 所用辭典的識別（檔名、大小、版本）。
+
+    作為快取鍵的一部分：換用其他辭典的 tagger 時，舊結果自然不會被命中。
+    """
+    global _dictionary_key_for
+    current = get_tagger()
+    tagger, key = _dictionary_key_for
+    if tagger is not current:
+        key = tuple(
+            (d["filename"], d["size"], d["version"]) for d in current.dictionary_info
+        )
+        _dictionary_key_for = (current, key)
+    return key
+
+
+def _cache_key() -> tuple:
+    """段落快取鍵：辭典識別 + 自訂讀音的內容雜湊，兩者任一變更時舊結果不會被命中"""
+    return (_dictionary_key(), reading_overrides.fingerprint())
+
+
+def _segments(text: str):
+    """依自訂讀音切分段落：[(片段, 自訂讀音或 None), ...]，未命中時整段為一個片段"""
+    return reading_overrides.split_text(text) or ((text, None),)
+
+
+def _output_buffer() -> list:
+    buf = getattr(_buffers, "buf", None)
+    if buf is None:
+        buf = _buffers.buf = []
+    return buf
+
+
+def _ruby_fragment(surface: str, reading: str) -> str:
+    return f"<ruby>{surface}<rp>(</rp><rt>{reading.translate(_KATA_TO_HIRA)}</rt><rp>)</rp></ruby>"
+
+
+def _entry_size(key: tuple[str, str], fragment: str) -> int:
+    return sys.getsizeof(key) + sys.getsizeof(key[0]) + sys.getsizeof(key[1]) + sys.getsizeof(fragment)
+
+
+def _store_morpheme(key: tuple[str, str], fragment: str) -> None:
+    """寫入詞素快取；超過上限時依插入順序淘汰最舊的項目"""
+    if not FURIGANA_MORPHEME_CACHE_BYTES:
+        return
+    size = _entry_size(key, fragment)
+    if size > FURIGANA_MORPHEME_CACHE_BYTES:
+        return
+    with _morpheme_lock:
+        if key in _morphemes:
+            return
+        while _morphemes and _morpheme_stats["bytes"] + size > FURIGANA_MORPHEME_CACHE_BYTES:
+            old_key = next(iter(_morphemes))
+            _morpheme_stats["bytes"] -= _entry_size(old_key, _morphemes.pop(old_key))
+            _morpheme_stats["evictions"] += 1
+        _morphemes[key] = fragment
+        _morpheme_stats["bytes"] += size
+
+
+def _render_furigana(text: str, cache_key: tuple) -> str:
+    buf = _output_buffer()
+    append = buf.append
+    has_kanji = _KANJI_RE.search
+    lookup = _morphemes.get
+    hits = misses = 0
+    # 只有含漢字的詞才解析 feature（取讀音），其餘直接輸出表層形；
+    # 含漢字的詞以 (表層形, 讀音) 查詞素快取，命中時不需再組 ruby 字串。
+    # 節點的 feature 指向 tagger 內部記憶體，必須在歸還 tagger 前讀完。
+    # 自訂讀音命中的片段直接標上指定讀音，其餘片段照常斷詞
+    # 緩衝區跨段落重複使用：斷詞中途拋出例外時也要清空，殘留內容才不會接到下一段
+    try:
+        with _checkout_tagger() as tagger:
+            for segment, override in _segments(text):
+                if override is not None:
+                    append(_ruby_fragment(segment, override))
+                    continue
+                for word in tagger(segment):
+                    surface = word.surface
+                    if has_kanji(surface):
+                        reading = word.feature.kana
+                        if reading:
+                            key = (surface, reading)
+                            fragment = lookup(key)
+                            if fragment is None:
+                                misses += 1
+                                fragment = _ruby_fragment(surface, reading)
+                                _store_morpheme(key, fragment)
+                            else:
+                                hits += 1
+                            append(fragment)
+                            continue
+                    append(surface)
+
+        if hits or misses:
+            with _morpheme_lock:
+                _morpheme_stats["hits"] += hits
+                _morpheme_stats["misses"] += misses
+
+        return "".join(buf)
+    finally:
+        buf.clear()
+
+
+_cached_render = lru_cache(maxsize=FURIGANA_CACHE_SIZE)(_render_furigana)
 
 
 def add_furigana(text: str) -> str:
     """將文字中的漢字加上振り仮名，回傳含 ruby 標籤的 HTML"""
     if not text:
         return ""
+    return _cached_render(text, _cache_key())
+
+
+def add_furigana_batch(paragraphs: Iterable[str]) -> list[str]:
+    """一次處理整頁或整份文件的段落，回傳與 add_furigana 逐段呼叫相同的結果。
+
+    快取鍵與快取只取一次，段落間共用同一個輸出緩衝區，
+    省去逐段呼叫時的重複查找與配置。
+    """
+    key = _cache_key()
+    render = _cached_render
+    return [render(text, key) if text else "" for text in paragraphs]
+
+
+# ── 結構化 token 格式 ─────────────────────────────────
+# 段落表示為 token 列表：純文字為 str（相鄰者合併），需要振り仮名的詞為
+# [表層形, 平假名讀音]。比 ruby HTML 精簡得多，需要時再以 render_tokens 轉回 HTML。
+
+
+def furigana_tokens(text: str) -> list:
+    """將段落斷詞為精簡 token 列表，render_tokens 的結果與 add_furigana 相同"""
+    tokens: list = []
+    if not text:
+        return tokens
+    plain: list[str] = []
+    has_kanji = _KANJI_RE.search
+    with _checkout_tagger() as tagger:
+        for segment, override in _segments(text):
+            if override is not None:
+                words = ((segment, override),)
+            else:
+                words = (
+                    (word.surface, word.feature.kana if has_kanji(word.surface) else None)
+                    for word in tagger(segment)
+                )
+            for surface, reading in words:
+                if reading:
+                    if plain:
+                        tokens.append("".join(plain))
+                        plain.clear()
+                    tokens.append([surface, reading.translate(_KATA_TO_HIRA)])
+                else:
+                    plain.append(surface)
+    if plain:
+        tokens.append("".join(plain))
+    return tokens
 
-    result = []
-    for word in _tagger(text):
-        surface = word.surface
-        reading = word.feature.kana
 
-        if reading and contains_kanji(surface):
-            hiragana = kata_to_hira(reading)
-            result.append(
-                f"<ruby>{surface}<rp>(</rp><rt>{hiragana}</rt><rp>)</rp></ruby>"
-            )
+def furigana_tokens_batch(paragraphs: Iterable[str]) -> list[list]:
+    return [furigana_tokens(text) for text in paragraphs]
+
+
+def render_tokens(tokens: list) -> str:
+    """token 列表 → 含 ruby 標籤的 HTML"""
+    return "".join(
+        token if isinstance(token, str) else _ruby_fragment(token[0], token[1])
+        for token in tokens
+    )
+
+
+# ── 斷詞結果（analysis）────────────────────────────────
+# 保存每個詞素的 [表層形, 讀音（片假名，無則 ""）, 品詞]，
+# 之後改變呈現方式（ruby 樣式、平／片假名、略過已會的漢字）時不必重新斷詞。
+
+RUBY_STYLES = ("full", "simple", "paren", "none")
+READING_SCRIPTS = ("hiragana", "katakana")
+
+_RUBY_FORMATS = {
+    "full": "<ruby>{0}<rp>(</rp><rt>{1}</rt><rp>)</rp></ruby>",
+    "simple": "<ruby>{0}<rt>{1}</rt></ruby>",
+    "paren": "{0}({1})",
+    "none": "{0}",
+}
+
+
+def _analyze(text: str, cache_key: tuple) -> tuple:
+    morphemes = []
+    with _checkout_tagger() as tagger:
+        for segment, override in _segments(text):
+            if override is not None:
+                # 自訂讀音一律以片假名保存，與 MeCab 的讀音一致
+                morphemes.append((segment, override.translate(_HIRA_TO_KATA), OVERRIDE_POS))
+                continue
+            for word in tagger(segment):
+                feature = word.feature
+                morphemes.append((word.surface, feature.kana or "", feature.pos1 or ""))
+    return tuple(morphemes)
+
+
+# 斷詞結果的段落快取，鍵與 _cached_render 相同；快取內容為 tuple，回傳時複製成 list
+_cached_analysis = lru_cache(maxsize=FURIGANA_CACHE_SIZE)(_analyze)
+
+
+def analyze_furigana(text: str) -> list[list[str]]:
+    """斷詞並回傳 [[表層形, 讀音, 品詞], ...]；自訂讀音的詞品詞為 OVERRIDE_POS"""
+    if not text:
+        return []
+    return [list(m) for m in _cached_analysis(text, _cache_key())]
+
+
+def analyze_furigana_batch(paragraphs: Iterable[str]) -> list[list[list[str]]]:
+    """同 analyze_furigana 逐段呼叫，快取鍵只取一次"""
+    key = _cache_key()
+    analyze = _cached_analysis
+    return [[list(m) for m in analyze(text, key)] if text else [] for text in paragraphs]
+
+
+def render_analysis(
+    morphemes: list,
+    reading: str = "hiragana",
+    ruby: str = "full",
+    known_kanji: str = "",
+) -> str:
+    """由斷詞結果產生 HTML；預設選項的結果與 add_furigana 相同。
+
+    Args:
+        morphemes: analyze_furigana 的結果
+        reading: "hiragana" | "katakana"
+        ruby: "full"（含 <rp>）| "simple" | "paren"（表層形(讀音)）| "none"
+        known_kanji: 已會的漢字；詞中所有漢字都在其中時不標讀音
+    """
+    template = _RUBY_FORMATS[ruby]
+    known = frozenset(known_kanji)
+    to_hira = reading == "hiragana"
+    out = []
+    for surface, kana, pos in morphemes:
+        if kana and _needs_ruby(surface, pos) and not (known and _all_known(surface, known)):
+            out.append(template.format(surface, kana.translate(_KATA_TO_HIRA) if to_hira else kana))
         else:
-            result.append(surface)
+            out.append(surface)
+    return "".join(out)
+
+
+def _needs_ruby(surface: str, pos: str) -> bool:
+    # 自訂讀音的詞即使不含漢字也標讀音
+    return pos == OVERRIDE_POS or _KANJI_RE.search(surface) is not None
+
+
+def _all_known(surface: str, known: frozenset) -> bool:
+    kanji = _KANJI_RE.findall(surface)
+    return bool(kanji) and known.issuperset(kanji)
+
+
+def analysis_to_tokens(morphemes: list) -> list:
+    """斷詞結果 → 精簡 token 列表（與 furigana_tokens 相同）"""
+    tokens: list = []
+    plain: list[str] = []
+    for surface, kana, pos in morphemes:
+        if kana and _needs_ruby(surface, pos):
+            if plain:
+                tokens.append("".join(plain))
+                plain.clear()
+            tokens.append([surface, kana.translate(_KATA_TO_HIRA)])
+        else:
+            plain.append(surface)
+    if plain:
+        tokens.append("".join(plain))
+    return tokens
+
+
+def configure_furigana_cache(maxsize: int) -> None:
+    """調整段落快取（HTML 與斷詞結果）上限（0 表示停用），既有快取內容會被清空"""
+    global _cached_render, _cached_analysis
+    with _cache_lock:
+        _cached_render = lru_cache(maxsize=maxsize)(_render_furigana)
+        _cached_analysis = lru_cache(maxsize=maxsize)(_analyze)
+
+
+def clear_furigana_cache() -> None:
+    """清空段落快取（HTML 與斷詞結果）與統計"""
+    _cached_render.cache_clear()
+    _cached_analysis.cache_clear()
+
+
+def set_tagger(tagger, factory: Optional[Callable[[], object]] = None) -> None:
+    """替換 tagger（例如改用其他辭典），重設 tagger pool 並清空段落快取。
+
+    Args:
+        tagger: 新的 tagger，成為池中第一個實例
+        factory: 建立同設定 tagger 的函式；未提供時池中只有這一個實例，
+            並行呼叫會依序等待
+    """
+    global _tagger, _tagger_factory, _tagger_count, _tagger_generation
+    with _cache_lock, _pool_cond:
+        _tagger = tagger
+        _tagger_factory = factory
+        _tagger_generation += 1
+        _idle_taggers[:] = [tagger]
+        _tagger_count = 1
+        _pool_cond.notify_all()
+        clear_furigana_cache()
+
+
+def tagger_pool_stats() -> dict:
+    """tagger pool 的上限、已建立與閒置實例數，以及等待次數"""
+    with _pool_cond:
+        return {
+            "max_size": FURIGANA_TAGGER_POOL_SIZE,
+            "created": _tagger_count,
+            "idle": len(_idle_taggers),
+            "waits": _tagger_waits,
+        }
+
+
+def _lru_stats(cached) -> dict:
+    info = cached.cache_info()
+    return {
+        "hits": info.hits,
+        "misses": info.misses,
+        "maxsize": info.maxsize,
+        "size": info.currsize,
+    }
+
+
+def furigana_cache_stats() -> dict:
+    """段落快取的命中／未命中次數與目前大小；analysis 為斷詞結果快取的同樣統計"""
+    return {**_lru_stats(_cached_render), "analysis": _lru_stats(_cached_analysis)}
+
+
+def configure_morpheme_cache(max_bytes: int) -> None:
+    """調整詞素快取上限（0 表示停用），既有快取內容會被清空"""
+    global FURIGANA_MORPHEME_CACHE_BYTES
+    clear_morpheme_cache()
+    FURIGANA_MORPHEME_CACHE_BYTES = max_bytes
+
+
+def clear_morpheme_cache() -> None:
+    """清空詞素快取與統計"""
+    with _morpheme_lock:
+        _morphemes.clear()
+        for name in _morpheme_stats:
+            _morpheme_stats[name] = 0
+
 
-    return "".join(result)
+def morpheme_cache_stats() -> dict:
+    """詞素快取的命中／未命中／淘汰次數、項目數與估計佔用位元組數"""
+    with _morpheme_lock:
+        return {
+            **_morpheme_stats,
+            "entries": len(_morphemes),
+            "max_bytes": FURIGANA_MORPHEME_CACHE_BYTES,
+        }
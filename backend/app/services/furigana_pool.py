@@ -0,0 +1,117 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Optional
+
+from app.services import reading_overrides, tokenizers
+from app.services.furigana import add_furigana, add_furigana_batch
+
+# 振り仮名 process pool 設定：worker 數（0 = 依 CPU 數決定）、
+# 啟用 pool 的最少總字數、每批分派的段落數、worker 啟動時是否先暖機
+FURIGANA_WORKERS = int(os.getenv("FURIGANA_WORKERS", "0"))
+FURIGANA_PARALLEL_MIN_CHARS = int(os.getenv("FURIGANA_PARALLEL_MIN_CHARS", "100000"))
+FURIGANA_CHUNK_SIZE = int(os.getenv("FURIGANA_CHUNK_SIZE", "500"))
+FURIGANA_POOL_WARMUP = os.getenv("FURIGANA_POOL_WARMUP", "1") != "0"
+
+# 暖機用文字：讓 worker 先載入辭典並跑過一次斷詞
+_WARMUP_TEXT = "東京の大きい都市で漢字を読む"
+
+_pool_lock = threading.Lock()
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_workers = 0
+_pool_backend = ""
+_pool_overrides = ""
+
+
+def _init_worker(warmup: bool, backend: str) -> None:
+    # 各 worker 建立自己的 tagger，斷詞後端與主行程一致
+    if backend != tokenizers.active_backend():
+        tokenizers.use_backend(backend)
+    if warmup:
+        add_furigana(_WARMUP_TEXT)
+
+
+def _warm_ping() -> int:
+    return os.getpid()
+
+
+def resolve_workers(workers: Optional[int] = None) -> int:
+    if workers is None:
+        workers = FURIGANA_WORKERS
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+    return workers
+
+
+def get_pool(workers: Optional[int] = None) -> ProcessPoolExecutor:
+    """取得（必要時建立）常駐的振り仮名 process pool；worker 數、斷詞後端或
+    自訂讀音（各 worker 啟動時載入）變更時重建"""
+    global _pool, _pool_workers, _pool_backend, _pool_overrides
+    workers = resolve_workers(workers)
+    backend = tokenizers.active_backend()
+    overrides = reading_overrides.fingerprint()
+    with _pool_lock:
+        if _pool is not None and (
+            _pool_workers != workers or _pool_backend != backend or _pool_overrides != overrides
+        ):
+            # 舊 pool 上進行中的工作照常完成（不取消），之後才結束
+            _pool.shutdown(wait=False)
+            _pool = None
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(FURIGANA_POOL_WARMUP, backend),
+            )
+            _pool_workers, _pool_backend, _pool_overrides = workers, backend, overrides
+        return _pool
+
+
+def warm_up_pool(workers: Optional[int] = None) -> list[int]:
+    """預先啟動所有 worker（各自載入辭典），回傳 worker 的 pid"""
+    pool = get_pool(workers)
+    futures = [pool.submit(_warm_ping) for _ in range(_pool_workers)]
+    return [f.result() for f in futures]
+
+
+def shutdown_pool() -> None:
+    """關閉 process pool（應用程式結束或測試清理用）"""
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True, cancel_futures=True)
+        _pool, _pool_workers = None, 0
+
+
+def furigana_batch(
+    paragraphs: list[str],
+    workers: Optional[int] = None,
+    chunk_size: Optional[int] = None,
+    render: Callable[[list[str]], list] = add_furigana_batch,
+) -> list:
+    """與 render(paragraphs) 相同的結果；總字數達 FURIGANA_PARALLEL_MIN_CHARS 時
+    切成 chunk_size 段落一批，依序分派到 process pool 後按原順序合併。
+
+    Args:
+        paragraphs: 段落列表
+        workers: worker 數（None 使用 FURIGANA_WORKERS，0 = CPU 數）
+        chunk_size: 每批段落數（None 使用 FURIGANA_CHUNK_SIZE）
+        render: 批次處理函式（須為模組層級函式），預設 add_furigana_batch；
+            產生 token 格式時為 furigana_tokens_batch
+    """
+    workers = resolve_workers(workers)
+    if workers <= 1 or sum(map(len, paragraphs)) < FURIGANA_PARALLEL_MIN_CHARS:
+        return render(paragraphs)
+
+    chunk_size = max(1, chunk_size or FURIGANA_CHUNK_SIZE)
+    chunks = [paragraphs[i:i + chunk_size] for i in range(0, len(paragraphs), chunk_size)]
+    try:
+        results = get_pool(workers).map(render, chunks)
+        return [html for chunk in results for html in chunk]
+    except BrokenProcessPool:
+        # worker 異常結束：丟棄 pool，改在本行程完成這次轉換
+        shutdown_pool()
+        return render(paragraphs)
@@ -1,6 +1,22 @@
+import hashlib
+import os
 import re
+from functools import partial
+from typing import Callable, Iterable, Iterator, Optional
 
-from app.services.furigana import add_furigana
+from app.services.furigana import (
+    add_furigana_batch,
+    analysis_to_tokens,
+    analyze_furigana_batch,
+    furigana_tokens_batch,
+    render_analysis,
+    render_tokens,
+)
+from app.services.furigana_pool import furigana_batch
+
+# 產生器版本每累積這麼多字的段落才送一次振り仮名批次處理，記憶體中同時只保留
+# 一批的結果；預設與 FURIGANA_PARALLEL_MIN_CHARS 相同，大型文件每批仍可用上 furigana_pool
+HTML_STREAM_BATCH_CHARS = int(os.getenv("HTML_STREAM_BATCH_CHARS", "100000"))
 
 
 def _contains_japanese(text: str) -> bool:
@@ -8,6 +24,39 @@ def _contains_japanese(text: str) -> bool:
     return bool(re.search(r'[\u3040-\u309f\u30a0-\u30ff\u4e00-\u9fff\u3000-\u303f]', text))
 
 
+def generate_page_html(page: dict) -> str:
+    """將單頁段落轉換為帶振り仮名的 <section>。
+
+    Args:
+        page: {"page_num": int, "paragraphs": list[str]}
+
+    Returns:
+        該頁的 HTML 字串
+    """
+    return _page_section(page["page_num"], add_furigana_batch(page["paragraphs"]))
+
+
+def _page_section(page_num: int, furigana_texts: list[str]) -> str:
+    html_parts = [
+        f'<section class="page" data-page="{page_num}">',
+        f'<h2>Page {page_num}</h2>',
+    ]
+
+    for furigana_text in furigana_texts:
+        html_parts.append(f"<p>{furigana_text}</p>")
+
+    html_parts.append("</section>")
+    return "\n".join(html_parts)
+
+
+_SECTION_RE = re.compile(r'<section class="page" data-page="(\d+)">.*?</section>', re.S)
+
+
+def split_page_sections(html: str) -> list[tuple[int, str]]:
+    """將完整 HTML 拆回各頁 <section>，回傳 [(頁碼, section HTML), ...]"""
+    return [(int(m.group(1)), m.group(0)) for m in _SECTION_RE.finditer(html)]
+
+
 def generate_html(pages: list[dict]) -> str:
     """將各頁段落轉換為帶振り仮名的 HTML。
 
@@ -17,22 +66,117 @@ def generate_html(pages: list[dict]) -> str:
     Returns:
         完整 HTML 字串
     """
-    html_parts = []
+    return "".join(iter_html(pages))
 
-    for page in pages:
-        html_parts.append(f'<section class="page" data-page="{page["page_num"]}">')
-        html_parts.append(f'<h2>Page {page["page_num"]}</h2>')
 
-        for paragraph in page["paragraphs"]:
-            furigana_text = add_furigana(paragraph)
-            html_parts.append(f"<p>{furigana_text}</p>")
+def _batches(items: Iterable, size: Callable[[object], int]) -> Iterator[list]:
+    """依序將 items 分批，每批累積到 HTML_STREAM_BATCH_CHARS 字為止"""
+    batch, chars = [], 0
+    for item in items:
+        batch.append(item)
+        chars += size(item)
+        if chars >= HTML_STREAM_BATCH_CHARS:
+            yield batch
+            batch, chars = [], 0
+    if batch:
+        yield batch
 
-        html_parts.append("</section>")
 
-    return "\n".join(html_parts)
+def iter_html(pages: Iterable[dict]) -> Iterator[str]:
+    """generate_html 的產生器版本：逐頁產生 <section>（第二頁起前面帶換行），
+    "".join 的結果與 generate_html 相同。pages 也可以是逐頁擷取的 iterator。
+    """
+    separator = ""
+    for group in _batches(pages, lambda page: sum(map(len, page["paragraphs"]))):
+        # 整批的段落一次送出，夠大時由 furigana_pool 分派到多個 process
+        paragraphs = [p for page in group for p in page["paragraphs"]]
+        furigana_texts = iter(furigana_batch(paragraphs))
+        for page in group:
+            yield separator + _page_section(
+                page["page_num"], [next(furigana_texts) for _ in page["paragraphs"]]
+            )
+            separator = "\n"
+
+
+_SEPARATOR_HTML = '<hr class="script-separator" style="border:none;border-top:1px solid #ccc;margin:4px 0;">'
+
+
+def _script_lines(text: str) -> list[tuple[str, str]]:
+    """TXT 腳本逐行分類為 ("hr" | "ja" | "en", 去除前後空白的內容)，略過空行"""
+    lines = []
+    for line in text.splitlines():
+        stripped = line.strip()
+        if not stripped:
+            continue
+        if re.match(r'^-{3,}$', stripped):
+            lines.append(("hr", stripped))
+        elif _contains_japanese(stripped):
+            lines.append(("ja", stripped))
+        else:
+            lines.append(("en", stripped))
+    return lines
+
+
+# TXT 分頁方式：不分頁、每個分隔線換頁（分隔線本身不輸出）、每 page_lines 行一頁
+TXT_PAGINATE_MODES = ("none", "separator", "lines")
+TXT_PAGE_LINES = int(os.getenv("TXT_PAGE_LINES", "100"))
+
+
+def _script_pages(
+    text: str, paginate: str = "none", page_lines: Optional[int] = None
+) -> list[list[tuple[str, str]]]:
+    """TXT 腳本切成虛擬頁面，每頁為 _script_lines 的結果；至少回傳一頁"""
+    lines = _script_lines(text)
+    if paginate == "none":
+        return [lines]
+    if paginate == "lines":
+        size = max(1, page_lines or TXT_PAGE_LINES)
+        return [lines[i:i + size] for i in range(0, len(lines), size)] or [[]]
+    if paginate != "separator":
+        raise ValueError(f"paginate 必須為 {'、'.join(TXT_PAGINATE_MODES)}")
+    pages, current = [], []
+    for line in lines:
+        if line[0] == "hr":
+            if current:
+                pages.append(current)
+            current = []
+        else:
+            current.append(line)
+    if current:
+        pages.append(current)
+    return pages or [[]]
+
+
+def script_page_count(text: str, paginate: str = "none", page_lines: Optional[int] = None) -> int:
+    """TXT 腳本以指定方式分頁後的頁數"""
+    return len(_script_pages(text, paginate, page_lines))
+
 
+def _script_entries(pages: list[list[tuple[str, str]]], results: Iterator) -> list[dict]:
+    """各頁行 → 文件格式的頁面：日文行依序取 results，其他行為 str，分隔線為 None"""
+    return [
+        {
+            "page_num": num,
+            "paragraphs": [
+                next(results) if kind == "ja" else (None if kind == "hr" else content)
+                for kind, content in page
+            ],
+        }
+        for num, page in enumerate(pages, 1)
+    ]
 
-def generate_html_from_script_txt(text: str) -> str:
+
+def _script_line_html(kind: str, content: str) -> str:
+    if kind == "hr":
+        return _SEPARATOR_HTML
+    if kind == "ja":
+        return f'<p class="line-ja">{content}</p>'
+    return f'<p class="line-en" style="color:#888;font-size:0.85em;">{content}</p>'
+
+
+def generate_html_from_script_txt(
+    text: str, paginate: str = "none", page_lines: Optional[int] = None
+) -> str:
     """將 TXT 腳本文字逐行轉換為 HTML，保留原始排版並加入振り仮名。
 
     規則：
@@ -41,22 +185,241 @@ def generate_html_from_script_txt(text: str) -> str:
     - 其他行（英文翻譯等）→ 保留原文
     - 空行 → 略過
 
+    Args:
+        text: TXT 腳本
+        paginate: TXT_PAGINATE_MODES 之一；"separator" 在分隔線處換頁，
+            "lines" 每 page_lines（預設 TXT_PAGE_LINES）行換頁
+        page_lines: "lines" 模式每頁行數
+
     Returns:
-        HTML 字串，含 <section class="page" data-page="1">
+        HTML 字串，每頁一個 <section class="page" data-page="N">（不分頁時只有第 1 頁）
     """
-    html_parts = ['<section class="page" data-page="1">']
+    return "".join(iter_html_from_script_txt(text, paginate, page_lines))
 
-    for line in text.splitlines():
-        stripped = line.strip()
-        if not stripped:
-            continue
-        if re.match(r'^-{3,}$', stripped):
-            html_parts.append('<hr class="script-separator" style="border:none;border-top:1px solid #ccc;margin:4px 0;">')
-        elif _contains_japanese(stripped):
-            furigana_text = add_furigana(stripped)
-            html_parts.append(f'<p class="line-ja">{furigana_text}</p>')
+
+def iter_html_from_script_txt(
+    text: str, paginate: str = "none", page_lines: Optional[int] = None
+) -> Iterator[str]:
+    """generate_html_from_script_txt 的產生器版本：逐行產生 HTML 片段"""
+    items = [
+        (num, kind, content)
+        for num, page in enumerate(_script_pages(text, paginate, page_lines), 1)
+        for kind, content in page
+    ]
+    current = 0
+    for group in _batches(items, lambda item: len(item[2])):
+        # 日文行一次批次加振り仮名
+        furigana_texts = iter(furigana_batch([content for _, kind, content in group if kind == "ja"]))
+        for num, kind, content in group:
+            if num != current:
+                if current:
+                    yield "\n</section>\n"
+                yield f'<section class="page" data-page="{num}">'
+                current = num
+            yield "\n" + _script_line_html(kind, next(furigana_texts) if kind == "ja" else content)
+    if not current:
+        yield '<section class="page" data-page="1">'
+    yield "\n</section>"
+
+
+# ── 結構化 token 格式與斷詞結果（analysis）──────────────
+# {"format": "furigana-tokens" | "furigana-analysis", "version": 1,
+#  "source": "pdf" | "txt", "pages": [{"page_num": int, "paragraphs": [...]}]}
+# PDF 段落為 token 列表（見 furigana.furigana_tokens）或詞素列表
+# （見 furigana.analyze_furigana）；TXT 每行為上述列表（日文行）、
+# str（其他行）或 None（分隔線）。
+
+TOKEN_FORMAT = "furigana-tokens"
+ANALYSIS_FORMAT = "furigana-analysis"
+TOKEN_FORMAT_VERSION = 1
+
+
+def _document(fmt: str, source: str, pages: list[dict]) -> dict:
+    return {"format": fmt, "version": TOKEN_FORMAT_VERSION, "source": source, "pages": pages}
+
+
+def _pages_document(fmt: str, pages: list[dict], batch: Callable[[list[str]], list]) -> dict:
+    paragraphs = [p for page in pages for p in page["paragraphs"]]
+    results = iter(furigana_batch(paragraphs, render=batch))
+    return _document(fmt, "pdf", [
+        {"page_num": page["page_num"], "paragraphs": [next(results) for _ in page["paragraphs"]]}
+        for page in pages
+    ])
+
+
+def _script_document(
+    fmt: str,
+    text: str,
+    batch: Callable[[list[str]], list],
+    paginate: str = "none",
+    page_lines: Optional[int] = None,
+) -> dict:
+    pages = _script_pages(text, paginate, page_lines)
+    ja_lines = [content for page in pages for kind, content in page if kind == "ja"]
+    results = iter(furigana_batch(ja_lines, render=batch))
+    return _document(fmt, "txt", _script_entries(pages, results))
+
+
+def _map_document(document: dict, fmt: str, convert: Callable[[list], list]) -> dict:
+    pages = [
+        {
+            "page_num": page["page_num"],
+            "paragraphs": [p if p is None or isinstance(p, str) else convert(p) for p in page["paragraphs"]],
+        }
+        for page in document["pages"]
+    ]
+    return _document(fmt, document["source"], pages)
+
+
+def _render_document(
+    document: dict, render: Callable[[list], str], start: Optional[int], end: Optional[int]
+) -> str:
+    return "".join(_iter_document(document, render, start, end))
+
+
+def _iter_document(
+    document: dict, render: Callable[[list], str], start: Optional[int], end: Optional[int]
+) -> Iterator[str]:
+    pages = (
+        page for page in document["pages"]
+        if (start is None or page["page_num"] >= start) and (end is None or page["page_num"] <= end)
+    )
+    separator = ""
+    for page in pages:
+        if document["source"] == "txt":
+            yield f'{separator}<section class="page" data-page="{page["page_num"]}">'
+            for entry in page["paragraphs"]:
+                if entry is None:
+                    yield "\n" + _script_line_html("hr", "")
+                elif isinstance(entry, str):
+                    yield "\n" + _script_line_html("en", entry)
+                else:
+                    yield "\n" + _script_line_html("ja", render(entry))
+            yield "\n</section>"
         else:
-            html_parts.append(f'<p class="line-en" style="color:#888;font-size:0.85em;">{stripped}</p>')
+            yield separator + _page_section(
+                page["page_num"], [render(paragraph) for paragraph in page["paragraphs"]]
+            )
+        separator = "\n"
+
+
+def generate_tokens(pages: list[dict]) -> dict:
+    """generate_html 的 token 格式版本"""
+    return _pages_document(TOKEN_FORMAT, pages, furigana_tokens_batch)
+
+
+def generate_tokens_from_script_txt(
+    text: str, paginate: str = "none", page_lines: Optional[int] = None
+) -> dict:
+    """generate_html_from_script_txt 的 token 格式版本"""
+    return _script_document(TOKEN_FORMAT, text, furigana_tokens_batch, paginate, page_lines)
+
+
+def generate_html_from_tokens(document: dict, start: Optional[int] = None, end: Optional[int] = None) -> str:
+    """將 token 格式轉回 HTML，結果與直接產生 HTML 相同。
+
+    Args:
+        document: generate_tokens / generate_tokens_from_script_txt 的結果
+        start / end: 只輸出此頁碼範圍（含頭尾），None 表示不限
+    """
+    return _render_document(document, render_tokens, start, end)
+
+
+def generate_analysis(pages: list[dict]) -> dict:
+    """各頁段落的斷詞結果（表層形、讀音、品詞），供之後重新呈現"""
+    return _pages_document(ANALYSIS_FORMAT, pages, analyze_furigana_batch)
+
+
+def generate_analysis_from_script_txt(
+    text: str, paginate: str = "none", page_lines: Optional[int] = None
+) -> dict:
+    return _script_document(ANALYSIS_FORMAT, text, analyze_furigana_batch, paginate, page_lines)
+
+
+# ── 增量重新產生 ──────────────────────────────────────
+# 文件重新上傳時，以每個日文行內容的雜湊對應上次的斷詞結果，只有改變的行才重新斷詞。
+
+
+def line_key(text: str) -> str:
+    """單行內容的雜湊，作為片段表的鍵"""
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=8).hexdigest()
+
+
+def script_line_keys(text: str) -> list[str]:
+    """TXT 腳本各日文行的 line_key，順序與斷詞結果中的日文行相同"""
+    return [line_key(content) for kind, content in _script_lines(text) if kind == "ja"]
+
+
+def script_fragments(document: dict, keys: list[str]) -> dict[str, list]:
+    """TXT 斷詞結果中的日文行依序對應 keys，回傳 {line_key: 詞素列表}；數量不符時回傳空表"""
+    entries = [
+        entry for page in document["pages"] for entry in page["paragraphs"]
+        if isinstance(entry, list)
+    ]
+    if len(entries) != len(keys):
+        return {}
+    return dict(zip(keys, entries))
+
+
+def regenerate_analysis_from_script_txt(
+    text: str,
+    fragments: dict[str, list],
+    paginate: str = "none",
+    page_lines: Optional[int] = None,
+) -> tuple[dict, list[str], dict]:
+    """generate_analysis_from_script_txt 的增量版本：片段表中已有的行直接沿用。
+
+    Args:
+        text: TXT 腳本
+        fragments: {line_key: 詞素列表}，通常來自 script_fragments
+        paginate / page_lines: 分頁方式，見 generate_html_from_script_txt
+
+    Returns:
+        (斷詞結果, 各日文行的 line_key, {"reused": 沿用行數, "regenerated": 重新斷詞行數})
+    """
+    pages = _script_pages(text, paginate, page_lines)
+    ja_lines = [content for page in pages for kind, content in page if kind == "ja"]
+    keys = [line_key(content) for content in ja_lines]
+    # 只有新內容的行需要斷詞，重複的新行只斷詞一次
+    missing: dict[str, str] = {}
+    for key, content in zip(keys, ja_lines):
+        if key not in fragments:
+            missing.setdefault(key, content)
+    fresh = dict(zip(missing, furigana_batch(list(missing.values()), render=analyze_furigana_batch)))
+
+    results = iter([fragments[key] if key in fragments else fresh[key] for key in keys])
+    reused = sum(key in fragments for key in keys)
+    document = _document(ANALYSIS_FORMAT, "txt", _script_entries(pages, results))
+    return document, keys, {"reused": reused, "regenerated": len(keys) - reused}
+
+
+def analysis_to_token_document(document: dict) -> dict:
+    """斷詞結果 → token 格式（不需重新斷詞）"""
+    return _map_document(document, TOKEN_FORMAT, analysis_to_tokens)
+
+
+def generate_html_from_analysis(
+    document: dict,
+    start: Optional[int] = None,
+    end: Optional[int] = None,
+    **options,
+) -> str:
+    """由斷詞結果重新產生 HTML（純計算，不執行 MeCab）。
+
+    Args:
+        document: generate_analysis / generate_analysis_from_script_txt 的結果
+        start / end: 只輸出此頁碼範圍（含頭尾），None 表示不限
+        **options: 傳給 furigana.render_analysis 的 reading / ruby / known_kanji；
+            預設選項的結果與 generate_html 相同
+    """
+    return _render_document(document, partial(render_analysis, **options), start, end)
+
 
-    html_parts.append('</section>')
-    return '\n'.join(html_parts)
+def iter_html_from_analysis(
+    document: dict,
+    start: Optional[int] = None,
+    end: Optional[int] = None,
+    **options,
+) -> Iterator[str]:
+    """generate_html_from_analysis 的產生器版本：逐頁（TXT 為逐行）產生 HTML 片段"""
+    return _iter_document(document, partial(render_analysis, **options), start, end)
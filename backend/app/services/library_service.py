@@ -1,102 +1,192 @@
+import gzip
+import io
 import json
+import os
+import shutil
 import uuid
 from datetime import datetime
 from pathlib import Path
-from typing import Optional
+from typing import Callable, Iterable, Optional, Union
+
+from app.services.library_store import JsonLibraryStore, SqliteLibraryStore, import_json
 
 DATA_DIR = Path(__file__).resolve().parent.parent.parent / "data"
 LIBRARY_FILE = DATA_DIR / "library.json"
+LIBRARY_DB = DATA_DIR / "library.db"
 DOCUMENTS_DIR = DATA_DIR / "documents"
 
+# 書庫中繼資料的儲存後端："json"（LIBRARY_FILE）或 "sqlite"（LIBRARY_DB），見 library_store
+LIBRARY_BACKEND = os.getenv("LIBRARY_BACKEND", "json")
+# json 後端的變更日誌超過此大小時於背景壓縮成新的 library.json
+LIBRARY_JOURNAL_MAX_BYTES = int(os.getenv("LIBRARY_JOURNAL_MAX_BYTES", str(4 * 1024 * 1024)))
+
+# 文件內容（HTML、token、斷詞結果）以 gzip 壓縮儲存，讀取時可原樣以
+# Content-Encoding: gzip 送出；舊的未壓縮檔案仍可讀取，見 migrate_compressed_documents
+DOCUMENT_GZIP_LEVEL = int(os.getenv("DOCUMENT_GZIP_LEVEL", "6"))
+
 
 def _ensure_dirs() -> None:
     DATA_DIR.mkdir(exist_ok=True)
     DOCUMENTS_DIR.mkdir(exist_ok=True)
 
 
-def load_library() -> dict:
+_current_store: Optional[tuple[tuple, Union[JsonLibraryStore, SqliteLibraryStore]]] = None
+_store_generation = 0
+
+
+def _store() -> Union[JsonLibraryStore, SqliteLibraryStore]:
+    """依目前的 LIBRARY_BACKEND 與檔案路徑取得儲存後端（設定改變時重新建立）"""
+    global _current_store, _store_generation
     _ensure_dirs()
-    if not LIBRARY_FILE.exists():
-        return {"folders": [], "tags": [], "documents": []}
-    return json.loads(LIBRARY_FILE.read_text(encoding="utf-8"))
+    if LIBRARY_BACKEND == "sqlite":
+        key = ("sqlite", LIBRARY_DB)
+    elif LIBRARY_BACKEND == "json":
+        key = ("json", LIBRARY_FILE)
+    else:
+        raise ValueError(f"未知的書庫後端：{LIBRARY_BACKEND}（可用：json、sqlite）")
+    if _current_store is None or _current_store[0] != key:
+        if _current_store is not None:
+            _current_store[1].close()
+        if key[0] == "sqlite":
+            store = SqliteLibraryStore(key[1])
+        else:
+            store = JsonLibraryStore(key[1], journal_max_bytes=LIBRARY_JOURNAL_MAX_BYTES)
+        _current_store = (key, store)
+        _store_generation += 1
+    return _current_store[1]
+
+
+def load_library() -> dict:
+    """整份書庫（複本，可自由修改後以 save_library 寫回）"""
+    return json.loads(library_json())
+
+
+_library_json: Optional[tuple[tuple, bytes]] = None
+
+
+def library_json() -> bytes:
+    """整份書庫序列化後的 JSON（GET /api/library 的回應內容）。
+
+    書庫由儲存後端載入一次後保存在記憶體；版本標記（本行程寫入次數與檔案狀態）
+    不變時直接回傳上次序列化的結果，讀取成本與書庫大小無關。
+    """
+    global _library_json
+    store = _store()
+    # 先取版本再讀內容：期間若有寫入，快取的內容只會比版本新，下次會重新序列化
+    version = (_store_generation, store.version())
+    cached = _library_json
+    if cached is None or cached[0] != version:
+        cached = (version, json.dumps(store.load(), ensure_ascii=False).encode("utf-8"))
+        _library_json = cached
+    return cached[1]
 
 
 def save_library(library: dict) -> None:
+    _store().save(library)
+
+
+def import_library_json(json_path: Optional[Path] = None) -> dict:
+    """將 library.json（預設 LIBRARY_FILE）匯入 SQLite 書庫（LIBRARY_DB），回傳各類項目數"""
     _ensure_dirs()
-    LIBRARY_FILE.write_text(
-        json.dumps(library, ensure_ascii=False, indent=2), encoding="utf-8"
-    )
+    return import_json(json_path or LIBRARY_FILE, LIBRARY_DB)
+
+
+# 文件內容檔案欄位：HTML、token 格式、斷詞結果、斷詞結果各行的雜湊、延遲轉換用的原始 PDF
+_FILE_KEYS = ("htmlFile", "tokensFile", "analysisFile", "fragmentsFile", "sourceFile")
+
+
+def _remove_document_files(doc: dict) -> None:
+    """刪除已自書庫移除的文件的所有內容檔案與已轉換頁面"""
+    for name in _file_names(doc):
+        (DOCUMENTS_DIR / name).unlink(missing_ok=True)
+    shutil.rmtree(_pages_dir(doc["id"]), ignore_errors=True)
+
+
+def _clear_document_content(doc: dict) -> None:
+    """清除內容檔案與延遲轉換欄位；檔案本身於書庫提交後才刪除，見 _modify_document_files"""
+    for key in _FILE_KEYS + _LAZY_KEYS:
+        doc.pop(key, None)
+    doc["htmlFile"] = None
+
+
+def _file_names(doc: Optional[dict]) -> set[str]:
+    return {doc[key] for key in _FILE_KEYS if doc and doc.get(key)}
+
+
+def _temp_path(path: Path) -> Path:
+    # 每次寫入使用不同的暫存檔，同一文件同時上傳時不會互相覆寫
+    return path.with_name(f"{path.name}.{uuid.uuid4().hex}.tmp")
+
+
+def _modify_document_files(
+    doc_id: str, fn: Callable[[dict], None], replace_pages: bool = False
+) -> Optional[dict]:
+    """以 fn 寫入內容檔案並更新文件記錄，書庫提交後才刪除不再被參照的舊檔案。
+
+    fn 寫入的檔案先完整寫入暫存檔再取代正式檔名：fn 中途失敗時舊檔案與記錄都不變，
+    替換期間讀取端一直讀得到完整的舊（或新）內容。replace_pages=True（整份內容
+    重新上傳）時，提交後一併刪除依舊內容轉換的延遲頁面。
+    """
+    files: dict[str, set[str]] = {}
+
+    def update(doc: dict) -> None:
+        files["before"] = _file_names(doc)
+        fn(doc)
+        files["after"] = _file_names(doc)
+
+    result = _store().modify_document(doc_id, update)
+    if result is None:
+        # 文件在寫入期間被刪除：移除剛寫入的檔案
+        stale = files.get("after", set()) - files.get("before", set())
+    else:
+        stale = files["before"] - _file_names(result)
+    for name in stale:
+        (DOCUMENTS_DIR / name).unlink(missing_ok=True)
+    if replace_pages and files:
+        shutil.rmtree(_pages_dir(doc_id), ignore_errors=True)
+    return result
 
 
 def create_folder(name: str) -> dict:
-    library = load_library()
+    store = _store()
     folder = {
         "id": f"f-{uuid.uuid4().hex[:8]}",
         "name": name,
-        "order": len(library["folders"]),
+        "order": store.folder_count(),
         "tagIds": [],
     }
-    library["folders"].append(folder)
-    save_library(library)
+    store.add_folder(folder)
     return folder
 
 
 def rename_folder(folder_id: str, name: str) -> Optional[dict]:
-    library = load_library()
-    for folder in library["folders"]:
-        if folder["id"] == folder_id:
-            folder["name"] = name
-            save_library(library)
-            return folder
-    return None
+    return _store().modify_folder(folder_id, lambda folder: folder.update(name=name))
 
 
 def delete_folder(folder_id: str) -> bool:
-    library = load_library()
-    if not any(f["id"] == folder_id for f in library["folders"]):
+    removed = _store().remove_folder(folder_id)
+    if removed is None:
         return False
-    for doc in library["documents"]:
-        if doc["folderId"] == folder_id and doc.get("htmlFile"):
-            (DOCUMENTS_DIR / doc["htmlFile"]).unlink(missing_ok=True)
-    library["folders"] = [f for f in library["folders"] if f["id"] != folder_id]
-    library["documents"] = [d for d in library["documents"] if d["folderId"] != folder_id]
-    save_library(library)
+    for doc in removed:
+        _remove_document_files(doc)
     return True
 
 
 def create_tag(name: str, color: str) -> dict:
-    library = load_library()
     tag = {"id": f"t-{uuid.uuid4().hex[:8]}", "name": name, "color": color}
-    library["tags"].append(tag)
-    save_library(library)
+    _store().add_tag(tag)
     return tag
 
 
 def delete_tag(tag_id: str) -> bool:
-    library = load_library()
-    if not any(t["id"] == tag_id for t in library["tags"]):
-        return False
-    library["tags"] = [t for t in library["tags"] if t["id"] != tag_id]
-    for folder in library["folders"]:
-        folder["tagIds"] = [tid for tid in folder.get("tagIds", []) if tid != tag_id]
-    for doc in library["documents"]:
-        doc["tagIds"] = [tid for tid in doc.get("tagIds", []) if tid != tag_id]
-    save_library(library)
-    return True
+    return _store().remove_tag(tag_id)
 
 
 def update_folder_tags(folder_id: str, tag_ids: list) -> Optional[dict]:
-    library = load_library()
-    for folder in library["folders"]:
-        if folder["id"] == folder_id:
-            folder["tagIds"] = tag_ids
-            save_library(library)
-            return folder
-    return None
+    return _store().modify_folder(folder_id, lambda folder: folder.update(tagIds=tag_ids))
 
 
 def create_document(name: str, folder_id: str) -> dict:
-    library = load_library()
     doc = {
         "id": f"doc-{uuid.uuid4().hex[:8]}",
         "name": name,
@@ -109,68 +199,255 @@ def create_document(name: str, folder_id: str) -> dict:
         "createdAt": datetime.now().isoformat(),
         "uploadedAt": None,
     }
-    library["documents"].append(doc)
-    save_library(library)
+    _store().add_document(doc)
     return doc
 
 
 def update_document(doc_id: str, updates: dict) -> Optional[dict]:
-    library = load_library()
     allowed = {"name", "folderId", "tagIds", "lastPage", "notes"}
-    for doc in library["documents"]:
-        if doc["id"] == doc_id:
-            for key, value in updates.items():
-                if key in allowed:
-                    doc[key] = value
-            save_library(library)
-            return doc
-    return None
+    return _store().modify_document(
+        doc_id, lambda doc: doc.update({k: v for k, v in updates.items() if k in allowed})
+    )
 
 
 def delete_document(doc_id: str) -> bool:
-    library = load_library()
-    doc = next((d for d in library["documents"] if d["id"] == doc_id), None)
+    doc = _store().remove_document(doc_id)
     if not doc:
         return False
-    if doc.get("htmlFile"):
-        (DOCUMENTS_DIR / doc["htmlFile"]).unlink(missing_ok=True)
-    library["documents"] = [d for d in library["documents"] if d["id"] != doc_id]
-    save_library(library)
+    _remove_document_files(doc)
     return True
 
 
-def set_document_html(doc_id: str, html_content: str) -> Optional[dict]:
-    library = load_library()
-    for doc in library["documents"]:
-        if doc["id"] == doc_id:
-            html_file = f"{doc_id}.html"
-            (DOCUMENTS_DIR / html_file).write_text(html_content, encoding="utf-8")
-            doc["htmlFile"] = html_file
-            doc["uploadedAt"] = datetime.now().isoformat()
-            save_library(library)
-            return doc
-    return None
+def get_document(doc_id: str) -> Optional[dict]:
+    return _store().get_document(doc_id)
+
+
+def set_document_html(doc_id: str, html_content: Union[str, Iterable[str]]) -> Optional[dict]:
+    """寫入文件 HTML；html_content 可為字串或逐段產生 HTML 片段的 iterator
+    （例如 html_generator.iter_html），後者直接串流寫入檔案"""
+    def store_html(doc: dict) -> None:
+        html_file = _write_document_file(f"{doc_id}.html", html_content)
+        _clear_document_content(doc)
+        doc["htmlFile"] = html_file
+        doc["uploadedAt"] = datetime.now().isoformat()
+
+    return _modify_document_files(doc_id, store_html, replace_pages=True)
+
+
+def _write_document_file(name: str, content: Union[str, Iterable[str]]) -> str:
+    """將文字（或逐段產生的片段）以 gzip 串流寫入 DOCUMENTS_DIR/{name}.gz，回傳檔名。
+    先寫入暫存檔再取代，寫入中途失敗不會留下不完整的檔案。"""
+    if isinstance(content, str):
+        content = (content,)
+    file_name = f"{name}.gz"
+    path = DOCUMENTS_DIR / file_name
+    tmp = _temp_path(path)
+    try:
+        # mtime=0：相同內容產生相同的檔案
+        with gzip.GzipFile(tmp, "wb", compresslevel=DOCUMENT_GZIP_LEVEL, mtime=0) as gz, \
+                io.TextIOWrapper(gz, encoding="utf-8") as f:
+            for fragment in content:
+                f.write(fragment)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+    tmp.replace(path)
+    return file_name
+
+
+def _document_file(doc: Optional[dict], key: str) -> Optional[Path]:
+    if not doc or not doc.get(key):
+        return None
+    path = DOCUMENTS_DIR / doc[key]
+    return path if path.exists() else None
+
+
+def _read_document_bytes(path: Path) -> bytes:
+    """讀取文件內容檔案（必要時解壓縮）"""
+    data = path.read_bytes()
+    return gzip.decompress(data) if path.suffix == ".gz" else data
+
+
+def get_document_stored(doc_id: str, key: str) -> Optional[tuple[bytes, Optional[str]]]:
+    """讀取文件內容檔案的原始位元組，不解壓縮。
+
+    Args:
+        key: "htmlFile" | "tokensFile" | "analysisFile"
+
+    Returns:
+        (內容, 壓縮方式 "gzip" 或 None)；文件或檔案不存在時回傳 None
+    """
+    path = _document_file(get_document(doc_id), key)
+    if path is None:
+        return None
+    return path.read_bytes(), "gzip" if path.suffix == ".gz" else None
 
 
 def get_document_html(doc_id: str) -> Optional[str]:
-    library = load_library()
-    doc = next((d for d in library["documents"] if d["id"] == doc_id), None)
-    if not doc or not doc.get("htmlFile"):
+    path = _document_file(get_document(doc_id), "htmlFile")
+    if path is None:
+        return None
+    return _read_document_bytes(path).decode("utf-8")
+
+
+def set_document_tokens(doc_id: str, tokens: dict) -> Optional[dict]:
+    """以 token 格式儲存文件（取代 HTML），HTML 於讀取時才由 token 產生"""
+    def store_tokens(doc: dict) -> None:
+        tokens_file = _write_document_file(f"{doc_id}.tokens.json", _compact_json(tokens))
+        _clear_document_content(doc)
+        doc["tokensFile"] = tokens_file
+        doc["uploadedAt"] = datetime.now().isoformat()
+
+    return _modify_document_files(doc_id, store_tokens, replace_pages=True)
+
+
+def _compact_json(data: dict) -> str:
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
+
+def _write_compact_json(path: Path, data: dict) -> None:
+    tmp = _temp_path(path)
+    tmp.write_text(_compact_json(data), encoding="utf-8")
+    tmp.replace(path)
+
+
+def save_document_analysis(doc_id: str, analysis: dict) -> Optional[dict]:
+    """在文件旁保存斷詞結果，供之後以不同選項重新產生 HTML"""
+    def store_analysis(doc: dict) -> None:
+        doc["analysisFile"] = _write_document_file(f"{doc_id}.analysis.json", _compact_json(analysis))
+
+    return _modify_document_files(doc_id, store_analysis)
+
+
+def get_document_analysis(doc_id: str) -> Optional[dict]:
+    path = _document_file(get_document(doc_id), "analysisFile")
+    if path is None:
+        return None
+    return json.loads(_read_document_bytes(path))
+
+
+def save_document_fragment_keys(doc_id: str, version: str, keys: list[str]) -> Optional[dict]:
+    """保存斷詞結果中各行內容的雜湊，重新上傳時據此沿用未改變的行"""
+    def store_keys(doc: dict) -> None:
+        fragments_file = f"{doc_id}.fragments.json"
+        _write_compact_json(DOCUMENTS_DIR / fragments_file, {"version": version, "keys": keys})
+        doc["fragmentsFile"] = fragments_file
+
+    return _modify_document_files(doc_id, store_keys)
+
+
+def get_document_fragment_keys(doc_id: str, version: str) -> Optional[list[str]]:
+    """讀取各行雜湊；不存在或版本不符時回傳 None"""
+    doc = get_document(doc_id)
+    if not doc or not doc.get("fragmentsFile"):
         return None
-    html_path = DOCUMENTS_DIR / doc["htmlFile"]
-    if not html_path.exists():
+    fragments_path = DOCUMENTS_DIR / doc["fragmentsFile"]
+    if not fragments_path.exists():
         return None
-    return html_path.read_text(encoding="utf-8")
+    data = json.loads(fragments_path.read_text(encoding="utf-8"))
+    return data["keys"] if data.get("version") == version else None
+
+
+def get_document_tokens_bytes(doc_id: str) -> Optional[bytes]:
+    """讀取 token 格式檔案的內容（已解壓縮，可直接作為 JSON 回應）"""
+    path = _document_file(get_document(doc_id), "tokensFile")
+    if path is None:
+        return None
+    return _read_document_bytes(path)
+
+
+def get_document_tokens(doc_id: str) -> Optional[dict]:
+    raw = get_document_tokens_bytes(doc_id)
+    return None if raw is None else json.loads(raw)
 
 
 def update_translations(
     doc_id: str, provider: str, lang: str, translations: dict
 ) -> Optional[dict]:
-    library = load_library()
-    for doc in library["documents"]:
-        if doc["id"] == doc_id:
-            current = doc.setdefault("translations", {}).setdefault(provider, {}).setdefault(lang, {})
-            current.update(translations)
-            save_library(library)
-            return doc
-    return None
+    return _store().merge_translations(doc_id, provider, lang, translations)
+
+
+# 可壓縮的文件內容欄位
+_COMPRESSED_KEYS = ("htmlFile", "tokensFile", "analysisFile")
+
+
+def migrate_compressed_documents() -> int:
+    """將既有未壓縮的 HTML／token／斷詞結果檔案改存為 gzip，回傳轉換的檔案數"""
+    migrated = 0
+    for doc in _store().load()["documents"]:
+        updates = {}
+        for key in _COMPRESSED_KEYS:
+            name = doc.get(key)
+            if not name or name.endswith(".gz"):
+                continue
+            path = DOCUMENTS_DIR / name
+            if not path.exists():
+                continue
+            updates[key] = _write_document_file(name, path.read_text(encoding="utf-8"))
+        if updates:
+            # 未壓縮的舊檔案於記錄改指向新檔案後才刪除
+            _modify_document_files(doc["id"], lambda d: d.update(updates))
+            migrated += len(updates)
+    return migrated
+
+
+# ── 延遲轉換（lazy）模式 ──────────────────────────────────────────────────────
+# 保留原始 PDF，頁面於閱讀時才依需求轉換並存放於 DOCUMENTS_DIR/{doc_id}.pages/
+
+_LAZY_KEYS = ("sourceFile", "pageCount", "layout", "lazy")
+
+
+def _pages_dir(doc_id: str) -> Path:
+    return DOCUMENTS_DIR / f"{doc_id}.pages"
+
+
+def set_document_source(
+    doc_id: str, source: Union[bytes, str, Path], page_count: int, layout: str = "auto"
+) -> Optional[dict]:
+    """以延遲轉換模式儲存文件：保存原始 PDF 與總頁數，不預先轉換任何頁面"""
+    def store_source(doc: dict) -> None:
+        source_file = f"{doc_id}.pdf"
+        tmp = _temp_path(DOCUMENTS_DIR / source_file)
+        try:
+            if isinstance(source, (bytes, bytearray)):
+                tmp.write_bytes(source)
+            else:
+                shutil.copyfile(source, tmp)
+        except BaseException:
+            tmp.unlink(missing_ok=True)
+            raise
+        tmp.replace(DOCUMENTS_DIR / source_file)
+        _clear_document_content(doc)
+        doc["sourceFile"] = source_file
+        doc["pageCount"] = page_count
+        doc["layout"] = layout
+        doc["lazy"] = True
+        doc["uploadedAt"] = datetime.now().isoformat()
+
+    return _modify_document_files(doc_id, store_source, replace_pages=True)
+
+
+def document_source_path(doc_id: str) -> Path:
+    return DOCUMENTS_DIR / f"{doc_id}.pdf"
+
+
+def load_page_html(doc_id: str, page_nums: Iterable[int]) -> dict[int, str]:
+    """讀取已轉換的頁面 HTML，回傳 {頁碼: HTML}（未轉換的頁碼不會出現）。
+    頁面以 gzip 壓縮儲存；舊版未壓縮的 {頁碼}.html 仍可讀取。"""
+    pages_dir = _pages_dir(doc_id)
+    result = {}
+    for num in page_nums:
+        for path in (pages_dir / f"{num}.html.gz", pages_dir / f"{num}.html"):
+            if path.exists():
+                result[num] = _read_document_bytes(path).decode("utf-8")
+                break
+    return result
+
+
+def save_page_html(doc_id: str, page_num: int, html_content: str) -> None:
+    pages_dir = _pages_dir(doc_id)
+    pages_dir.mkdir(exist_ok=True)
+    path = pages_dir / f"{page_num}.html.gz"
+    tmp = _temp_path(path)
+    tmp.write_bytes(gzip.compress(html_content.encode("utf-8"), compresslevel=DOCUMENT_GZIP_LEVEL, mtime=0))
+    tmp.replace(path)
@@ -0,0 +1,694 @@
+"""書庫中繼資料（資料夾、標籤、文件、翻譯）的儲存後端。
+
+library_service 的函式只透過下列操作存取書庫，後端可替換而不影響呼叫端：
+
+- load() / save(library)：整份書庫（{"folders", "tags", "documents"}）
+- get_document / add_document / modify_document / remove_document
+- folder_count / add_folder / modify_folder / remove_folder
+- add_tag / remove_tag（同時移除資料夾與文件上的標籤參照）
+- merge_translations：合併單一文件、單一 provider／語言的翻譯
+- version()：內容改變（含其他行程修改檔案）時就會改變的版本標記
+
+load() 回傳後端內部快取的書庫物件，呼叫端不可修改；其餘讀取與修改操作
+回傳的文件／資料夾皆為複本。
+
+JsonLibraryStore 沿用 library.json 作為快照，變更附加到旁邊的日誌檔，
+定期壓縮回快照；書庫載入一次後保存在記憶體。
+SqliteLibraryStore 以資料表與索引存放，單一文件的變更只寫入該文件的資料列。
+
+從既有的 library.json 匯入 SQLite（於 backend/ 目錄）：
+    python -m app.services.library_store data/library.json data/library.db
+"""
+import copy
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import threading
+import warnings
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Optional
+
+
+def empty_library() -> dict:
+    return {"folders": [], "tags": [], "documents": []}
+
+
+def _find(items: list, item_id: str) -> Optional[dict]:
+    return next((item for item in items if item["id"] == item_id), None)
+
+
+def _without_tag(items: list, tag_id: str) -> None:
+    for item in items:
+        item["tagIds"] = [tid for tid in item.get("tagIds", []) if tid != tag_id]
+
+
+def _replace_file(path: Path, data: bytes) -> None:
+    """先寫入暫存檔並 fsync，再以 os.replace 取代：任何時間點中斷都只會留下舊檔或新檔"""
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    if hasattr(os, "O_DIRECTORY"):
+        # 確保 rename 本身也寫入磁碟（Windows 不支援對目錄 fsync）
+        fd = os.open(path.parent, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+def _diff(before: dict, after: dict) -> tuple[dict, list[str]]:
+    """(新增或變動的欄位, 被移除的欄位)"""
+    missing = object()
+    fields = {k: v for k, v in after.items() if before.get(k, missing) != v}
+    return fields, [k for k in before if k not in after]
+
+
+class JsonLibraryStore:
+    """快照（library.json）+ 只附加的變更日誌（library.json.journal）。
+
+    每次變更只在日誌附加一行 JSON 並 fsync，不重寫整個書庫；載入時讀取快照
+    再依序重播日誌。日誌超過 journal_max_bytes 時於背景執行緒壓縮：將記憶體中的
+    書庫以暫存檔 + os.replace 寫成新快照後清空日誌。寫入中途當機時，快照不會是
+    半個檔案，日誌最後一行不完整的記錄於重播時捨棄；中間損毀的記錄見 _replay。
+
+    日誌記錄皆為冪等操作（put／set／delete／untag／translate）：快照已取代但日誌
+    尚未清空時當機，重播已併入快照的記錄結果不變。
+
+    書庫載入後保存在記憶體，依快照與日誌的 mtime／大小／inode 偵測外部修改。
+    """
+
+    def __init__(self, path: Path, journal_max_bytes: int = 4 * 1024 * 1024):
+        self.path = path
+        self.journal_path = path.with_name(path.name + ".journal")
+        self.journal_max_bytes = journal_max_bytes
+        self._lock = threading.RLock()
+        self._cache: Optional[tuple[tuple, dict]] = None
+        self._doc_index: Optional[dict[str, int]] = None
+        self._writes = 0
+        self._compactor: Optional[threading.Thread] = None
+
+    @staticmethod
+    def _stat(path: Path) -> Optional[tuple]:
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size, st.st_ino
+
+    def _stat_key(self) -> tuple:
+        return self._stat(self.path), self._stat(self.journal_path)
+
+    def journal_size(self) -> int:
+        journal = self._stat(self.journal_path)
+        return journal[1] if journal else 0
+
+    def version(self) -> tuple:
+        """本行程的寫入次數 + 快照與日誌的檔案狀態；其他行程或手動修改檔案時也會改變"""
+        with self._lock:
+            return self._writes, self._stat_key()
+
+    def load(self) -> dict:
+        with self._lock:
+            return self._library()
+
+    def _library(self) -> dict:
+        """記憶體中的書庫；檔案狀態與上次讀寫時不同才重新載入（呼叫端須持有 _lock）"""
+        key = self._stat_key()
+        if self._cache is None or self._cache[0] != key:
+            library = json.loads(self.path.read_text(encoding="utf-8")) if key[0] else empty_library()
+            self._doc_index = None
+            if key[1]:
+                self._replay(library)
+            self._cache = (self._stat_key(), library)
+            self._maybe_compact()
+        return self._cache[1]
+
+    def _replay(self, library: dict) -> None:
+        """依序套用日誌記錄。
+
+        最後一行沒有換行字元是寫入中途當機留下的不完整記錄：截掉，之後的記錄才
+        不會接在殘缺的行後面。已完整寫入（有換行）卻無法解析的記錄是檔案損毀：
+        原始日誌附加保存到 .corrupt 檔，略過該記錄、照常套用其後的記錄，
+        並以原子寫入將日誌改為只含有效記錄（同時發出 RuntimeWarning）。
+        """
+        records, corrupt, complete = [], 0, 0
+        with open(self.journal_path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                complete += len(line)
+                try:
+                    changes = json.loads(line)["changes"]
+                    if not isinstance(changes, list):
+                        raise ValueError("changes must be a list")
+                except (ValueError, KeyError, TypeError):
+                    corrupt += 1
+                    continue
+                for change in changes:
+                    self._apply(library, change)
+                records.append(line)
+        if corrupt:
+            backup = self.journal_path.with_name(self.journal_path.name + ".corrupt")
+            with open(self.journal_path, "rb") as src, open(backup, "ab") as dst:
+                shutil.copyfileobj(src, dst)
+            _replace_file(self.journal_path, b"".join(records))
+            warnings.warn(f"書庫日誌中 {corrupt} 筆損毀的記錄已略過，原始日誌保存於 {backup}", RuntimeWarning)
+        elif complete < self.journal_size():
+            with open(self.journal_path, "r+b") as f:
+                f.truncate(complete)
+
+    def _position(self, library: dict, kind: str, item_id: str) -> Optional[int]:
+        if kind == "documents":
+            if self._doc_index is None:
+                self._doc_index = {doc["id"]: i for i, doc in enumerate(library["documents"])}
+            return self._doc_index.get(item_id)
+        return next((i for i, item in enumerate(library[kind]) if item["id"] == item_id), None)
+
+    def _apply(self, library: dict, change: dict) -> None:
+        op, kind = change["op"], change.get("kind")
+        if op == "put":
+            item = change["item"]
+            position = self._position(library, kind, item["id"])
+            if position is None:
+                library[kind].append(item)
+                if kind == "documents" and self._doc_index is not None:
+                    self._doc_index[item["id"]] = len(library[kind]) - 1
+            else:
+                library[kind][position] = item
+        elif op == "set":
+            position = self._position(library, kind, change["id"])
+            if position is not None:
+                item = library[kind][position]
+                item.update(change["fields"])
+                for key in change["unset"]:
+                    item.pop(key, None)
+        elif op == "delete":
+            ids = set(change["ids"])
+            library[kind] = [item for item in library[kind] if item["id"] not in ids]
+            if kind == "documents":
+                self._doc_index = None
+        elif op == "untag":
+            library["tags"] = [t for t in library["tags"] if t["id"] != change["id"]]
+            _without_tag(library["folders"], change["id"])
+            _without_tag(library["documents"], change["id"])
+        elif op == "translate":
+            position = self._position(library, "documents", change["id"])
+            if position is not None:
+                doc = library["documents"][position]
+                current = doc.setdefault("translations", {}).setdefault(change["provider"], {})
+                current.setdefault(change["lang"], {}).update(change["translations"])
+        else:
+            raise ValueError(f"未知的書庫日誌操作：{op}")
+
+    def _commit(self, library: dict, changes: list[dict]) -> None:
+        """先將變更附加到日誌並 fsync，再套用到記憶體中的書庫（呼叫端須持有 _lock）"""
+        record = json.dumps({"changes": changes}, ensure_ascii=False, separators=(",", ":")) + "\n"
+        with open(self.journal_path, "ab") as f:
+            f.write(record.encode("utf-8"))
+            f.flush()
+            os.fsync(f.fileno())
+        # 套用解析後的記錄而非呼叫端的物件：記憶體內容與重播結果一致，也不與呼叫端共用
+        for change in json.loads(record)["changes"]:
+            self._apply(library, change)
+        self._cache = (self._stat_key(), library)
+        self._writes += 1
+        self._maybe_compact()
+
+    def _maybe_compact(self) -> None:
+        if self.journal_size() <= self.journal_max_bytes:
+            return
+        if self._compactor is not None and self._compactor.is_alive():
+            return
+        self._compactor = threading.Thread(target=self.compact, name="library-compactor", daemon=True)
+        self._compactor.start()
+
+    def compact(self) -> None:
+        """將日誌併入快照：原子寫入新快照後清空日誌"""
+        with self._lock:
+            library = self._library()
+            self._write_snapshot(library)
+
+    def _write_snapshot(self, library: dict) -> None:
+        _replace_file(self.path, json.dumps(library, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+        self.journal_path.unlink(missing_ok=True)
+        self._cache = (self._stat_key(), library)
+        self._writes += 1
+
+    def save(self, library: dict) -> None:
+        """以整份書庫取代快照並清空日誌"""
+        with self._lock:
+            self._doc_index = None
+            self._write_snapshot(copy.deepcopy(library))
+
+    def close(self) -> None:
+        compactor = self._compactor
+        if compactor is not None:
+            compactor.join()
+
+    def _modify(self, kind: str, item_id: str, fn: Callable[[dict], object]) -> Optional[dict]:
+        """複製項目後在鎖外以 fn 修改（可能串流寫入大型 HTML），只將變動的欄位寫入日誌；
+        fn 拋出例外時書庫不受影響。同一項目同時被修改時，各自變動的欄位都會保留。"""
+        with self._lock:
+            library = self._library()
+            position = self._position(library, kind, item_id)
+            if position is None:
+                return None
+            before = copy.deepcopy(library[kind][position])
+        item = copy.deepcopy(before)
+        fn(item)
+        fields, unset = _diff(before, item)
+        with self._lock:
+            library = self._library()
+            position = self._position(library, kind, item_id)
+            if position is None:
+                return None
+            if fields or unset:
+                self._commit(library, [{"op": "set", "kind": kind, "id": item_id, "fields": fields, "unset": unset}])
+            return copy.deepcopy(library[kind][position])
+
+    def _add(self, kind: str, item: dict) -> None:
+        with self._lock:
+            self._commit(self._library(), [{"op": "put", "kind": kind, "item": item}])
+
+    def get_document(self, doc_id: str) -> Optional[dict]:
+        with self._lock:
+            library = self._library()
+            position = self._position(library, "documents", doc_id)
+            return None if position is None else copy.deepcopy(library["documents"][position])
+
+    def add_document(self, doc: dict) -> None:
+        self._add("documents", doc)
+
+    def modify_document(self, doc_id: str, fn: Callable[[dict], object]) -> Optional[dict]:
+        return self._modify("documents", doc_id, fn)
+
+    def remove_document(self, doc_id: str) -> Optional[dict]:
+        with self._lock:
+            library = self._library()
+            position = self._position(library, "documents", doc_id)
+            if position is None:
+                return None
+            doc = library["documents"][position]
+            self._commit(library, [{"op": "delete", "kind": "documents", "ids": [doc_id]}])
+            return doc
+
+    def merge_translations(self, doc_id: str, provider: str, lang: str, translations: dict) -> Optional[dict]:
+        with self._lock:
+            library = self._library()
+            if self._position(library, "documents", doc_id) is None:
+                return None
+            self._commit(library, [{
+                "op": "translate", "id": doc_id, "provider": provider, "lang": lang,
+                "translations": translations,
+            }])
+            return copy.deepcopy(library["documents"][self._position(library, "documents", doc_id)])
+
+    def folder_count(self) -> int:
+        with self._lock:
+            return len(self._library()["folders"])
+
+    def add_folder(self, folder: dict) -> None:
+        self._add("folders", folder)
+
+    def modify_folder(self, folder_id: str, fn: Callable[[dict], object]) -> Optional[dict]:
+        return self._modify("folders", folder_id, fn)
+
+    def remove_folder(self, folder_id: str) -> Optional[list[dict]]:
+        """刪除資料夾及其中的文件，回傳被刪除的文件（資料夾不存在時回傳 None）"""
+        with self._lock:
+            library = self._library()
+            if _find(library["folders"], folder_id) is None:
+                return None
+            removed = [d for d in library["documents"] if d["folderId"] == folder_id]
+            self._commit(library, [
+                {"op": "delete", "kind": "folders", "ids": [folder_id]},
+                {"op": "delete", "kind": "documents", "ids": [d["id"] for d in removed]},
+            ])
+            return removed
+
+    def add_tag(self, tag: dict) -> None:
+        self._add("tags", tag)
+
+    def remove_tag(self, tag_id: str) -> bool:
+        with self._lock:
+            library = self._library()
+            if _find(library["tags"], tag_id) is None:
+                return False
+            self._commit(library, [{"op": "untag", "id": tag_id}])
+            return True
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS folders (
+    id TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS tags (
+    id TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS documents (
+    id TEXT PRIMARY KEY,
+    folder_id TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS documents_folder ON documents(folder_id);
+CREATE TABLE IF NOT EXISTS folder_tags (
+    folder_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    tag_id TEXT NOT NULL,
+    PRIMARY KEY (folder_id, position)
+);
+CREATE INDEX IF NOT EXISTS folder_tags_tag ON folder_tags(tag_id);
+CREATE TABLE IF NOT EXISTS document_tags (
+    doc_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    tag_id TEXT NOT NULL,
+    PRIMARY KEY (doc_id, position)
+);
+CREATE INDEX IF NOT EXISTS document_tags_tag ON document_tags(tag_id);
+CREATE TABLE IF NOT EXISTS translations (
+    doc_id TEXT NOT NULL,
+    provider TEXT NOT NULL,
+    lang TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (doc_id, provider, lang)
+);
+"""
+
+# 以資料表另外存放、不放在 data 欄位的欄位
+_SPLIT_KEYS = ("tagIds", "translations")
+
+
+def _dumps(data) -> str:
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
+
+class SqliteLibraryStore:
+    """資料夾／標籤／文件各一個資料表（欄位以 JSON 存於 data），
+    標籤參照與翻譯另以資料表存放並建立索引，刪除標籤、讀寫單一文件都不必掃描整個書庫。
+    清單順序即插入順序（rowid）。"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._writes = 0
+        self._loaded: Optional[tuple[tuple, dict]] = None
+
+    @contextmanager
+    def _transaction(self):
+        with self._lock, self._conn:
+            self._writes += 1
+            yield
+
+    def _version(self) -> tuple:
+        # data_version 只在其他連線提交變更時改變，本連線的寫入以 _writes 計數
+        return self._writes, self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def version(self) -> tuple:
+        with self._lock:
+            return self._version()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    # ── 讀取 ──
+
+    def _tag_ids(self, table: str, column: str, item_id: str) -> list[str]:
+        rows = self._conn.execute(
+            f"SELECT tag_id FROM {table} WHERE {column} = ? ORDER BY position", (item_id,)
+        )
+        return [tag_id for (tag_id,) in rows]
+
+    def _all_tag_ids(self, table: str, column: str) -> dict[str, list[str]]:
+        grouped: dict[str, list[str]] = {}
+        for item_id, tag_id in self._conn.execute(
+            f"SELECT {column}, tag_id FROM {table} ORDER BY {column}, position"
+        ):
+            grouped.setdefault(item_id, []).append(tag_id)
+        return grouped
+
+    def _translations(self, rows) -> dict:
+        translations: dict = {}
+        for provider, lang, data in rows:
+            translations.setdefault(provider, {})[lang] = json.loads(data)
+        return translations
+
+    def _read_document(self, doc_id: str) -> Optional[dict]:
+        row = self._conn.execute("SELECT data FROM documents WHERE id = ?", (doc_id,)).fetchone()
+        if row is None:
+            return None
+        doc = json.loads(row[0])
+        doc["tagIds"] = self._tag_ids("document_tags", "doc_id", doc_id)
+        doc["translations"] = self._translations(self._conn.execute(
+            "SELECT provider, lang, data FROM translations WHERE doc_id = ? ORDER BY rowid", (doc_id,)
+        ))
+        return doc
+
+    def _read_folder(self, folder_id: str) -> Optional[dict]:
+        row = self._conn.execute("SELECT data FROM folders WHERE id = ?", (folder_id,)).fetchone()
+        if row is None:
+            return None
+        folder = json.loads(row[0])
+        folder["tagIds"] = self._tag_ids("folder_tags", "folder_id", folder_id)
+        return folder
+
+    def load(self) -> dict:
+        """整份書庫；資料庫未變動時回傳上次組出的結果"""
+        with self._lock:
+            version = self._version()
+            if self._loaded is None or self._loaded[0] != version:
+                self._loaded = (version, self._read_library())
+            return self._loaded[1]
+
+    def _read_library(self) -> dict:
+        folder_tags = self._all_tag_ids("folder_tags", "folder_id")
+        folders = []
+        for folder_id, data in self._conn.execute("SELECT id, data FROM folders ORDER BY rowid"):
+            folder = json.loads(data)
+            folder["tagIds"] = folder_tags.get(folder_id, [])
+            folders.append(folder)
+        tags = [json.loads(data) for (data,) in self._conn.execute("SELECT data FROM tags ORDER BY rowid")]
+
+        doc_tags = self._all_tag_ids("document_tags", "doc_id")
+        translations: dict[str, list] = {}
+        for doc_id, provider, lang, data in self._conn.execute(
+            "SELECT doc_id, provider, lang, data FROM translations ORDER BY rowid"
+        ):
+            translations.setdefault(doc_id, []).append((provider, lang, data))
+        documents = []
+        for doc_id, data in self._conn.execute("SELECT id, data FROM documents ORDER BY rowid"):
+            doc = json.loads(data)
+            doc["tagIds"] = doc_tags.get(doc_id, [])
+            doc["translations"] = self._translations(translations.get(doc_id, ()))
+            documents.append(doc)
+        return {"folders": folders, "tags": tags, "documents": documents}
+
+    def get_document(self, doc_id: str) -> Optional[dict]:
+        with self._lock:
+            return self._read_document(doc_id)
+
+    def folder_count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM folders").fetchone()[0]
+
+    # ── 寫入（呼叫端須持有 _lock 並位於交易中） ──
+
+    def _write_tag_ids(self, table: str, column: str, item_id: str, tag_ids: list[str]) -> None:
+        self._conn.execute(f"DELETE FROM {table} WHERE {column} = ?", (item_id,))
+        self._conn.executemany(
+            f"INSERT INTO {table} ({column}, position, tag_id) VALUES (?, ?, ?)",
+            [(item_id, i, tag_id) for i, tag_id in enumerate(tag_ids)],
+        )
+
+    def _write_translations(self, doc_id: str, translations: dict) -> None:
+        self._conn.execute("DELETE FROM translations WHERE doc_id = ?", (doc_id,))
+        self._conn.executemany(
+            "INSERT INTO translations (doc_id, provider, lang, data) VALUES (?, ?, ?, ?)",
+            [
+                (doc_id, provider, lang, _dumps(data))
+                for provider, langs in translations.items()
+                for lang, data in langs.items()
+            ],
+        )
+
+    def _write_document(self, doc: dict, before: Optional[dict] = None) -> None:
+        """寫入文件資料列；提供 before 時只重寫有變動的標籤與翻譯"""
+        data = _dumps({k: v for k, v in doc.items() if k not in _SPLIT_KEYS})
+        if before is None:
+            self._conn.execute(
+                "INSERT INTO documents (id, folder_id, data) VALUES (?, ?, ?)",
+                (doc["id"], doc.get("folderId"), data),
+            )
+        else:
+            self._conn.execute(
+                "UPDATE documents SET folder_id = ?, data = ? WHERE id = ?",
+                (doc.get("folderId"), data, doc["id"]),
+            )
+        tag_ids = doc.get("tagIds", [])
+        if before is None or before.get("tagIds") != tag_ids:
+            self._write_tag_ids("document_tags", "doc_id", doc["id"], tag_ids)
+        translations = doc.get("translations", {})
+        if before is None or before.get("translations") != translations:
+            self._write_translations(doc["id"], translations)
+
+    def _write_folder(self, folder: dict, before: Optional[dict] = None) -> None:
+        data = _dumps({k: v for k, v in folder.items() if k != "tagIds"})
+        if before is None:
+            self._conn.execute("INSERT INTO folders (id, data) VALUES (?, ?)", (folder["id"], data))
+        else:
+            self._conn.execute("UPDATE folders SET data = ? WHERE id = ?", (data, folder["id"]))
+        tag_ids = folder.get("tagIds", [])
+        if before is None or before.get("tagIds") != tag_ids:
+            self._write_tag_ids("folder_tags", "folder_id", folder["id"], tag_ids)
+
+    def _delete_documents(self, where: str, params: tuple) -> None:
+        ids = f"SELECT id FROM documents WHERE {where}"
+        self._conn.execute(f"DELETE FROM document_tags WHERE doc_id IN ({ids})", params)
+        self._conn.execute(f"DELETE FROM translations WHERE doc_id IN ({ids})", params)
+        self._conn.execute(f"DELETE FROM documents WHERE {where}", params)
+
+    def save(self, library: dict) -> None:
+        """以整份書庫取代資料庫內容（匯入與測試用）"""
+        with self._transaction():
+            for table in ("folders", "tags", "documents", "folder_tags", "document_tags", "translations"):
+                self._conn.execute(f"DELETE FROM {table}")
+            for folder in library["folders"]:
+                self._write_folder(folder)
+            self._conn.executemany(
+                "INSERT INTO tags (id, data) VALUES (?, ?)",
+                [(tag["id"], _dumps(tag)) for tag in library["tags"]],
+            )
+            for doc in library["documents"]:
+                self._write_document(doc)
+
+    def add_document(self, doc: dict) -> None:
+        with self._transaction():
+            self._write_document(doc)
+
+    def modify_document(self, doc_id: str, fn: Callable[[dict], object]) -> Optional[dict]:
+        """讀出文件、以 fn 修改後只寫回變動的欄位。
+
+        fn 在鎖外執行（可能串流寫入大型 HTML），期間不阻擋其他請求；
+        寫回時重新讀取文件並套用 fn 造成的欄位差異，同一文件同時被修改時
+        各自變動的欄位都會保留，與 JSON 後端相同。
+        """
+        with self._lock:
+            doc = self._read_document(doc_id)
+        if doc is None:
+            return None
+        before = json.loads(_dumps(doc))
+        fn(doc)
+        fields, unset = _diff(before, doc)
+        with self._transaction():
+            current = self._read_document(doc_id)
+            if current is None or not (fields or unset):
+                return current
+            updated = {**current, **fields}
+            for key in unset:
+                updated.pop(key, None)
+            self._write_document(updated, current)
+        return updated
+
+    def remove_document(self, doc_id: str) -> Optional[dict]:
+        with self._transaction():
+            doc = self._read_document(doc_id)
+            if doc is not None:
+                self._delete_documents("id = ?", (doc_id,))
+        return doc
+
+    def merge_translations(self, doc_id: str, provider: str, lang: str, translations: dict) -> Optional[dict]:
+        with self._transaction():
+            if self._conn.execute("SELECT 1 FROM documents WHERE id = ?", (doc_id,)).fetchone() is None:
+                return None
+            row = self._conn.execute(
+                "SELECT data FROM translations WHERE doc_id = ? AND provider = ? AND lang = ?",
+                (doc_id, provider, lang),
+            ).fetchone()
+            current = json.loads(row[0]) if row else {}
+            current.update(translations)
+            self._conn.execute(
+                "INSERT INTO translations (doc_id, provider, lang, data) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (doc_id, provider, lang) DO UPDATE SET data = excluded.data",
+                (doc_id, provider, lang, _dumps(current)),
+            )
+            return self._read_document(doc_id)
+
+    def add_folder(self, folder: dict) -> None:
+        with self._transaction():
+            self._write_folder(folder)
+
+    def modify_folder(self, folder_id: str, fn: Callable[[dict], object]) -> Optional[dict]:
+        with self._transaction():
+            folder = self._read_folder(folder_id)
+            if folder is None:
+                return None
+            before = json.loads(_dumps(folder))
+            fn(folder)
+            self._write_folder(folder, before)
+        return folder
+
+    def remove_folder(self, folder_id: str) -> Optional[list[dict]]:
+        """刪除資料夾及其中的文件，回傳被刪除的文件（資料夾不存在時回傳 None）"""
+        with self._transaction():
+            if self._conn.execute("SELECT 1 FROM folders WHERE id = ?", (folder_id,)).fetchone() is None:
+                return None
+            removed = [
+                self._read_document(doc_id)
+                for (doc_id,) in self._conn.execute(
+                    "SELECT id FROM documents WHERE folder_id = ? ORDER BY rowid", (folder_id,)
+                ).fetchall()
+            ]
+            self._delete_documents("folder_id = ?", (folder_id,))
+            self._conn.execute("DELETE FROM folder_tags WHERE folder_id = ?", (folder_id,))
+            self._conn.execute("DELETE FROM folders WHERE id = ?", (folder_id,))
+        return removed
+
+    def add_tag(self, tag: dict) -> None:
+        with self._transaction():
+            self._conn.execute("INSERT INTO tags (id, data) VALUES (?, ?)", (tag["id"], _dumps(tag)))
+
+    def remove_tag(self, tag_id: str) -> bool:
+        with self._transaction():
+            deleted = self._conn.execute("DELETE FROM tags WHERE id = ?", (tag_id,)).rowcount
+            if not deleted:
+                return False
+            # 只重寫含有此標籤的資料夾／文件（以 tag_id 索引找出），保持其餘標籤的順序
+            for table, column in (("folder_tags", "folder_id"), ("document_tags", "doc_id")):
+                item_ids = [
+                    item_id for (item_id,) in self._conn.execute(
+                        f"SELECT DISTINCT {column} FROM {table} WHERE tag_id = ?", (tag_id,)
+                    ).fetchall()
+                ]
+                for item_id in item_ids:
+                    remaining = [tid for tid in self._tag_ids(table, column, item_id) if tid != tag_id]
+                    self._write_tag_ids(table, column, item_id, remaining)
+        return True
+
+
+def import_json(json_path: Path, db_path: Path) -> dict:
+    """將 library.json 的內容匯入（取代）SQLite 書庫，回傳各類項目數"""
+    library = JsonLibraryStore(json_path).load()
+    store = SqliteLibraryStore(db_path)
+    try:
+        store.save(library)
+    finally:
+        store.close()
+    return {kind: len(items) for kind, items in library.items()}
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        sys.exit("usage: python -m app.services.library_store <library.json> <library.db>")
+    print(import_json(Path(sys.argv[1]), Path(sys.argv[2])))
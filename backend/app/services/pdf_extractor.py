@@ -1,4 +1,26 @@
-import fitz
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from pathlib import Path
+from typing import TYPE_CHECKING, Iterator, Optional, Union
+
+if TYPE_CHECKING:
+    import fitz
+
+# PDF 來源：檔案路徑或記憶體中的 bytes
+PdfSource = Union[str, Path, bytes]
+
+# 平行擷取設定：worker 數（0 = 依 CPU 數決定）、啟用平行擷取的最少頁數
+EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", "0"))
+PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "40"))
+# 排版模式與文件層級偵測時抽樣的頁數
+LAYOUTS = ("auto", "vertical", "horizontal")
+LAYOUT_SAMPLE_PAGES = int(os.getenv("PDF_LAYOUT_SAMPLE_PAGES", "5"))
+# 單頁文字 block 數達此值時改用 NumPy 向量化引擎（block 少時 NumPy 的固定開銷反而較慢）
+GEOMETRY_MIN_BLOCKS = int(os.getenv("PDF_GEOMETRY_MIN_BLOCKS", "150"))
 
 
 def _has_vertical_text(blocks: list) -> bool:
@@ -116,37 +138,241 @@ def _extract_horizontal(text_blocks: list, avg_height: float) -> list[str]:
     return paragraphs
 
 
-def extract_text_by_pages(pdf_path: str) -> list[dict]:
+def _orientation_hint(text_blocks: list) -> Optional[bool]:
+    """以 block 長寬比快速推測排版：多數 block 高 > 寬為縦書き（True）、
+    多數寬 > 高為橫書き（False），兩者相近時無法判斷（None）"""
+    tall = sum(1 for b in text_blocks if b[3] - b[1] > b[2] - b[0])
+    ratio = tall / len(text_blocks)
+    if ratio >= 0.8:
+        return True
+    if ratio <= 0.2:
+        return False
+    return None
+
+
+def _text_blocks(blocks: list) -> list:
+    return [b for b in blocks if b[6] == 0 and b[4].strip()]
+
+
+def _detect_document_layout(doc: "fitz.Document", start: int, stop: int) -> bool:
+    """在第 start ~ stop-1 頁中抽樣 LAYOUT_SAMPLE_PAGES 頁（平均分布），
+    以多數決判斷文件是否為縦書き"""
+    span = stop - start
+    sample_count = min(LAYOUT_SAMPLE_PAGES, span)
+    indices = sorted({start + i * span // sample_count for i in range(sample_count)})
+    votes = []
+    for i in indices:
+        blocks = doc[i].get_text("blocks")
+        if _text_blocks(blocks):
+            votes.append(_has_vertical_text(blocks))
+    return sum(votes) * 2 > len(votes)
+
+
+def _extract_page(page, layout: str = "auto", doc_vertical: Optional[bool] = None) -> dict:
+    """擷取單一頁面的段落。
+
+    layout 為 vertical / horizontal 時直接採用；auto 時若已有文件層級判斷（doc_vertical）
+    且本頁 block 長寬比與之相符則沿用，否則才逐 block 檢查 _has_vertical_text。
+    """
+    blocks = page.get_text("blocks")
+    text_blocks = _text_blocks(blocks)
+
+    if not text_blocks:
+        return {"page_num": page.number + 1, "paragraphs": []}
+
+    if layout == "vertical":
+        vertical = True
+    elif layout == "horizontal":
+        vertical = False
+    elif doc_vertical is not None and _orientation_hint(text_blocks) == doc_vertical:
+        vertical = doc_vertical
+    else:
+        vertical = _has_vertical_text(blocks)
+
+    if len(text_blocks) >= GEOMETRY_MIN_BLOCKS:
+        # NumPy 只在遇到密集頁面時才載入，不拖慢冷啟動
+        from app.services import block_geometry
+
+        paragraphs = block_geometry.extract_paragraphs(text_blocks, vertical)
+    elif vertical:
+        # 縦書き：計算平均字高（block 高度 ÷ 行數）
+        char_heights = []
+        for b in text_blocks:
+            lines = [ln for ln in b[4].strip().split("\n") if ln]
+            if lines:
+                char_heights.append((b[3] - b[1]) / len(lines))
+        avg_char_h = sum(char_heights) / len(char_heights) if char_heights else 14.0
+        paragraphs = _extract_vertical(text_blocks, avg_char_h)
+    else:
+        heights = [b[3] - b[1] for b in text_blocks if b[3] - b[1] > 0]
+        avg_height = sum(heights) / len(heights) if heights else 12.0
+        paragraphs = _extract_horizontal(text_blocks, avg_height)
+
+    return {"page_num": page.number + 1, "paragraphs": paragraphs}
+
+
+def _open_pdf(source: PdfSource) -> "fitz.Document":
+    """開啟 PDF：bytes 直接從記憶體開啟，其餘視為檔案路徑"""
+    import fitz  # PyMuPDF 載入較慢，延到第一次開檔時
+
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return fitz.open(stream=source, filetype="pdf")
+    return fitz.open(source)
+
+
+# 平行 worker 內開啟的文件（每個 process 只開一次）
+_worker_doc: Optional["fitz.Document"] = None
+
+
+_worker_layout: tuple[str, Optional[bool]] = ("auto", None)
+
+
+def _init_worker(source: PdfSource, layout: str, doc_vertical: Optional[bool]) -> None:
+    global _worker_doc, _worker_layout
+    _worker_doc = _open_pdf(source)
+    _worker_layout = (layout, doc_vertical)
+
+
+def _extract_page_range(start: int, stop: int) -> list[dict]:
+    """平行 worker：擷取第 start ~ stop-1 頁（0-based）"""
+    return [_extract_page(_worker_doc[i], *_worker_layout) for i in range(start, stop)]
+
+
+def _resolve_workers(workers: Optional[int]) -> int:
+    if workers is None:
+        workers = EXTRACT_WORKERS
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+    return workers
+
+
+def _iter_parallel(
+    source: PdfSource,
+    first: int,
+    stop: int,
+    workers: int,
+    layout: str,
+    doc_vertical: Optional[bool],
+) -> Iterator[dict]:
+    """將第 first ~ stop-1 頁切成多個區段分派給 process pool，依頁序逐頁產出結果"""
+    # 區段數取 worker 數的數倍，讓各 worker 負載較平均
+    chunk_size = max(1, -(-(stop - first) // (workers * 4)))
+    ranges = [
+        (start, min(start + chunk_size, stop))
+        for start in range(first, stop, chunk_size)
+    ]
+    # 使用 spawn：伺服器行程內有執行緒，fork 可能複製到被鎖住的 lock
+    ctx = multiprocessing.get_context("spawn")
+    # 來源只在 worker 啟動時傳遞一次，各 worker 自行開啟自己的 fitz 文件
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=ctx,
+        initializer=_init_worker,
+        initargs=(source, layout, doc_vertical),
+    ) as executor:
+        # 同時最多 workers * 2 個區段在處理中，取出一個結果就補送一個：
+        # 下游較慢時不會在記憶體中累積整份文件的擷取結果
+        remaining = iter(ranges)
+        pending = deque(
+            executor.submit(_extract_page_range, start, end)
+            for start, end in islice(remaining, workers * 2)
+        )
+        try:
+            while pending:
+                chunk = pending.popleft().result()
+                next_range = next(remaining, None)
+                if next_range is not None:
+                    pending.append(executor.submit(_extract_page_range, *next_range))
+                yield from chunk
+        finally:
+            # 呼叫端提前停止時不再處理尚未開始的區段
+            for future in pending:
+                future.cancel()
+
+
+def count_pages(source: PdfSource) -> int:
+    """回傳 PDF 總頁數（不擷取文字）"""
+    doc = _open_pdf(source)
+    try:
+        return doc.page_count
+    finally:
+        doc.close()
+
+
+def iter_text_by_pages(
+    source: PdfSource,
+    workers: Optional[int] = None,
+    layout: str = "auto",
+    stats: Optional[dict] = None,
+    first_page: int = 1,
+    last_page: Optional[int] = None,
+) -> Iterator[dict]:
+    """逐頁產出 PDF 段落（generator），每頁擷取完成即可交給下游處理。
+
+    逐頁模式下同一時間只持有一頁的結果；平行模式依頁序產出。
+    參數與回傳項目格式同 extract_text_by_pages。
+    """
+    if layout not in LAYOUTS:
+        raise ValueError(f"layout 必須為 {'、'.join(LAYOUTS)}")
+
+    doc = _open_pdf(source)
+    try:
+        page_count = doc.page_count
+        # 頁碼範圍（1-based、含頭尾）轉為 0-based [start, stop)，超出範圍的部分截掉
+        start = max(first_page, 1) - 1
+        stop = page_count if last_page is None else min(last_page, page_count)
+        stop = max(stop, start)
+        workers = min(_resolve_workers(workers), stop - start)
+
+        doc_vertical = None
+        detect_start = time.perf_counter()
+        if layout == "auto" and stop > start:
+            doc_vertical = _detect_document_layout(doc, start, stop)
+        if stats is not None:
+            stats["layout"] = layout if layout != "auto" else (
+                "vertical" if doc_vertical else "horizontal"
+            )
+            stats["detect_ms"] = (time.perf_counter() - detect_start) * 1000
+            stats["total_pages"] = page_count
+
+        parallel = workers > 1 and stop - start >= PARALLEL_MIN_PAGES
+        if not parallel:
+            for i in range(start, stop):
+                yield _extract_page(doc[i], layout, doc_vertical)
+    finally:
+        doc.close()
+
+    if parallel:
+        # 平行模式由各 worker 自行開檔，主行程的文件已先關閉
+        yield from _iter_parallel(source, start, stop, workers, layout, doc_vertical)
+
+
+def extract_text_by_pages(
+    source: PdfSource,
+    workers: Optional[int] = None,
+    layout: str = "auto",
+    stats: Optional[dict] = None,
+    first_page: int = 1,
+    last_page: Optional[int] = None,
+) -> list[dict]:
     """從 PDF 逐頁提取文字，保留段落結構。
-    自動偵測縦書き（垂直）或橫書き（水平）排版。
+
+    layout="auto" 時先抽樣數頁判斷整份文件為縦書き（垂直）或橫書き（水平），
+    只有 block 統計與判斷不符的頁面才逐頁重新偵測。
+
+    頁數達 PARALLEL_MIN_PAGES 且 worker 數 > 1 時，改用 process pool 平行擷取，
+    結果與逐頁擷取完全相同。
+
+    Args:
+        source: PDF 檔案路徑，或已讀入記憶體的 PDF bytes
+        workers: 平行 worker 數；None 使用 EXTRACT_WORKERS，0 依 CPU 數決定，1 強制逐頁
+        layout: "auto" | "vertical" | "horizontal"，後兩者強制指定排版
+        stats: 若提供，寫入 {"layout": 判定結果, "detect_ms": 排版偵測耗時,
+            "total_pages": PDF 總頁數}
+        first_page: 起始頁碼（1-based，含）
+        last_page: 結束頁碼（含）；None 表示到最後一頁
 
     Returns:
         list of {"page_num": int, "paragraphs": list[str]}
     """
-    doc = fitz.open(pdf_path)
-    pages = []
-    for page in doc:
-        blocks = page.get_text("blocks")
-        text_blocks = [b for b in blocks if b[6] == 0 and b[4].strip()]
-
-        if not text_blocks:
-            pages.append({"page_num": page.number + 1, "paragraphs": []})
-            continue
-
-        if _has_vertical_text(blocks):
-            # 縦書き：計算平均字高（block 高度 ÷ 行數）
-            char_heights = []
-            for b in text_blocks:
-                lines = [ln for ln in b[4].strip().split("\n") if ln]
-                if lines:
-                    char_heights.append((b[3] - b[1]) / len(lines))
-            avg_char_h = sum(char_heights) / len(char_heights) if char_heights else 14.0
-            paragraphs = _extract_vertical(text_blocks, avg_char_h)
-        else:
-            heights = [b[3] - b[1] for b in text_blocks if b[3] - b[1] > 0]
-            avg_height = sum(heights) / len(heights) if heights else 12.0
-            paragraphs = _extract_horizontal(text_blocks, avg_height)
-
-        pages.append({"page_num": page.number + 1, "paragraphs": paragraphs})
-    doc.close()
-    return pages
+    return list(iter_text_by_pages(source, workers, layout, stats, first_page, last_page))
@@ -0,0 +1,172 @@
+"""使用者自訂讀音（角色名、社團用語等 MeCab 讀錯的詞）。
+
+詞條以 {表層形: 讀音} 存於 DATA_DIR/reading_overrides.json，變更時編譯成
+Aho-Corasick 自動機；每個段落只需掃描一次即可找出所有詞條，
+成本與詞條數量無關。多個詞條重疊時取最左、最長者。
+"""
+import hashlib
+import json
+import threading
+from collections import deque
+from typing import Optional
+
+from app.services.library_service import DATA_DIR
+
+OVERRIDES_FILE = DATA_DIR / "reading_overrides.json"
+
+_lock = threading.Lock()
+_entries: Optional[dict[str, str]] = None
+_matcher: Optional["Automaton"] = None
+_fingerprint = ""
+
+
+class Automaton:
+    """Aho-Corasick 自動機：goto 以 dict 表示，並預先算好 output link"""
+
+    def __init__(self, entries: dict[str, str]):
+        self.goto: list[dict[str, int]] = [{}]
+        self.output: list[Optional[tuple[int, str]]] = [None]
+        for surface, reading in entries.items():
+            state = 0
+            for ch in surface:
+                nxt = self.goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto[state][ch] = nxt
+                    self.goto.append({})
+                    self.output.append(None)
+                state = nxt
+            self.output[state] = (len(surface), reading)
+
+        # BFS 建立 failure link 與 output link（沿 failure 鏈最近的詞條結尾狀態）
+        self.fail = [0] * len(self.goto)
+        self.link = [0] * len(self.goto)
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self.goto[state].items():
+                queue.append(nxt)
+                f = self.fail[state]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                target = self.goto[f].get(ch, 0)
+                self.fail[nxt] = target if target != nxt else 0
+                fail_state = self.fail[nxt]
+                self.link[nxt] = fail_state if self.output[fail_state] else self.link[fail_state]
+
+    def find(self, text: str) -> list[tuple[int, int, str]]:
+        """回傳不重疊的 (起點, 長度, 讀音)，重疊時取最左、最長"""
+        goto, fail, output, link = self.goto, self.fail, self.output, self.link
+        longest: dict[int, tuple[int, str]] = {}
+        state = 0
+        for i, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            hit = state if output[state] else link[state]
+            while hit:
+                length, reading = output[hit]
+                start = i - length + 1
+                if length > longest.get(start, (0, ""))[0]:
+                    longest[start] = (length, reading)
+                hit = link[hit]
+
+        matches, cursor = [], 0
+        for start in sorted(longest):
+            if start >= cursor:
+                length, reading = longest[start]
+                matches.append((start, length, reading))
+                cursor = start + length
+        return matches
+
+
+def _load() -> dict[str, str]:
+    global _entries, _matcher, _fingerprint
+    if _entries is None:
+        entries = {}
+        if OVERRIDES_FILE.exists():
+            entries = json.loads(OVERRIDES_FILE.read_text(encoding="utf-8"))
+        _install(entries)
+    return _entries
+
+
+def _install(entries: dict[str, str]) -> None:
+    global _entries, _matcher, _fingerprint
+    _entries = entries
+    _matcher = Automaton(entries) if entries else None
+    _fingerprint = (
+        hashlib.sha256(json.dumps(entries, sort_keys=True, ensure_ascii=False).encode()).hexdigest()[:16]
+        if entries else ""
+    )
+
+
+def _save(entries: dict[str, str]) -> None:
+    OVERRIDES_FILE.parent.mkdir(parents=True, exist_ok=True)
+    tmp = OVERRIDES_FILE.with_suffix(".tmp")
+    tmp.write_text(json.dumps(entries, ensure_ascii=False, indent=2), encoding="utf-8")
+    tmp.replace(OVERRIDES_FILE)
+    _install(entries)
+
+
+def list_overrides() -> dict[str, str]:
+    with _lock:
+        return dict(_load())
+
+
+def set_override(surface: str, reading: str) -> None:
+    with _lock:
+        entries = dict(_load())
+        entries[surface] = reading
+        _save(entries)
+
+
+def delete_override(surface: str) -> bool:
+    with _lock:
+        entries = dict(_load())
+        if entries.pop(surface, None) is None:
+            return False
+        _save(entries)
+        return True
+
+
+def replace_overrides(entries: dict[str, str]) -> None:
+    """以整份詞條取代現有內容（匯入用）"""
+    with _lock:
+        _save(dict(entries))
+
+
+def fingerprint() -> str:
+    """目前詞條內容的雜湊（無詞條時為空字串），作為快取鍵的一部分"""
+    if _entries is None:
+        with _lock:
+            _load()
+    return _fingerprint
+
+
+def split_text(text: str) -> Optional[list[tuple[str, Optional[str]]]]:
+    """依自訂讀音切分段落：[(片段, 讀音或 None), ...]；沒有任何命中時回傳 None"""
+    if _entries is None:
+        with _lock:
+            _load()
+    matcher = _matcher
+    if matcher is None:
+        return None
+    matches = matcher.find(text)
+    if not matches:
+        return None
+    segments, cursor = [], 0
+    for start, length, reading in matches:
+        if start > cursor:
+            segments.append((text[cursor:start], None))
+        segments.append((text[start:start + length], reading))
+        cursor = start + length
+    if cursor < len(text):
+        segments.append((text[cursor:], None))
+    return segments
+
+
+def reset() -> None:
+    """丟棄記憶體中的詞條，下次使用時重新讀檔（測試用）"""
+    global _entries, _matcher, _fingerprint
+    with _lock:
+        _entries, _matcher, _fingerprint = None, None, ""
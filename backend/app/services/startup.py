@@ -0,0 +1,85 @@
+import importlib
+import os
+import threading
+import time
+from typing import Callable, Optional
+
+from app.services.timing import timed
+
+# 啟動後是否在背景執行暖機（載入 PyMuPDF、NumPy、tagger 與翻譯用客戶端）
+STARTUP_WARMUP = os.getenv("STARTUP_WARMUP", "1") != "0"
+
+_started = time.perf_counter()
+_imports: dict = {}
+_warmup: dict = {}
+_warmup_errors: dict = {}
+_warmup_done = threading.Event()
+_warmup_thread = None
+_ready_ms = None
+
+
+def record_import(name: str):
+    """計時 main.py 中的匯入區塊：with record_import("app.routers.convert"): ..."""
+    return timed(_imports, name)
+
+
+def mark_ready() -> None:
+    """應用程式可開始接受請求（lifespan 啟動完成）時呼叫"""
+    global _ready_ms
+    _ready_ms = (time.perf_counter() - _started) * 1000
+
+
+def _warm_furigana() -> None:
+    from app.services.furigana import add_furigana
+
+    add_furigana("漢字")
+
+
+# 暖機步驟：(名稱, 函式)，依序於背景執行緒執行
+WARMUP_STEPS: list[tuple[str, Callable[[], object]]] = [
+    ("fitz", lambda: importlib.import_module("fitz")),
+    ("numpy", lambda: importlib.import_module("app.services.block_geometry")),
+    ("furigana.tagger", _warm_furigana),
+    ("httpx", lambda: importlib.import_module("httpx")),
+    ("anthropic", lambda: importlib.import_module("anthropic")),
+]
+
+
+def _run_warmup() -> None:
+    try:
+        for name, step in WARMUP_STEPS:
+            try:
+                with timed(_warmup, name):
+                    step()
+            except Exception as e:
+                _warmup_errors[name] = str(e)
+    finally:
+        _warmup_done.set()
+
+
+def start_warmup() -> None:
+    """在背景執行緒暖機，不阻擋 /api/health 等請求（重複呼叫只會執行一次）"""
+    global _warmup_thread
+    if _warmup_thread is not None:
+        return
+    if not STARTUP_WARMUP:
+        _warmup_done.set()
+        return
+    _warmup_thread = threading.Thread(target=_run_warmup, name="startup-warmup", daemon=True)
+    _warmup_thread.start()
+
+
+def wait_for_warmup(timeout: Optional[float] = None) -> bool:
+    """等待背景暖機結束，回傳是否已完成"""
+    return _warmup_done.wait(timeout)
+
+
+def startup_report() -> dict:
+    """各模組匯入與初始化耗時（毫秒）"""
+    return {
+        "imports_ms": {name: round(ms, 1) for name, ms in _imports.items()},
+        "warmup_ms": {name: round(ms, 1) for name, ms in _warmup.items()},
+        "warmup_errors": dict(_warmup_errors),
+        "warmup_done": _warmup_done.is_set(),
+        "ready_ms": None if _ready_ms is None else round(_ready_ms, 1),
+    }
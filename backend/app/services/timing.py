@@ -0,0 +1,18 @@
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+
+@contextmanager
+def timed(metrics: dict, name: str) -> Iterator[None]:
+    """量測區塊耗時（毫秒），寫入 metrics[name]"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics[name] = (time.perf_counter() - start) * 1000
+
+
+def server_timing(metrics: dict) -> str:
+    """將 {名稱: 毫秒} 轉為 HTTP Server-Timing 標頭值"""
+    return ", ".join(f"{name};dur={ms:.1f}" for name, ms in metrics.items())
@@ -0,0 +1,125 @@
+"""振り仮名用的斷詞後端。
+
+furigana 模組只依賴 fugashi 的介面：tagger(text) 回傳節點序列，節點有
+surface 與 feature.kana（片假名讀音）、feature.pos1（品詞）；tagger 另有
+dictionary_info（[{"filename", "size", "version"}, ...]）作為快取鍵。
+其他分析器以轉接器包成相同介面後註冊即可，不必修改 furigana。
+
+預設後端由環境變數 FURIGANA_TOKENIZER 決定；後端套件一律在建立 tagger 時
+才匯入，未安裝的後端不影響其他功能。
+"""
+import importlib.util
+import os
+from typing import Callable, NamedTuple, Optional
+
+FURIGANA_TOKENIZER = os.getenv("FURIGANA_TOKENIZER", "fugashi")
+
+
+class Feature(NamedTuple):
+    kana: Optional[str]
+    pos1: Optional[str]
+
+
+class Word(NamedTuple):
+    surface: str
+    feature: Feature
+
+
+def _dictionary_info(name: str, version: str) -> list[dict]:
+    return [{"filename": name, "size": 0, "version": version}]
+
+
+def _fugashi() -> object:
+    import fugashi
+
+    return fugashi.Tagger()
+
+
+class JanomeTagger:
+    """Janome（純 Python，內建 IPADIC）轉接器"""
+
+    def __init__(self):
+        import janome
+        from janome.tokenizer import Tokenizer
+
+        self._tokenizer = Tokenizer()
+        self.dictionary_info = _dictionary_info("janome", getattr(janome, "__version__", "?"))
+
+    def __call__(self, text: str) -> list[Word]:
+        words = []
+        for token in self._tokenizer.tokenize(text):
+            reading = token.reading if token.reading != "*" else None
+            words.append(Word(token.surface, Feature(reading, token.part_of_speech.split(",")[0])))
+        return words
+
+
+class SudachiTagger:
+    """SudachiPy（需另裝 sudachidict_core 等辭典）轉接器，使用 C 模式（最長單位）"""
+
+    def __init__(self):
+        from importlib import metadata
+
+        from sudachipy import Dictionary, SplitMode
+
+        self._tokenizer = Dictionary().create()
+        self._mode = SplitMode.C
+        self.dictionary_info = _dictionary_info("sudachipy", metadata.version("SudachiPy"))
+
+    def __call__(self, text: str) -> list[Word]:
+        return [
+            Word(m.surface(), Feature(m.reading_form() or None, m.part_of_speech()[0]))
+            for m in self._tokenizer.tokenize(text, self._mode)
+        ]
+
+
+# 後端名稱 → (提供後端的模組, 建立 tagger 的函式)
+_BACKENDS: dict[str, tuple[str, Callable[[], object]]] = {
+    "fugashi": ("fugashi", _fugashi),
+    "janome": ("janome", JanomeTagger),
+    "sudachipy": ("sudachipy", SudachiTagger),
+}
+
+_active = FURIGANA_TOKENIZER
+
+
+def register_backend(name: str, factory: Callable[[], object], module: Optional[str] = None) -> None:
+    """註冊斷詞後端；module 為其依賴的套件名稱，用於判斷是否已安裝"""
+    _BACKENDS[name] = (module or "", factory)
+
+
+def backend_names() -> list[str]:
+    return list(_BACKENDS)
+
+
+def available_backends() -> list[str]:
+    """已安裝（可建立 tagger）的後端名稱"""
+    return [
+        name for name, (module, _) in _BACKENDS.items()
+        if not module or importlib.util.find_spec(module) is not None
+    ]
+
+
+def backend_factory(name: str) -> Callable[[], object]:
+    """取得後端的 tagger 建構函式；未知名稱時拋出 ValueError"""
+    try:
+        return _BACKENDS[name][1]
+    except KeyError:
+        raise ValueError(f"未知的斷詞後端：{name}（可用：{'、'.join(_BACKENDS)}）") from None
+
+
+def active_backend() -> str:
+    """目前 furigana 使用的後端名稱"""
+    return _active
+
+
+def use_backend(name: str) -> None:
+    """切換 furigana 的斷詞後端（重設 tagger pool 並清空段落快取）。
+
+    未安裝對應套件時拋出 ImportError，目前的後端維持不變。
+    """
+    global _active
+    from app.services import furigana
+
+    factory = backend_factory(name)
+    furigana.set_tagger(factory(), factory)
+    _active = name
@@ -1,8 +1,18 @@
+import importlib
 import json
 import os
 
-import anthropic
-import httpx
+# anthropic／httpx 匯入成本高（anthropic 超過 1 秒），延到第一次翻譯時才載入
+_LAZY_MODULES = ("anthropic", "httpx")
+
+
+def __getattr__(name: str):
+    """translator.anthropic / translator.httpx 於第一次存取時才匯入"""
+    if name in _LAZY_MODULES:
+        module = importlib.import_module(name)
+        globals()[name] = module
+        return module
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # DeepL target_lang 對應表
 _DEEPL_LANG_MAP = {
@@ -45,6 +55,8 @@ async def _translate_deepl(
 
     deepl_target = _DEEPL_LANG_MAP.get(target_lang, target_lang.upper())
 
+    import httpx
+
     async with httpx.AsyncClient() as client:
         response = await client.post(
             "https://api-free.deepl.com/v2/translate",
@@ -68,6 +80,8 @@ async def _translate_google(
     if not api_key:
         raise ValueError("未設定 GOOGLE_API_KEY")
 
+    import httpx
+
     async with httpx.AsyncClient() as client:
         response = await client.post(
             "https://translation.googleapis.com/language/translate/v2",
@@ -101,6 +115,8 @@ async def _translate_claude(
         f"段落：\n{json.dumps(texts, ensure_ascii=False)}"
     )
 
+    import anthropic
+
     client = anthropic.AsyncAnthropic(api_key=api_key)
     message = await client.messages.create(
         model="claude-haiku-4-5-20251001",
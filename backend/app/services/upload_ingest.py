@@ -0,0 +1,42 @@
+import os
+import tempfile
+from pathlib import Path
+
+from app.services.pdf_extractor import PdfSource
+
+# 上傳檔案不超過此大小時直接在記憶體中交給 fitz，超過則分塊寫入暫存檔
+SPOOL_THRESHOLD = int(os.getenv("UPLOAD_SPOOL_THRESHOLD", str(32 * 1024 * 1024)))
+CHUNK_SIZE = 1024 * 1024
+
+
+async def ingest_pdf_upload(upload) -> PdfSource:
+    """讀取上傳的 PDF，回傳可直接交給 pdf_extractor 的來源。
+
+    小於 SPOOL_THRESHOLD 時回傳 bytes（由 fitz.open(stream=...) 直接開啟，不落地）；
+    超過時以 CHUNK_SIZE 分塊寫入暫存檔並回傳路徑，避免整份檔案讀進記憶體。
+    使用完畢須呼叫 release_pdf_source 清除暫存檔。
+
+    Args:
+        upload: UploadFile 或任何提供 async read(size) 的物件
+    """
+    buffer = bytearray()
+    while chunk := await upload.read(CHUNK_SIZE):
+        buffer += chunk
+        if len(buffer) > SPOOL_THRESHOLD:
+            return await _spool_to_disk(upload, buffer)
+    return bytes(buffer)
+
+
+async def _spool_to_disk(upload, head: bytearray) -> str:
+    with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as tmp:
+        tmp.write(head)
+        head.clear()
+        while chunk := await upload.read(CHUNK_SIZE):
+            tmp.write(chunk)
+        return tmp.name
+
+
+def release_pdf_source(source: PdfSource) -> None:
+    """清除 ingest_pdf_upload 產生的暫存檔（記憶體來源不需處理）"""
+    if isinstance(source, (str, Path)):
+        Path(source).unlink(missing_ok=True)
@@ -0,0 +1,91 @@
+"""比較 pdf_extractor 逐一比對版與 block_geometry 向量化版的版面重建速度。
+
+執行方式（於 backend/ 目錄）：
+    python -m benchmarks.bench_block_geometry
+"""
+import random
+import time
+
+from app.services import block_geometry as geo
+from app.services.pdf_extractor import _extract_horizontal, _extract_vertical
+
+
+def subtitle_dump_blocks(count: int, seed: int = 0) -> list:
+    """模擬小字級字幕傾印：每行 1~4 個 block、行高 4pt 的橫書き頁面"""
+    rng = random.Random(seed)
+    blocks, y = [], 0.0
+    while len(blocks) < count:
+        x = 10.0
+        for _ in range(rng.randint(1, 4)):
+            w = rng.uniform(20, 80)
+            blocks.append((x, y, x + w, y + 4.0, f"字幕{len(blocks)}\n", len(blocks), 0))
+            x += w + 2
+        y += rng.choice([4.5, 4.5, 4.5, 8.0])
+    return blocks[:count]
+
+
+def overlapping_blocks(count: int, seed: int = 0) -> list:
+    """模擬行距小於字高的密集字幕：相鄰 block 在 Y 方向互相重疊，整頁合併成少數幾行"""
+    rng = random.Random(seed)
+    return [
+        (rng.uniform(0, 500), i * 0.5, rng.uniform(500, 600), i * 0.5 + 6.0, f"字幕{i}\n", i, 0)
+        for i in range(count)
+    ]
+
+
+def vertical_dense_blocks(count: int, seed: int = 0) -> list:
+    """模擬小字級縦書き頁面：多欄、每欄多個短 block"""
+    rng = random.Random(seed)
+    blocks, x, y = [], 5000.0, 0.0
+    while len(blocks) < count:
+        n = rng.randint(2, 6)
+        h = n * 4.0
+        blocks.append((x, y, x + 4.0, y + h, "\n".join("縦" * n) + "\n", len(blocks), 0))
+        y += h + rng.choice([1.0, 1.0, 6.0])
+        if y > 800:
+            x, y = x - 5.0, 0.0
+    return blocks
+
+
+def _python_paragraphs(text_blocks: list, vertical: bool) -> list[str]:
+    """pdf_extractor._extract_page 的逐一比對路徑（含平均高度計算）"""
+    if vertical:
+        char_heights = []
+        for b in text_blocks:
+            lines = [ln for ln in b[4].strip().split("\n") if ln]
+            if lines:
+                char_heights.append((b[3] - b[1]) / len(lines))
+        return _extract_vertical(text_blocks, sum(char_heights) / len(char_heights))
+    heights = [b[3] - b[1] for b in text_blocks if b[3] - b[1] > 0]
+    return _extract_horizontal(text_blocks, sum(heights) / len(heights))
+
+
+def _time(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main() -> None:
+    print(f"{'layout':<12}{'blocks':>8}{'python ms':>12}{'numpy ms':>12}{'speedup':>10}")
+    for count in (100, 500, 2000, 5000, 10000):
+        for layout, make in (
+            ("horizontal", subtitle_dump_blocks),
+            ("overlapping", overlapping_blocks),
+            ("vertical", vertical_dense_blocks),
+        ):
+            blocks = make(count)
+            vertical = layout == "vertical"
+            py = lambda: _python_paragraphs(blocks, vertical)  # noqa: E731
+            vec = lambda: geo.extract_paragraphs(blocks, vertical)  # noqa: E731
+            assert py() == vec()
+            repeat = 3 if count >= 5000 else 10
+            py_ms, vec_ms = _time(py, repeat), _time(vec, repeat)
+            print(f"{layout:<12}{count:>8}{py_ms:>12.2f}{vec_ms:>12.2f}{py_ms / vec_ms:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
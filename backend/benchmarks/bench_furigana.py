@@ -0,0 +1,135 @@
+"""比較逐段 add_furigana（原始實作）與 add_furigana_batch 的每段落成本。
+
+"no cache" 停用段落與詞素快取，只比較斷詞後產生 ruby HTML 的部分；
+"morpheme" 只啟用詞素快取；另外列出兩者皆啟用時重複台詞很多的腳本的結果。
+
+最後比較多執行緒並行轉換（共用 tagger pool）的吞吐量，
+以及大型文件在本行程與 furigana_pool 多行程下的總時間。
+
+執行方式（於 backend/ 目錄）：
+    python -m benchmarks.bench_furigana
+    python -m benchmarks.bench_furigana --workers 4   # 指定 pool worker 數
+"""
+import argparse
+import random
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.services import furigana, furigana_pool
+
+LINES = (
+    "第一章の台詞です",
+    "今日は東京の大きい都市を散歩しました",
+    "耳元で囁く声が聞こえる",
+    "ゆっくり深呼吸して、力を抜いてください",
+    "【効果音】雨の音",
+    "お疲れ様でした、また明日",
+    "ヴァイオリンの演奏が始まる",
+    "心臓の鼓動をゆっくり数えていきましょう",
+)
+
+
+def script_paragraphs(count: int, unique_ratio: float = 1.0, seed: int = 0) -> list[str]:
+    """模擬腳本段落；unique_ratio < 1 時重複台詞比例提高"""
+    rng = random.Random(seed)
+    unique = max(1, int(count * unique_ratio))
+    pool = [f"{rng.choice(LINES)}{i}回目" for i in range(unique)]
+    return [pool[i % unique] if unique_ratio < 1 else pool[i] for i in range(count)]
+
+
+def legacy_add_furigana(text: str) -> str:
+    """優化前的 add_furigana：每個詞都解析 feature、逐詞跑 regex 與逐字轉換"""
+    if not text:
+        return ""
+    result = []
+    for word in furigana.get_tagger()(text):
+        surface = word.surface
+        reading = word.feature.kana
+        if reading and bool(re.search(r"[\u4e00-\u9fff]", surface)):
+            hiragana = "".join(
+                chr(ord(c) - 0x60) if "\u30a1" <= c <= "\u30f6" else c for c in reading
+            )
+            result.append(f"<ruby>{surface}<rp>(</rp><rt>{hiragana}</rt><rp>)</rp></ruby>")
+        else:
+            result.append(surface)
+    return "".join(result)
+
+
+def _time(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench_threads(documents: int, paragraphs: int) -> None:
+    """多份文件同時轉換：1 個與 8 個執行緒的吞吐量（停用段落快取）"""
+    docs = [script_paragraphs(paragraphs, seed=n) for n in range(documents)]
+    expected = [furigana.add_furigana_batch(d) for d in docs]
+    furigana.configure_furigana_cache(0)
+    print()
+    for threads in (1, 8):
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            start = time.perf_counter()
+            results = list(pool.map(furigana.add_furigana_batch, docs))
+            elapsed = time.perf_counter() - start
+        assert results == expected
+        print(
+            f"threads x{threads}: {documents / elapsed:>8.1f} docs/s"
+            f"  taggers {furigana.tagger_pool_stats()['created']}"
+        )
+
+
+def bench_pool(count: int, workers: int) -> None:
+    """大型文件：本行程批次 vs process pool（停用快取，pool 先暖機不計入）"""
+    paragraphs = script_paragraphs(count)
+    furigana.configure_furigana_cache(0)
+    furigana_pool.warm_up_pool(workers)
+    serial = _time(lambda: furigana.add_furigana_batch(paragraphs), 3)
+    pooled = _time(lambda: furigana_pool.furigana_batch(paragraphs, workers=workers), 3)
+    print(
+        f"\npool x{workers}: {count} paragraphs  serial {serial * 1000:.0f} ms"
+        f"  pool {pooled * 1000:.0f} ms  {serial / pooled:.1f}x"
+    )
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=0, help="pool worker 數（0 = CPU 數）")
+    args = parser.parse_args(argv)
+
+    print(f"{'case':<22}{'paragraphs':>11}{'legacy us/p':>13}{'batch us/p':>12}{'speedup':>10}")
+    original_size = furigana.FURIGANA_CACHE_SIZE
+    original_bytes = furigana.FURIGANA_MORPHEME_CACHE_BYTES
+    try:
+        for label, unique_ratio, cache_size, morpheme_bytes in (
+            ("unique, no cache", 1.0, 0, 0),
+            ("unique, morpheme", 1.0, 0, original_bytes),
+            ("repetitive, cached", 0.1, original_size, original_bytes),
+        ):
+            for count in (100, 1000, 5000):
+                paragraphs = script_paragraphs(count, unique_ratio)
+                furigana.configure_furigana_cache(cache_size)
+                furigana.configure_morpheme_cache(morpheme_bytes)
+                assert furigana.add_furigana_batch(paragraphs) == [legacy_add_furigana(p) for p in paragraphs]
+
+                legacy = _time(lambda: [legacy_add_furigana(p) for p in paragraphs], 5)
+                furigana.configure_furigana_cache(cache_size)
+                batch = _time(lambda: furigana.add_furigana_batch(paragraphs), 5)
+                print(
+                    f"{label:<22}{count:>11}{legacy / count * 1e6:>13.1f}"
+                    f"{batch / count * 1e6:>12.1f}{legacy / batch:>9.1f}x"
+                )
+        bench_threads(32, 200)
+        bench_pool(20000, furigana_pool.resolve_workers(args.workers))
+    finally:
+        furigana_pool.shutdown_pool()
+        furigana.configure_furigana_cache(original_size)
+        furigana.configure_morpheme_cache(original_bytes)
+
+
+if __name__ == "__main__":
+    main()
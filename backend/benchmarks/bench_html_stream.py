@@ -0,0 +1,91 @@
+"""比較一次組出整份 HTML 與產生器串流兩種方式，每次轉換的記憶體峰值（tracemalloc）。
+
+- buffered：generate_html → json.dumps 回應 → 寫入文件檔（優化前的 /convert 與上傳流程）
+- streamed：iter_html 逐頁產生，JSON 片段直接寫出、HTML 片段直接寫入文件檔
+
+輸入段落本身的記憶體不計入；段落與詞素快取停用，以免快取內容被算進峰值。
+
+執行方式（於 backend/ 目錄）：
+    python -m benchmarks.bench_html_stream
+"""
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from app.services import furigana
+from app.services.converter import _json_chunks
+from app.services.html_generator import generate_html, iter_html
+from benchmarks.bench_furigana import script_paragraphs
+
+PARAGRAPHS_PER_PAGE = 20
+
+
+def make_pages(count: int) -> list[dict]:
+    paragraphs = script_paragraphs(count * PARAGRAPHS_PER_PAGE)
+    return [
+        {"page_num": n + 1, "paragraphs": paragraphs[n * PARAGRAPHS_PER_PAGE:(n + 1) * PARAGRAPHS_PER_PAGE]}
+        for n in range(count)
+    ]
+
+
+def buffered(pages: list[dict], path: Path) -> int:
+    html = generate_html(pages)
+    body = json.dumps({"html": html, "page_count": len(pages)}, ensure_ascii=False)
+    path.write_text(html, encoding="utf-8")
+    return len(body)
+
+
+def streamed(pages: list[dict], path: Path) -> int:
+    size = 0
+    with open(os.devnull, "w", encoding="utf-8") as client, open(path, "w", encoding="utf-8") as f:
+
+        def tee():
+            for fragment in iter_html(pages):
+                f.write(fragment)
+                yield fragment
+
+        for chunk in _json_chunks({"page_count": len(pages)}, tee()):
+            client.write(chunk)
+            size += len(chunk)
+    return size
+
+
+def measure(fn, pages: list[dict], path: Path) -> tuple[float, float, int]:
+    """(峰值 MB, 秒, 回應字數)"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    size = fn(pages, path)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 1024 / 1024, elapsed, size
+
+
+def main() -> None:
+    original_size = furigana.FURIGANA_CACHE_SIZE
+    original_bytes = furigana.FURIGANA_MORPHEME_CACHE_BYTES
+    furigana.configure_furigana_cache(0)
+    furigana.configure_morpheme_cache(0)
+    print(f"{'pages':>6}{'html MB':>9}{'buffered MB':>13}{'streamed MB':>13}{'buffered s':>12}{'streamed s':>12}")
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "doc.html"
+            for count in (100, 500, 2000):
+                pages = make_pages(count)
+                furigana.add_furigana("漢字")  # 先建立 tagger，不計入峰值
+                b_peak, b_time, size = measure(buffered, pages, path)
+                s_peak, s_time, _ = measure(streamed, pages, path)
+                print(
+                    f"{count:>6}{size / 1024 / 1024:>9.1f}{b_peak:>13.1f}{s_peak:>13.1f}"
+                    f"{b_time:>12.2f}{s_time:>12.2f}"
+                )
+    finally:
+        furigana.configure_furigana_cache(original_size)
+        furigana.configure_morpheme_cache(original_bytes)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""比較書庫儲存後端（json / sqlite）在不同文件數下的單次操作延遲（p50）。
+
+- get：get_document
+- patch：update_document（只改 lastPage，閱讀中最頻繁的請求）
+- translate：update_translations（一個段落）
+- create：create_document
+- list：library_json（GET /api/library 的回應內容）
+- KB/patch：patch 期間每次呼叫寫出的位元組（/proc/self/io 的 wchar，僅 Linux）
+
+書庫建立於暫存目錄，不影響 data/；每份文件附 20 段翻譯。
+
+執行方式（於 backend/ 目錄）：
+    python -m benchmarks.bench_library
+    python -m benchmarks.bench_library --sizes 1000 10000 50000
+"""
+import argparse
+import random
+import statistics
+import tempfile
+import time
+from pathlib import Path
+from typing import Optional
+
+import app.services.library_service as lib_svc
+from app.services.library_store import JsonLibraryStore, import_json
+
+FOLDERS = 50
+TRANSLATED_PARAGRAPHS = 20
+
+
+def make_library(count: int) -> dict:
+    folders = [{"id": f"f-{i:08x}", "name": f"資料夾{i}", "order": i, "tagIds": []} for i in range(FOLDERS)]
+    tags = [{"id": f"t-{i:08x}", "name": f"標籤{i}", "color": "#888888"} for i in range(10)]
+    documents = [
+        {
+            "id": f"doc-{i:08x}",
+            "name": f"腳本{i}",
+            "folderId": folders[i % FOLDERS]["id"],
+            "tagIds": [tags[i % 10]["id"]],
+            "htmlFile": f"doc-{i:08x}.html.gz",
+            "lastPage": 0,
+            "notes": "",
+            "translations": {"deepl": {"zh-TW": {
+                f"1|p-{p}": f"第{p}段的翻譯文字" for p in range(TRANSLATED_PARAGRAPHS)
+            }}},
+            "createdAt": "2026-01-01T00:00:00",
+            "uploadedAt": "2026-01-01T00:00:00",
+        }
+        for i in range(count)
+    ]
+    return {"folders": folders, "tags": tags, "documents": documents}
+
+
+def p50_ms(fn, repeat: int) -> float:
+    samples = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        fn(i)
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000
+
+
+def _written_bytes() -> Optional[int]:
+    try:
+        with open("/proc/self/io") as f:
+            return next(int(line.split()[1]) for line in f if line.startswith("wchar:"))
+    except OSError:
+        return None
+
+
+def run(backend: str, library: dict, tmp: Path, repeat: int) -> dict:
+    json_file = tmp / "library.json"
+    db_file = tmp / f"library-{len(library['documents'])}.db"
+    JsonLibraryStore(json_file).save(library)
+    if backend == "sqlite":
+        import_json(json_file, db_file)
+    lib_svc.LIBRARY_BACKEND = backend
+    lib_svc.LIBRARY_FILE = json_file
+    lib_svc.LIBRARY_DB = db_file
+
+    rng = random.Random(0)
+    ids = [doc["id"] for doc in library["documents"]]
+    folder_id = library["folders"][0]["id"]
+    lib_svc.get_document(ids[0])  # 先切換後端並載入書庫，不計入量測
+    written = _written_bytes()
+    patch = p50_ms(lambda i: lib_svc.update_document(rng.choice(ids), {"lastPage": i}), repeat)
+    written = None if written is None else (_written_bytes() - written) / repeat / 1024
+    return {
+        "get": p50_ms(lambda i: lib_svc.get_document(rng.choice(ids)), repeat),
+        "patch": patch,
+        "translate": p50_ms(
+            lambda i: lib_svc.update_translations(rng.choice(ids), "deepl", "zh-TW", {f"2|p-{i}": "翻譯"}),
+            repeat,
+        ),
+        "create": p50_ms(lambda i: lib_svc.create_document(f"新文件{i}", folder_id), repeat),
+        "list": p50_ms(lambda i: lib_svc.library_json(), repeat),
+        "KB/patch": written,
+    }
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="*", default=[1000, 10000])
+    parser.add_argument("--backends", nargs="*", default=["json", "sqlite"])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    settings = ("DATA_DIR", "DOCUMENTS_DIR", "LIBRARY_FILE", "LIBRARY_DB", "LIBRARY_BACKEND")
+    original = {name: getattr(lib_svc, name) for name in settings}
+    columns = ("get ms", "patch ms", "translate ms", "create ms", "list ms", "KB/patch")
+    print(f"{'docs':>7} {'backend':<8}" + "".join(f"{name:>13}" for name in columns))
+    with tempfile.TemporaryDirectory() as tmp:
+        lib_svc.DATA_DIR = Path(tmp)
+        lib_svc.DOCUMENTS_DIR = Path(tmp) / "documents"
+        try:
+            for size in args.sizes:
+                library = make_library(size)
+                for backend in args.backends:
+                    result = run(backend, library, Path(tmp), args.repeat)
+                    print(f"{size:>7} {backend:<8}" + "".join(
+                        f"{value:>13.3f}" if value is not None else f"{'-':>13}" for value in result.values()
+                    ))
+        finally:
+            for name, value in original.items():
+                setattr(lib_svc, name, value)
+
+
+if __name__ == "__main__":
+    main()
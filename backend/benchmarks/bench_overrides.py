@@ -0,0 +1,81 @@
+"""自訂讀音（reading_overrides）的每段落成本與詞條數的關係。
+
+比較詞條數 0 / 100 / 1,000 / 10,000 時：
+- 自動機掃描（split_text）與逐詞條 str.find 的每段落成本
+- add_furigana_batch（停用段落快取）的每段落成本
+另列出編譯自動機的時間。詞條寫入暫存目錄，不影響 data/。
+
+執行方式（於 backend/ 目錄）：
+    python -m benchmarks.bench_overrides
+"""
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from app.services import furigana, reading_overrides
+from benchmarks.bench_furigana import script_paragraphs
+
+# 隨機產生詞條用的漢字與假名
+_KANJI = "奏多鈴音彩葉澪凛紬詩織遥陽菜結衣響律恋雫"
+_KANA = "かなでりんねあやはみおつむぎしおりはるひゆいきょう"
+
+
+def make_entries(count: int, seed: int = 0) -> dict[str, str]:
+    rng = random.Random(seed)
+    entries: dict[str, str] = {}
+    while len(entries) < count:
+        surface = "".join(rng.choices(_KANJI, k=rng.randint(2, 4)))
+        entries[surface] = "".join(rng.choices(_KANA, k=rng.randint(3, 6)))
+    return entries
+
+
+def naive_split(entries: dict[str, str], text: str) -> list:
+    """對照組：逐一詞條 str.find，成本隨詞條數線性增加"""
+    return [(surface, text.find(surface)) for surface in entries if surface in text]
+
+
+def _time(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    paragraphs = script_paragraphs(2000)
+    # 讓部分段落含有詞條
+    names = list(make_entries(10000))[:50]
+    paragraphs = [f"{names[i % 50]}{p}" if i % 3 == 0 else p for i, p in enumerate(paragraphs)]
+    count = len(paragraphs)
+    original_file = reading_overrides.OVERRIDES_FILE
+    original_size = furigana.FURIGANA_CACHE_SIZE
+
+    print(f"{'entries':>8}{'compile ms':>12}{'scan us/p':>11}{'naive us/p':>12}{'furigana us/p':>15}")
+    with tempfile.TemporaryDirectory() as tmp:
+        reading_overrides.OVERRIDES_FILE = Path(tmp) / "reading_overrides.json"
+        furigana.configure_furigana_cache(0)
+        try:
+            for size in (0, 100, 1000, 10000):
+                entries = make_entries(size)
+                start = time.perf_counter()
+                reading_overrides.replace_overrides(entries)
+                compile_ms = (time.perf_counter() - start) * 1000
+
+                scan = _time(lambda: [reading_overrides.split_text(p) for p in paragraphs], 5)
+                naive = _time(lambda: [naive_split(entries, p) for p in paragraphs], 1)
+                render = _time(lambda: furigana.add_furigana_batch(paragraphs), 3)
+                print(
+                    f"{size:>8}{compile_ms:>12.1f}{scan / count * 1e6:>11.1f}"
+                    f"{naive / count * 1e6:>12.1f}{render / count * 1e6:>15.1f}"
+                )
+        finally:
+            reading_overrides.OVERRIDES_FILE = original_file
+            reading_overrides.reset()
+            furigana.configure_furigana_cache(original_size)
+
+
+if __name__ == "__main__":
+    main()
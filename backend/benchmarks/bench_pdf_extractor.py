@@ -0,0 +1,197 @@
+"""pdf_extractor 效能基準：以合成 PDF 量測 extract_text_by_pages 的吞吐量、
+每頁延遲百分位數與記憶體峰值，輸出 JSON 並與已提交的 baseline 比較。
+
+執行方式（於 backend/ 目錄）：
+    python -m benchmarks.bench_pdf_extractor                    # 執行並與 baseline 比較
+    python -m benchmarks.bench_pdf_extractor --sizes 10,100     # 只跑部分頁數
+    python -m benchmarks.bench_pdf_extractor --update-baseline  # 以本次結果更新 baseline
+
+任何一個案例退步超過容許範圍時以非零狀態碼結束。
+"""
+import argparse
+import json
+import math
+import platform
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+from typing import Callable
+
+from app.services.pdf_extractor import extract_text_by_pages, iter_text_by_pages
+from benchmarks.synthetic import cached_pdf
+
+BENCH_DIR = Path(__file__).resolve().parent
+CACHE_DIR = BENCH_DIR / ".cache"
+BASELINE_FILE = BENCH_DIR / "baseline_pdf_extractor.json"
+DEFAULT_OUTPUT = CACHE_DIR / "pdf_extractor_results.json"
+
+SIZES = (10, 100, 1000)
+LAYOUTS = ("vertical", "horizontal")
+DENSITIES = ("sparse", "dense")
+
+# 退步判定：相對容許比例，以及避免微小數值誤判的絕對門檻
+TOLERANCE = 0.35
+MIN_LATENCY_DELTA_MS = 0.5
+MIN_MEMORY_DELTA_MB = 8.0
+
+
+def percentile(values: list[float], pct: float) -> float:
+    """nearest-rank 百分位數"""
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def reset_peak_rss() -> bool:
+    """重設本行程的 RSS 高水位（Linux 的 /proc/self/clear_refs）；不支援時回傳 False"""
+    try:
+        Path("/proc/self/clear_refs").write_text("5")
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_mb() -> float:
+    """本行程的 RSS 高水位（VmHWM），單位 MB"""
+    for line in Path("/proc/self/status").read_text().splitlines():
+        if line.startswith("VmHWM:"):
+            return int(line.split()[1]) / 1024
+    raise RuntimeError("VmHWM not available")
+
+
+def measure_peak_memory(fn: Callable[[], object]) -> tuple[float, str]:
+    """回傳 (峰值增量 MB, 量測方式)；Linux 用 RSS 高水位，其他平台退回 tracemalloc"""
+    if reset_peak_rss():
+        before = peak_rss_mb()
+        fn()
+        return peak_rss_mb() - before, "rss"
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1] / (1024 * 1024), "tracemalloc"
+    finally:
+        tracemalloc.stop()
+
+
+def run_case(pdf: Path, pages: int, repeat: int, workers: int) -> dict:
+    # 重複執行取最佳總時間；每頁延遲取各次中的最小值，降低其他行程干擾造成的雜訊
+    best_total, best_latencies = float("inf"), None
+    extract_text_by_pages(pdf, workers=workers)  # 暖機：排除首次開檔與字型載入
+    for _ in range(repeat):
+        latencies = []
+        start = last = time.perf_counter()
+        for _page in iter_text_by_pages(pdf, workers=workers):
+            now = time.perf_counter()
+            latencies.append((now - last) * 1000)
+            last = now
+        best_total = min(best_total, last - start)
+        best_latencies = latencies if best_latencies is None else list(map(min, best_latencies, latencies))
+
+    peak_mb, mem_method = measure_peak_memory(lambda: extract_text_by_pages(pdf, workers=workers))
+    return {
+        "pages": pages,
+        "seconds": round(best_total, 4),
+        "pages_per_sec": round(pages / best_total, 1),
+        "p50_ms": round(percentile(best_latencies, 50), 3),
+        "p95_ms": round(percentile(best_latencies, 95), 3),
+        "p99_ms": round(percentile(best_latencies, 99), 3),
+        "peak_mem_mb": round(peak_mb, 1),
+        "mem_method": mem_method,
+    }
+
+
+def run_suite(sizes=SIZES, layouts=LAYOUTS, densities=DENSITIES, workers: int = 1) -> dict:
+    cases = []
+    for pages in sizes:
+        for layout in layouts:
+            for density in densities:
+                pdf = cached_pdf(CACHE_DIR, pages, layout, density)
+                repeat = 7 if pages <= 100 else 3
+                result = run_case(pdf, pages, repeat, workers)
+                result["name"] = f"{layout}-{density}-{pages}"
+                cases.append(result)
+                print(
+                    f"{result['name']:<24}{result['pages_per_sec']:>10.1f} pages/s"
+                    f"{result['p50_ms']:>9.2f} p50{result['p95_ms']:>9.2f} p95"
+                    f"{result['p99_ms']:>9.2f} p99{result['peak_mem_mb']:>8.1f} MB"
+                )
+    return {
+        "benchmark": "pdf_extractor",
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "workers": workers,
+        "cases": cases,
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float = TOLERANCE) -> list[str]:
+    """回傳退步項目說明；baseline 中沒有的案例略過"""
+    base_cases = {c["name"]: c for c in baseline.get("cases", [])}
+    regressions = []
+    for case in results["cases"]:
+        base = base_cases.get(case["name"])
+        if base is None:
+            continue
+        name = case["name"]
+        if case["pages_per_sec"] < base["pages_per_sec"] * (1 - tolerance):
+            regressions.append(
+                f"{name}: throughput {case['pages_per_sec']} < baseline {base['pages_per_sec']} pages/s"
+            )
+        # p99 在 100 頁以下幾乎等於單次最大值，雜訊太大，只以 p95 判定
+        if (
+            case["p95_ms"] > base["p95_ms"] * (1 + tolerance)
+            and case["p95_ms"] - base["p95_ms"] > MIN_LATENCY_DELTA_MS
+        ):
+            regressions.append(f"{name}: p95 {case['p95_ms']} ms > baseline {base['p95_ms']} ms")
+        if (
+            case.get("mem_method") == base.get("mem_method")
+            and case["peak_mem_mb"] > base["peak_mem_mb"] * (1 + tolerance)
+            and case["peak_mem_mb"] - base["peak_mem_mb"] > MIN_MEMORY_DELTA_MB
+        ):
+            regressions.append(
+                f"{name}: peak memory {case['peak_mem_mb']} MB > baseline {base['peak_mem_mb']} MB"
+            )
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default=",".join(map(str, SIZES)))
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--output", type=Path, default=DEFAULT_OUTPUT)
+    parser.add_argument("--baseline", type=Path, default=BASELINE_FILE)
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args(argv)
+
+    sizes = [int(s) for s in args.sizes.split(",") if s]
+    results = run_suite(sizes, workers=args.workers)
+
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    args.output.write_text(json.dumps(results, indent=2), encoding="utf-8")
+    print(f"results written to {args.output}")
+
+    if args.update_baseline:
+        args.baseline.write_text(json.dumps(results, indent=2) + "\n", encoding="utf-8")
+        print(f"baseline updated: {args.baseline}")
+        return 0
+
+    if not args.baseline.exists():
+        print(f"no baseline at {args.baseline}; run with --update-baseline first")
+        return 0
+
+    regressions = compare(results, json.loads(args.baseline.read_text(encoding="utf-8")), args.tolerance)
+    if regressions:
+        print("\n!!! PERFORMANCE REGRESSION !!!", file=sys.stderr)
+        for line in regressions:
+            print(f"  {line}", file=sys.stderr)
+        return 1
+    print("no regressions against baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
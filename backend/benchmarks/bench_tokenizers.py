@@ -0,0 +1,125 @@
+"""比較各斷詞後端（見 app.services.tokenizers）在同一份腳本語料上的表現。
+
+每個後端在獨立的子行程中執行，分別量測：
+- load ms：建立 tagger（載入辭典）的時間
+- rss MB：建立 tagger 並轉換整份語料後，行程常駐記憶體的增加量
+- para/s：add_furigana_batch 的吞吐量（停用段落快取）
+- agree：整段讀音（漢字換成讀音後的文字）與基準後端完全一致的段落比例
+- similar：整段讀音與基準後端的平均字元相似度（difflib）
+
+基準後端為清單中的第一個（預設 fugashi）。未安裝的後端會列出但略過。
+自訂讀音不套用，以免影響比較。
+
+執行方式（於 backend/ 目錄）：
+    python -m benchmarks.bench_tokenizers
+    python -m benchmarks.bench_tokenizers --corpus 腳本.txt --backends fugashi janome
+"""
+import argparse
+import difflib
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+from pathlib import Path
+from typing import Optional
+
+from app.services import tokenizers
+from benchmarks.bench_furigana import script_paragraphs
+
+
+def load_corpus(path: Optional[str], count: int) -> list[str]:
+    """TXT 腳本中的日文行；未指定檔案時使用模擬腳本段落"""
+    if path is None:
+        return script_paragraphs(count)
+    from app.services.html_generator import _script_lines
+
+    text = Path(path).read_text(encoding="utf-8")
+    return [content for kind, content in _script_lines(text) if kind == "ja"]
+
+
+def _rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        # 非 Linux：改用最大常駐記憶體（KB）
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def reading_text(tokens: list) -> str:
+    """token 列表 → 漢字換成讀音後的整段文字"""
+    return "".join(token if isinstance(token, str) else token[1] for token in tokens)
+
+
+def run_backend(name: str, corpus: list[str], repeat: int) -> dict:
+    """在目前行程中以指定後端轉換語料（由子行程呼叫）"""
+    from app.services import furigana, reading_overrides
+
+    with tempfile.TemporaryDirectory() as tmp:
+        reading_overrides.OVERRIDES_FILE = Path(tmp) / "reading_overrides.json"
+        reading_overrides.reset()
+
+        rss = _rss_bytes()
+        start = time.perf_counter()
+        tokenizers.use_backend(name)
+        load = time.perf_counter() - start
+
+        furigana.configure_furigana_cache(0)
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            furigana.add_furigana_batch(corpus)
+            best = min(best, time.perf_counter() - start)
+        readings = [reading_text(furigana.furigana_tokens(p)) for p in corpus]
+    return {
+        "load_ms": load * 1000,
+        "rss_mb": (_rss_bytes() - rss) / 1024 / 1024,
+        "per_second": len(corpus) / best,
+        "readings": readings,
+    }
+
+
+def agreement(reference: list[str], readings: list[str]) -> tuple[float, float]:
+    """(完全一致的段落比例, 平均字元相似度)"""
+    if not reference:
+        return 1.0, 1.0
+    exact = sum(a == b for a, b in zip(reference, readings)) / len(reference)
+    similar = sum(
+        difflib.SequenceMatcher(None, a, b).ratio() for a, b in zip(reference, readings)
+    ) / len(reference)
+    return exact, similar
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--corpus", help="UTF-8 TXT 腳本（預設使用模擬腳本段落）")
+    parser.add_argument("--paragraphs", type=int, default=2000, help="模擬段落數")
+    parser.add_argument("--backends", nargs="*", default=tokenizers.backend_names())
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    corpus = load_corpus(args.corpus, args.paragraphs)
+    available = set(tokenizers.available_backends())
+    print(f"corpus: {len(corpus)} paragraphs, {sum(map(len, corpus))} chars")
+    print(f"{'backend':<12}{'load ms':>10}{'rss MB':>9}{'para/s':>10}{'agree':>8}{'similar':>9}")
+
+    reference = None
+    ctx = multiprocessing.get_context("spawn")
+    for name in args.backends:
+        if name not in available:
+            print(f"{name:<12}{'(not installed)':>31}")
+            continue
+        with ctx.Pool(1) as pool:
+            result = pool.apply(run_backend, (name, corpus, args.repeat))
+        if reference is None:
+            reference = result["readings"]
+        exact, similar = agreement(reference, result["readings"])
+        print(
+            f"{name:<12}{result['load_ms']:>10.0f}{result['rss_mb']:>9.1f}"
+            f"{result['per_second']:>10.0f}{exact:>8.1%}{similar:>9.1%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""以 fitz 產生合成的縦書き／橫書き測試 PDF。"""
+import random
+from pathlib import Path
+
+import fitz
+
+_JA_LINES = [
+    "耳元でささやく台詞です",
+    "ゆっくり深呼吸してください",
+    "今日もお疲れさまでした",
+    "右耳から左耳へ移動します",
+    "効果音が入ります",
+    "口内射精10分30秒",
+]
+
+# 每頁文字量：sparse 為少量長段落，dense 為大量短 block
+DENSITIES = {"sparse": 6, "dense": 60}
+# 實際繪製的不重複頁數，其餘頁面以複製方式補足（插入日文字型很慢）
+_UNIQUE_PAGES = 50
+
+
+def _vertical_page(page: fitz.Page, rng: random.Random, blocks: int) -> None:
+    x, y = page.rect.width - 40, 40.0
+    for _ in range(blocks):
+        line = rng.choice(_JA_LINES)[: rng.randint(3, 10)]
+        height = len(line) * 12.5
+        if y + height > page.rect.height - 30:
+            x, y = x - 26, 40.0
+            if x < 30:
+                break
+        page.insert_text((x, y + 12), "\n".join(line), fontsize=10, fontname="japan")
+        y += height + rng.choice([2, 2, 20])
+
+
+def _horizontal_page(page: fitz.Page, rng: random.Random, blocks: int) -> None:
+    y = 50.0
+    for i in range(blocks):
+        if y > page.rect.height - 40:
+            break
+        text = rng.choice(_JA_LINES)
+        page.insert_text((50 + rng.choice([0, 0, 200]), y), f"{i:03d} {text}", fontsize=9, fontname="japan")
+        y += rng.choice([12, 12, 24])
+
+
+def build_pdf(path, pages: int, layout: str, density: str, seed: int = 0) -> Path:
+    """產生 pages 頁的合成 PDF；layout 為 vertical / horizontal，density 為 sparse / dense"""
+    rng = random.Random(seed)
+    blocks = DENSITIES[density]
+    doc = fitz.open()
+    for _ in range(min(pages, _UNIQUE_PAGES)):
+        page = doc.new_page()
+        if layout == "vertical":
+            _vertical_page(page, rng, blocks)
+        else:
+            _horizontal_page(page, rng, blocks)
+    unique = fitz.open()
+    unique.insert_pdf(doc)
+    while doc.page_count < pages:
+        doc.insert_pdf(unique, to_page=min(unique.page_count, pages - doc.page_count) - 1)
+    unique.close()
+    doc.save(str(path))
+    doc.close()
+    return Path(path)
+
+
+def cached_pdf(cache_dir: Path, pages: int, layout: str, density: str) -> Path:
+    """回傳快取目錄中的合成 PDF，不存在時才產生"""
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    path = cache_dir / f"{layout}-{density}-{pages}.pdf"
+    if not path.exists():
+        build_pdf(path, pages, layout, density)
+    return path
@@ -3,10 +3,29 @@ from pathlib import Path
 import fitz
 import pytest
 
+import app.services.convert_cache as convert_cache
+import app.services.reading_overrides as reading_overrides
+
 # 專案根目錄下的真實日文 PDF（優先使用）
 _SCRIPT_PDF = Path(__file__).parent.parent.parent / "script.pdf"
 
 
+@pytest.fixture(autouse=True)
+def isolated_convert_cache(tmp_path, monkeypatch):
+    """轉換快取一律寫入測試暫存目錄，避免污染 data/ 並讓各測試互不影響"""
+    monkeypatch.setattr(convert_cache, "CACHE_DIR", tmp_path / "cache")
+    convert_cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def isolated_reading_overrides(tmp_path, monkeypatch):
+    """自訂讀音一律讀寫測試暫存目錄，每個測試從空詞條開始"""
+    monkeypatch.setattr(reading_overrides, "OVERRIDES_FILE", tmp_path / "reading_overrides.json")
+    reading_overrides.reset()
+    yield
+    reading_overrides.reset()
+
+
 @pytest.fixture
 def sample_pdf(tmp_path):
     """優先使用專案根目錄的 script.pdf，否則動態建立測試 PDF"""
@@ -31,3 +50,30 @@ def empty_pdf(tmp_path):
     doc.save(str(pdf_path))
     doc.close()
     return str(pdf_path)
+
+
+def _write_mixed_pdf(pdf_path, page_count: int) -> str:
+    """建立縦書き／橫書き頁面交錯的多頁 PDF（含空白頁）"""
+    doc = fitz.open()
+    for i in range(page_count):
+        page = doc.new_page()
+        if i % 5 == 4:
+            continue  # 空白頁
+        if i % 2 == 0:
+            # 縦書き：逐字換行，右欄起排
+            for col, line in enumerate(["第一章の台詞です", f"{i + 1}分30秒", "次の列の文章"]):
+                page.insert_text(
+                    (500 - col * 30, 72), "\n".join(line), fontsize=12, fontname="japan"
+                )
+        else:
+            for row, line in enumerate([f"Page {i + 1} heading", "first line", "second line"]):
+                page.insert_text((72, 72 + row * 40), line, fontsize=12)
+    doc.save(str(pdf_path))
+    doc.close()
+    return str(pdf_path)
+
+
+@pytest.fixture
+def mixed_pdf(tmp_path):
+    """建立 12 頁縦書き／橫書き交錯的 PDF"""
+    return _write_mixed_pdf(tmp_path / "mixed.pdf", 12)
@@ -1,8 +1,11 @@
+import json
+
 import fitz
 import pytest
 from fastapi.testclient import TestClient
 
 from app.main import app
+from app.services import furigana
 
 client = TestClient(app)
 
@@ -56,6 +59,54 @@ def test_convert_with_txt():
     assert data["page_count"] == 1
 
 
+def test_convert_html_is_streamed():
+    txt = {"file": ("script.txt", "東京は日本の首都です。".encode("utf-8"), "text/plain")}
+    with client.stream("POST", "/api/convert", files=txt) as response:
+        assert response.status_code == 200
+        assert "content-length" not in response.headers
+        data = json.loads(b"".join(response.iter_bytes()))
+    assert data["cached"] is False
+    assert "<ruby>東京" in data["html"]
+    assert client.post("/api/convert", files=txt).json() == {**data, "cached": True}
+
+
+def test_convert_html_reports_furigana_time():
+    txt = {"file": ("script.txt", "大阪に行く".encode("utf-8"), "text/plain")}
+    response = client.post("/api/convert", files=txt)
+    assert "furigana;dur=" in response.headers["server-timing"]
+
+
+def test_convert_html_first_batch_failure_returns_error_status(monkeypatch):
+    from app.services import converter
+
+    def broken(*args):
+        raise RuntimeError("tagger 載入失敗")
+        yield
+
+    monkeypatch.setattr(converter, "iter_html_from_script_txt", broken)
+    txt = {"file": ("script.txt", "名古屋に行く".encode("utf-8"), "text/plain")}
+    response = TestClient(app, raise_server_exceptions=False).post("/api/convert", files=txt)
+    assert response.status_code == 500
+
+
+def test_convert_html_mid_stream_failure_ends_with_error(monkeypatch):
+    from app.services import convert_cache, converter
+
+    def fails_later(*args):
+        yield "<section>1</section>"
+        raise RuntimeError("斷詞失敗")
+
+    monkeypatch.setattr(converter, "iter_html_from_script_txt", fails_later)
+    txt = {"file": ("script.txt", "京都に行く".encode("utf-8"), "text/plain")}
+    response = client.post("/api/convert", files=txt)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["html"] == "<section>1</section>"
+    assert "斷詞失敗" in data["error"]
+    # 失敗的結果不寫入轉換快取
+    assert convert_cache.cache_stats()["entries"] == 0
+
+
 def test_health_check():
     response = client.get("/api/health")
     assert response.status_code == 200
@@ -86,3 +137,170 @@ def test_translate_invalid_provider():
     )
     assert response.status_code == 400
     assert "不支援" in response.json()["detail"]
+
+
+# ── /api/convert/stream ─────────────────────────────────────────────────────
+
+def _read_ndjson(response):
+    import json
+    return [json.loads(line) for line in response.text.splitlines() if line]
+
+
+def test_convert_stream_pdf_matches_convert(mixed_pdf):
+    with open(mixed_pdf, "rb") as f:
+        content = f.read()
+    full = client.post(
+        "/api/convert", files={"file": ("test.pdf", content, "application/pdf")}
+    ).json()
+    response = client.post(
+        "/api/convert/stream", files={"file": ("test.pdf", content, "application/pdf")}
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    events = _read_ndjson(response)
+    pages, done = events[:-1], events[-1]
+    assert [e["page_num"] for e in pages] == list(range(1, 13))
+    assert "\n".join(e["html"] for e in pages) == full["html"]
+    assert done == {"done": True, "page_count": 12}
+
+
+def test_convert_stream_txt():
+    response = client.post(
+        "/api/convert/stream",
+        files={"file": ("script.txt", "東京に行く".encode("utf-8"), "text/plain")},
+    )
+    events = _read_ndjson(response)
+    assert events[0]["page_num"] == 1
+    assert "<ruby>" in events[0]["html"]
+    assert events[-1] == {"done": True, "page_count": 1}
+
+
+def test_convert_stream_invalid_pdf_reports_error():
+    response = client.post(
+        "/api/convert/stream",
+        files={"file": ("broken.pdf", b"not a pdf", "application/pdf")},
+    )
+    events = _read_ndjson(response)
+    assert "PDF 處理失敗" in events[-1]["error"]
+
+
+def test_convert_stream_rejects_unknown_extension():
+    response = client.post(
+        "/api/convert/stream",
+        files={"file": ("test.csv", b"col1,col2", "text/csv")},
+    )
+    assert response.status_code == 400
+
+
+def test_convert_reports_layout_timing(mixed_pdf):
+    with open(mixed_pdf, "rb") as f:
+        response = client.post(
+            "/api/convert",
+            files={"file": ("test.pdf", f, "application/pdf")},
+            data={"layout": "vertical"},
+        )
+    assert response.status_code == 200
+    assert response.json()["layout"] == "vertical"
+    timing = response.headers["server-timing"]
+    assert "layout;dur=" in timing
+    assert "extract;dur=" in timing
+
+
+def test_convert_rejects_unknown_layout(japanese_pdf):
+    with open(japanese_pdf, "rb") as f:
+        response = client.post(
+            "/api/convert",
+            files={"file": ("test.pdf", f, "application/pdf")},
+            data={"layout": "diagonal"},
+        )
+    assert response.status_code == 400
+
+
+def test_convert_cache_stats_endpoint():
+    txt = {"file": ("script.txt", "東京に行く".encode("utf-8"), "text/plain")}
+    assert client.post("/api/convert", files=txt).json()["cached"] is False
+    assert client.post("/api/convert", files=txt).json()["cached"] is True
+    stats = client.get("/api/convert/cache").json()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["entries"] == 1
+
+
+def test_furigana_cache_stats_endpoint():
+    response = client.get("/api/furigana/cache")
+    assert response.status_code == 200
+    stats = response.json()
+    assert {"hits", "misses", "maxsize", "size", "morphemes"} <= stats.keys()
+    assert {"hits", "misses", "evictions", "entries", "bytes"} <= stats["morphemes"].keys()
+    assert {"max_size", "created", "idle", "waits"} <= stats["taggers"].keys()
+
+
+def test_reading_overrides_endpoints():
+    assert client.get("/api/furigana/overrides").json() == {}
+    response = client.put("/api/furigana/overrides/奏", json={"reading": "かなで"})
+    assert response.status_code == 200
+    assert client.get("/api/furigana/overrides").json() == {"奏": "かなで"}
+
+    assert client.put("/api/furigana/overrides/奏", json={"reading": ""}).status_code == 400
+    response = client.put("/api/furigana/overrides", json={"entries": {"東京": "とうきょう"}})
+    assert response.json() == {"count": 1}
+    assert client.get("/api/furigana/overrides").json() == {"東京": "とうきょう"}
+
+    assert client.delete("/api/furigana/overrides/東京").status_code == 200
+    assert client.delete("/api/furigana/overrides/東京").status_code == 404
+
+
+def test_convert_reflects_reading_override_changes():
+    txt = {"file": ("script.txt", "奏の声が聞こえる".encode("utf-8"), "text/plain")}
+    before = client.post("/api/convert", files=txt).json()["html"]
+    assert furigana.furigana_cache_stats()["size"] > 0
+    client.put("/api/furigana/overrides/奏", json={"reading": "かなで"})
+    # 舊詞條的段落快取不會再被命中，變更時一併清空
+    assert furigana.furigana_cache_stats()["size"] == 0
+    # 詞條變更後，轉換快取與段落快取都不會回傳舊結果
+    after = client.post("/api/convert", files=txt).json()
+    assert after["cached"] is False
+    assert "<rt>かなで</rt>" in after["html"]
+    assert after["html"] != before
+
+
+def test_concurrent_conversions_are_correct(monkeypatch):
+    from concurrent.futures import ThreadPoolExecutor
+
+    from app.services import convert_cache, furigana
+
+    # 停用轉換快取與段落快取，讓每個請求都實際斷詞
+    monkeypatch.setattr(convert_cache, "get", lambda key: None)
+    furigana.configure_furigana_cache(0)
+    try:
+        scripts = [
+            "\n".join(f"{n}番目の台本、{i}行目は東京の大きい都市で漢字を読む" for i in range(40)).encode()
+            for n in range(10)
+        ]
+
+        def post(content):
+            return client.post(
+                "/api/convert", files={"file": ("script.txt", content, "text/plain")}
+            ).json()["html"]
+
+        serial = [post(content) for content in scripts]
+        with ThreadPoolExecutor(max_workers=10) as pool:
+            concurrent = list(pool.map(post, scripts * 2))
+        assert concurrent == serial * 2
+        assert furigana.tagger_pool_stats()["created"] <= furigana.FURIGANA_TAGGER_POOL_SIZE
+    finally:
+        furigana.configure_furigana_cache(furigana.FURIGANA_CACHE_SIZE)
+
+
+def test_convert_page_range(mixed_pdf):
+    with open(mixed_pdf, "rb") as f:
+        response = client.post(
+            "/api/convert",
+            files={"file": ("test.pdf", f, "application/pdf")},
+            data={"first_page": "3", "last_page": "4"},
+        )
+    data = response.json()
+    assert data["page_count"] == 2
+    assert data["total_pages"] == 12
+    assert 'data-page="3"' in data["html"]
+    assert 'data-page="5"' not in data["html"]
@@ -0,0 +1,58 @@
+from app.services.furigana import add_furigana_batch
+from app.services.pdf_extractor import extract_text_by_pages
+from benchmarks.bench_furigana import legacy_add_furigana, script_paragraphs
+from benchmarks.bench_pdf_extractor import compare, percentile
+from benchmarks.bench_tokenizers import agreement, reading_text
+from benchmarks.synthetic import build_pdf
+
+
+def _case(name, pages_per_sec=1000.0, p95_ms=1.0, peak_mem_mb=10.0):
+    return {
+        "name": name,
+        "pages_per_sec": pages_per_sec,
+        "p95_ms": p95_ms,
+        "peak_mem_mb": peak_mem_mb,
+        "mem_method": "rss",
+    }
+
+
+def test_percentile_nearest_rank():
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 95) == 95
+    assert percentile([7.0], 99) == 7.0
+
+
+def test_compare_flags_regressions():
+    baseline = {"cases": [_case("a"), _case("b")]}
+    results = {"cases": [
+        _case("a", pages_per_sec=500.0, p95_ms=5.0, peak_mem_mb=50.0),
+        _case("b", pages_per_sec=950.0, p95_ms=1.2),
+        _case("new-case", pages_per_sec=1.0),
+    ]}
+    regressions = compare(results, baseline, tolerance=0.3)
+    assert len(regressions) == 3
+    assert all(line.startswith("a:") for line in regressions)
+
+
+def test_synthetic_pdfs_are_extractable(tmp_path):
+    vertical = build_pdf(tmp_path / "v.pdf", 3, "vertical", "sparse")
+    horizontal = build_pdf(tmp_path / "h.pdf", 60, "horizontal", "dense")
+    v_pages = extract_text_by_pages(vertical, workers=1)
+    h_pages = extract_text_by_pages(horizontal, workers=1, stats=(stats := {}))
+    assert len(v_pages) == 3 and all(p["paragraphs"] for p in v_pages)
+    assert len(h_pages) == 60
+    assert stats["layout"] == "horizontal"
+
+
+def test_furigana_batch_matches_legacy_implementation():
+    paragraphs = script_paragraphs(40, unique_ratio=0.5)
+    assert len(set(paragraphs)) == 20
+    assert add_furigana_batch(paragraphs) == [legacy_add_furigana(p) for p in paragraphs]
+
+
+def test_tokenizer_agreement_metrics():
+    assert reading_text(["は", ["東京", "とうきょう"], "へ"]) == "はとうきょうへ"
+    exact, similar = agreement(["とうきょう", "かんじ"], ["とうきょう", "かんし"])
+    assert exact == 0.5
+    assert 0.5 < similar < 1.0
@@ -0,0 +1,89 @@
+import random
+
+import pytest
+
+from app.services import block_geometry as geo
+from app.services.pdf_extractor import _extract_horizontal, _extract_vertical
+
+
+def _python_avg_char_h(text_blocks):
+    char_heights = []
+    for b in text_blocks:
+        lines = [ln for ln in b[4].strip().split("\n") if ln]
+        if lines:
+            char_heights.append((b[3] - b[1]) / len(lines))
+    return sum(char_heights) / len(char_heights) if char_heights else 14.0
+
+
+def _python_avg_height(text_blocks):
+    heights = [b[3] - b[1] for b in text_blocks if b[3] - b[1] > 0]
+    return sum(heights) / len(heights) if heights else 12.0
+
+
+def _random_blocks(seed, count, vertical):
+    """產生含大量重疊、同座標與小數座標的隨機 block"""
+    rng = random.Random(seed)
+    blocks = []
+    for i in range(count):
+        x0 = rng.choice([rng.uniform(0, 600), float(rng.randrange(0, 600, 10))])
+        y0 = rng.choice([rng.uniform(0, 800), float(rng.randrange(0, 800, 12))])
+        if vertical:
+            n = rng.randint(1, 8)
+            text = "\n".join(chr(0x4E00 + i * 8 + k) for k in range(n)) + "\n"
+            h = n * rng.choice([12.0, 11.7, 14.2])
+            w = 12.0
+        else:
+            text = f"line {i}\n"
+            h = rng.choice([12.0, 10.5, 14.25, rng.uniform(2, 20)])
+            w = rng.uniform(10, 200)
+        blocks.append((x0, y0, x0 + w, y0 + h, text, i, 0))
+    return blocks
+
+
+@pytest.mark.parametrize("seed", range(25))
+def test_vertical_matches_python(seed):
+    blocks = _random_blocks(seed, 50 + seed * 20, vertical=True)
+    coords, texts = geo.load_blocks(blocks)
+    avg = geo.avg_char_height(coords, texts)
+    assert avg == _python_avg_char_h(blocks)
+    assert geo.extract_vertical(coords, texts, avg) == _extract_vertical(blocks, avg)
+
+
+@pytest.mark.parametrize("seed", range(25))
+def test_horizontal_matches_python(seed):
+    blocks = _random_blocks(seed, 50 + seed * 20, vertical=False)
+    coords, texts = geo.load_blocks(blocks)
+    avg = geo.avg_block_height(coords)
+    assert avg == _python_avg_height(blocks)
+    assert geo.extract_horizontal(coords, texts, avg) == _extract_horizontal(blocks, avg)
+
+
+def test_horizontal_zero_height_blocks_match_python():
+    blocks = [
+        (10.0, 50.0, 40.0, 50.0, "a\n", 0, 0),
+        (50.0, 50.0, 90.0, 50.0, "b\n", 1, 0),
+        (10.0, 50.0, 40.0, 62.0, "c\n", 2, 0),
+        (10.0, 70.0, 40.0, 82.0, "d\n", 3, 0),
+    ]
+    coords, texts = geo.load_blocks(blocks)
+    avg = geo.avg_block_height(coords)
+    assert geo.extract_horizontal(coords, texts, avg) == _extract_horizontal(blocks, avg)
+
+
+def test_column_threshold_boundary_matches_python():
+    # x0 差距恰為 20 仍屬同一欄，略大於 20 則分欄
+    blocks = [
+        (100.0, 10.0, 112.0, 22.0, "一\n", 0, 0),
+        (80.0, 22.0, 92.0, 34.0, "二\n", 1, 0),
+        (79.99, 34.0, 91.99, 46.0, "三\n", 2, 0),
+    ]
+    coords, texts = geo.load_blocks(blocks)
+    assert geo.extract_vertical(coords, texts, 12.0) == _extract_vertical(blocks, 12.0)
+
+
+def test_extract_paragraphs_dense_page_uses_engine(mixed_pdf, monkeypatch):
+    import app.services.pdf_extractor as extractor
+    from app.services.pdf_extractor import extract_text_by_pages
+    expected = extract_text_by_pages(mixed_pdf, workers=1)
+    monkeypatch.setattr(extractor, "GEOMETRY_MIN_BLOCKS", 1)
+    assert extract_text_by_pages(mixed_pdf, workers=1) == expected
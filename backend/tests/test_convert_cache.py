@@ -0,0 +1,125 @@
+import os
+import time
+from pathlib import Path
+
+import app.services.convert_cache as convert_cache
+from app.services import converter
+
+
+def test_make_key_depends_on_content_and_params():
+    key = convert_cache.make_key(b"pdf-bytes", kind="pdf", layout="auto")
+    assert key == convert_cache.make_key(b"pdf-bytes", layout="auto", kind="pdf")
+    assert key != convert_cache.make_key(b"pdf-bytes", kind="pdf", layout="vertical")
+    assert key != convert_cache.make_key(b"other-bytes", kind="pdf", layout="auto")
+
+
+def test_make_key_same_for_path_and_bytes(mixed_pdf):
+    data = Path(mixed_pdf).read_bytes()
+    assert convert_cache.make_key(mixed_pdf, kind="pdf") == convert_cache.make_key(data, kind="pdf")
+
+
+def test_get_put_roundtrip_and_counters():
+    assert convert_cache.get("k1") is None
+    convert_cache.put("k1", {"html": "<p>x</p>", "page_count": 1})
+    assert convert_cache.get("k1") == {"html": "<p>x</p>", "page_count": 1}
+    stats = convert_cache.cache_stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["entries"] == 1
+
+
+def test_lru_eviction_keeps_recently_used(monkeypatch):
+    monkeypatch.setattr(convert_cache, "CACHE_MAX_BYTES", 250)
+    payload = {"html": "x" * 80}
+    convert_cache.put("old", payload)
+    convert_cache.put("used", payload)
+    # 讓 "old" 的 mtime 較舊，再讀取 "used" 更新其使用時間
+    past = time.time() - 100
+    os.utime(convert_cache._entry_path("old"), (past, past))
+    os.utime(convert_cache._entry_path("used"), (past + 1, past + 1))
+    assert convert_cache.get("used") is not None
+    convert_cache.put("new", payload)
+
+    assert convert_cache.get("old") is None
+    assert convert_cache.get("used") is not None
+    assert convert_cache.get("new") is not None
+    assert convert_cache.cache_stats()["evictions"] == 1
+
+
+def test_version_change_invalidates_entries(monkeypatch):
+    convert_cache.put("k", {"html": "v1"})
+    monkeypatch.setattr(convert_cache, "_version", "different-code")
+    assert convert_cache.get("k") is None
+    convert_cache.put("k2", {"html": "v2"})
+    # 新版本寫入時清除舊版本目錄
+    assert [p.name for p in convert_cache.CACHE_DIR.iterdir()] == ["different-code"]
+
+
+def test_convert_pdf_hit_skips_extraction(mixed_pdf, monkeypatch):
+    first = converter.convert_pdf(mixed_pdf)
+    assert first["cached"] is False
+
+    def fail(*args, **kwargs):
+        raise AssertionError("快取命中時不應重新擷取")
+
+    monkeypatch.setattr(converter, "extract_text_by_pages", fail)
+    monkeypatch.setattr(converter, "generate_html", fail)
+    second = converter.convert_pdf(Path(mixed_pdf).read_bytes())
+    assert second["cached"] is True
+    assert second["html"] == first["html"]
+    assert second["page_count"] == 12
+
+
+def test_convert_txt_hit_skips_furigana(monkeypatch):
+    content = "東京に行く".encode("utf-8")
+    first = converter.convert_txt(content)
+    monkeypatch.setattr(converter, "generate_html_from_script_txt", None)
+    second = converter.convert_txt(content)
+    assert second["cached"] is True
+    assert second["html"] == first["html"]
+
+
+def test_stream_writer_commits_only_complete_entries():
+    with convert_cache.stream_writer("k1") as write:
+        write('{"html": "<p>')
+        write('x</p>"}')
+    assert convert_cache.get("k1") == {"html": "<p>x</p>"}
+
+    try:
+        with convert_cache.stream_writer("k2") as write:
+            write('{"html": "')
+            raise RuntimeError("中斷")
+    except RuntimeError:
+        pass
+    assert convert_cache.get("k2") is None
+    assert convert_cache.cache_stats()["entries"] == 1
+
+
+def test_interleaved_stream_writers_for_same_key():
+    """同一鍵的兩個串流在同一執行緒上交錯寫入，各自的暫存檔不互相混雜"""
+    first = convert_cache.stream_writer("k")
+    second = convert_cache.stream_writer("k")
+    write_a, write_b = first.__enter__(), second.__enter__()
+    write_a('{"html": "')
+    write_b('{"html": "')
+    write_a('a"}')
+    write_b('b"}')
+    first.__exit__(None, None, None)
+    assert convert_cache.get("k") == {"html": "a"}
+    second.__exit__(None, None, None)
+    assert convert_cache.get("k") == {"html": "b"}
+    assert not list(convert_cache.CACHE_DIR.rglob("*.tmp"))
+
+
+def test_stream_convert_matches_convert_and_fills_cache(mixed_pdf):
+    import json
+
+    streamed = json.loads("".join(converter.stream_convert_pdf(mixed_pdf)))
+    assert streamed["cached"] is False
+    cached = converter.convert_pdf(mixed_pdf)
+    assert cached["cached"] is True
+    assert streamed == {**cached, "cached": False}
+
+    content = "東京に行く\n---\nEnglish".encode("utf-8")
+    streamed = json.loads("".join(converter.stream_convert_txt(content)))
+    assert streamed == {**converter.convert_txt(content), "cached": False}
@@ -1,4 +1,16 @@
-from app.services.furigana import add_furigana, contains_kanji, kata_to_hira
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import pytest
+
+from app.services import furigana, tokenizers
+from app.services.furigana import (
+    add_furigana,
+    add_furigana_batch,
+    contains_kanji,
+    kata_to_hira,
+)
 
 
 def test_contains_kanji_with_kanji():
@@ -29,6 +41,14 @@ def test_kata_to_hira_already_hiragana():
     assert kata_to_hira("かんじ") == "かんじ"
 
 
+def test_kata_to_hira_matches_codepoint_shift():
+    katakana = "".join(chr(c) for c in range(0x30A0, 0x3100))
+    expected = "".join(
+        chr(ord(c) - 0x60) if "\u30a1" <= c <= "\u30f6" else c for c in katakana
+    )
+    assert kata_to_hira(katakana) == expected
+
+
 def test_add_furigana_kanji_only():
     result = add_furigana("漢字")
     assert "<ruby>" in result
@@ -53,3 +73,310 @@ def test_add_furigana_mixed_sentence():
 def test_add_furigana_empty_string():
     result = add_furigana("")
     assert result == ""
+
+
+def test_add_furigana_batch_matches_single_calls():
+    paragraphs = ["東京は大きい都市です", "", "ひらがな", "ヴァイオリンを弾く", "東京は大きい都市です"]
+    assert add_furigana_batch(paragraphs) == [add_furigana(p) for p in paragraphs]
+
+
+def test_furigana_tokens_render_like_add_furigana():
+    for text in ("東京は大きい都市です", "ひらがな", "ヴァイオリンを弾く", ""):
+        assert furigana.render_tokens(furigana.furigana_tokens(text)) == add_furigana(text)
+
+
+def test_furigana_tokens_merge_plain_text():
+    tokens = furigana.furigana_tokens("東京はとても大きい")
+    assert tokens[0] == ["東京", "とうきょう"]
+    assert tokens[1] == "はとても"
+    assert all(isinstance(t, str) or len(t) == 2 for t in tokens)
+
+
+def test_render_analysis_defaults_match_add_furigana():
+    for text in ("東京は大きい都市です", "ひらがな", "ヴァイオリンを弾く", ""):
+        morphemes = furigana.analyze_furigana(text)
+        assert furigana.render_analysis(morphemes) == add_furigana(text)
+        assert furigana.analysis_to_tokens(morphemes) == furigana.furigana_tokens(text)
+
+
+def test_analyze_furigana_keeps_reading_and_pos():
+    morphemes = furigana.analyze_furigana("東京は大きい")
+    assert morphemes[0] == ["東京", "トウキョウ", "名詞"]
+    assert morphemes[1][2] == "助詞"
+
+
+def test_render_analysis_options():
+    morphemes = furigana.analyze_furigana("東京は大きい")
+    assert furigana.render_analysis(morphemes, reading="katakana").startswith(
+        "<ruby>東京<rp>(</rp><rt>トウキョウ</rt>"
+    )
+    assert furigana.render_analysis(morphemes, ruby="simple").startswith(
+        "<ruby>東京<rt>とうきょう</rt></ruby>"
+    )
+    assert furigana.render_analysis(morphemes, ruby="paren") == "東京(とうきょう)は大きい(おおきい)"
+    assert furigana.render_analysis(morphemes, ruby="none") == "東京は大きい"
+    # 只有詞中所有漢字都已會時才略過
+    assert furigana.render_analysis(morphemes, ruby="paren", known_kanji="大東") == (
+        "東京(とうきょう)は大きい"
+    )
+
+
+def test_add_furigana_batch_accepts_iterables():
+    assert add_furigana_batch(iter(["漢字"])) == [add_furigana("漢字")]
+    assert add_furigana_batch([]) == []
+
+
+# ── 段落快取 ──────────────────────────────────────────
+
+@pytest.fixture
+def fresh_cache():
+    furigana.configure_furigana_cache(furigana.FURIGANA_CACHE_SIZE)
+    yield
+    furigana.configure_furigana_cache(furigana.FURIGANA_CACHE_SIZE)
+
+
+def test_add_furigana_repeated_paragraph_hits_cache(fresh_cache):
+    first = add_furigana("東京は大きい都市です")
+    second = add_furigana("東京は大きい都市です")
+    stats = furigana.furigana_cache_stats()
+    assert first == second
+    assert stats["misses"] == 1
+    assert stats["hits"] == 1
+    assert stats["size"] == 1
+
+
+def test_analyze_furigana_repeated_paragraph_hits_cache(fresh_cache):
+    first = furigana.analyze_furigana("東京は大きい都市です")
+    first[0][0] = "changed"  # 回傳複本，修改不影響快取
+    second = furigana.analyze_furigana_batch(["東京は大きい都市です", ""])[0]
+    stats = furigana.furigana_cache_stats()["analysis"]
+    assert second[0][0] == "東京"
+    assert (stats["misses"], stats["hits"], stats["size"]) == (1, 1, 1)
+    furigana.clear_furigana_cache()
+    assert furigana.furigana_cache_stats()["analysis"]["size"] == 0
+
+
+def test_add_furigana_empty_string_not_cached(fresh_cache):
+    add_furigana("")
+    assert furigana.furigana_cache_stats()["size"] == 0
+
+
+def test_furigana_cache_evicts_least_recently_used(fresh_cache):
+    furigana.configure_furigana_cache(2)
+    add_furigana("漢字")
+    add_furigana("東京")
+    add_furigana("漢字")  # 漢字 變為最近使用
+    add_furigana("都市")  # 淘汰 東京
+    stats = furigana.furigana_cache_stats()
+    assert stats["maxsize"] == 2
+    assert stats["size"] == 2
+
+    add_furigana("漢字")
+    assert furigana.furigana_cache_stats()["hits"] == 2
+    add_furigana("東京")
+    assert furigana.furigana_cache_stats()["misses"] == 4
+
+
+def test_furigana_cache_disabled_with_zero_size(fresh_cache):
+    furigana.configure_furigana_cache(0)
+    assert add_furigana("漢字") == add_furigana("漢字")
+    assert furigana.furigana_cache_stats()["size"] == 0
+
+
+@pytest.fixture
+def fresh_morphemes():
+    furigana.configure_morpheme_cache(furigana.FURIGANA_MORPHEME_CACHE_BYTES)
+    yield
+    furigana.configure_morpheme_cache(furigana.FURIGANA_MORPHEME_CACHE_BYTES)
+
+
+def test_morpheme_cache_reused_across_paragraphs(fresh_cache, fresh_morphemes):
+    furigana.configure_furigana_cache(0)
+    first = add_furigana("東京は大きい")
+    second = add_furigana("東京の都市")
+    stats = furigana.morpheme_cache_stats()
+    assert stats["hits"] == 1  # 第二段的「東京」
+    assert stats["entries"] == stats["misses"] == 3
+    assert stats["bytes"] > 0
+    assert first.startswith("<ruby>東京<rp>(</rp><rt>とうきょう</rt>")
+    assert second.startswith("<ruby>東京<rp>(</rp><rt>とうきょう</rt>")
+
+
+def test_morpheme_cache_respects_byte_cap(fresh_cache, fresh_morphemes):
+    furigana.configure_furigana_cache(0)
+    expected = [add_furigana(p) for p in ("東京は大きい都市です", "漢字を読む")]
+    furigana.configure_morpheme_cache(600)
+    assert [add_furigana(p) for p in ("東京は大きい都市です", "漢字を読む")] == expected
+    stats = furigana.morpheme_cache_stats()
+    assert stats["bytes"] <= 600
+    assert stats["evictions"] > 0
+    assert stats["entries"] < stats["misses"]
+
+
+def test_morpheme_cache_disabled_with_zero_bytes(fresh_cache, fresh_morphemes):
+    furigana.configure_furigana_cache(0)
+    furigana.configure_morpheme_cache(0)
+    add_furigana("漢字")
+    add_furigana("漢字")
+    stats = furigana.morpheme_cache_stats()
+    assert stats["entries"] == 0
+    assert stats["misses"] == 2
+
+
+class _CountingTagger:
+    """包住真正的 tagger，記錄呼叫次數並可偽造辭典資訊"""
+
+    def __init__(self, tagger, version="test"):
+        self._tagger = tagger
+        self.calls = 0
+        self.dictionary_info = [
+            {**d, "version": version} for d in tagger.dictionary_info
+        ]
+
+    def __call__(self, text):
+        self.calls += 1
+        return self._tagger(text)
+
+
+@pytest.fixture
+def restore_tagger():
+    original, factory = furigana.get_tagger(), furigana._tagger_factory
+    yield
+    furigana.set_tagger(original, factory)
+
+
+def test_failed_render_does_not_leak_into_next_paragraph(fresh_cache, restore_tagger):
+    original = furigana.get_tagger()
+
+    class _FailingTagger(_CountingTagger):
+        def __call__(self, text):
+            yield from list(self._tagger(text))[:2]
+            raise RuntimeError("tagger failed")
+
+    furigana.set_tagger(_FailingTagger(original))
+    with pytest.raises(RuntimeError):
+        add_furigana("漢字を読む")
+    furigana.set_tagger(original)
+    assert add_furigana("猫") == furigana._render_furigana("猫", ()) == "<ruby>猫<rp>(</rp><rt>ねこ</rt><rp>)</rp></ruby>"
+
+
+def test_set_tagger_invalidates_cache(fresh_cache, restore_tagger):
+    add_furigana("漢字")
+    counting = _CountingTagger(furigana.get_tagger())
+    furigana.set_tagger(counting)
+    assert furigana.furigana_cache_stats()["size"] == 0
+
+    add_furigana("漢字")
+    add_furigana("漢字")
+    assert counting.calls == 1
+
+
+def test_dictionary_change_is_part_of_cache_key(fresh_cache, restore_tagger):
+    original = furigana.get_tagger()
+    furigana.set_tagger(_CountingTagger(original, version="v1"))
+    key_v1 = furigana._dictionary_key()
+    add_furigana("漢字")
+
+    # 直接替換 _tagger（不經 set_tagger）時辭典鍵也跟著改變，不會命中舊辭典的結果
+    furigana._tagger = _CountingTagger(original, version="v2")
+    assert furigana._dictionary_key() != key_v1
+    add_furigana("漢字")
+    assert furigana.furigana_cache_stats()["misses"] == 2
+
+
+def test_add_furigana_concurrent_calls(fresh_cache):
+    lines = ["東京は大きい都市です", "漢字", "今日は晴れ", "食べる"] * 50
+    expected = {line: furigana._render_furigana(line, ()) for line in set(lines)}
+    barrier = threading.Barrier(8)
+
+    def work(chunk):
+        barrier.wait()
+        return [(line, add_furigana(line)) for line in chunk]
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = pool.map(work, [lines[i::8] for i in range(8)])
+    for chunk in results:
+        for line, html in chunk:
+            assert html == expected[line]
+    stats = furigana.furigana_cache_stats()
+    assert stats["hits"] + stats["misses"] == len(lines)
+    assert stats["size"] == len(expected)
+
+
+# ── tagger pool ──────────────────────────────────────
+
+
+def test_tagger_pool_is_bounded_under_concurrency(fresh_cache, restore_tagger, monkeypatch):
+    monkeypatch.setattr(furigana, "FURIGANA_TAGGER_POOL_SIZE", 3)
+    real_factory = tokenizers.backend_factory(tokenizers.FURIGANA_TOKENIZER)
+    created = []
+
+    def factory():
+        tagger = real_factory()
+        created.append(tagger)
+        return tagger
+
+    primary = real_factory()
+    furigana.set_tagger(primary, factory)
+    furigana.configure_furigana_cache(0)
+
+    # 記錄同時借出的實例：同一個實例不可同時被兩個執行緒使用
+    checkout = furigana._checkout_tagger
+    in_use, lock, max_in_use = set(), threading.Lock(), [0]
+
+    @contextmanager
+    def tracking_checkout():
+        with checkout() as tagger:
+            with lock:
+                assert id(tagger) not in in_use
+                in_use.add(id(tagger))
+                max_in_use[0] = max(max_in_use[0], len(in_use))
+            try:
+                yield tagger
+            finally:
+                with lock:
+                    in_use.discard(id(tagger))
+
+    monkeypatch.setattr(furigana, "_checkout_tagger", tracking_checkout)
+    lines = [f"{i}回目、東京の大きい都市で漢字を読む" for i in range(400)]
+    expected = [furigana._render_furigana(line, ()) for line in lines]
+    barrier = threading.Barrier(12)
+
+    def work(offset):
+        barrier.wait()
+        return [(i, add_furigana(lines[i])) for i in range(offset, len(lines), 12)]
+
+    with ThreadPoolExecutor(max_workers=12) as pool:
+        for chunk in pool.map(work, range(12)):
+            for i, html in chunk:
+                assert html == expected[i]
+
+    stats = furigana.tagger_pool_stats()
+    assert stats["created"] <= 3
+    assert len(created) == stats["created"] - 1
+    assert stats["idle"] == stats["created"]
+    assert max_in_use[0] <= 3
+    # 工廠每次建立獨立的實例，不與主 tagger 共用
+    assert len({id(t) for t in [primary, *created]}) == len(created) + 1
+
+
+def test_set_tagger_without_factory_serializes_on_one_instance(restore_tagger):
+    furigana.set_tagger(_CountingTagger(furigana.get_tagger()))
+    with furigana._checkout_tagger() as tagger:
+        assert furigana.tagger_pool_stats()["idle"] == 0
+    assert furigana.tagger_pool_stats() | {"waits": 0} == {
+        "max_size": furigana.FURIGANA_TAGGER_POOL_SIZE,
+        "created": 1,
+        "idle": 1,
+        "waits": 0,
+    }
+    assert tagger is furigana.get_tagger()
+
+
+def test_taggers_returned_after_set_tagger_are_discarded(restore_tagger):
+    original = furigana.get_tagger()
+    with furigana._checkout_tagger() as old:
+        furigana.set_tagger(_CountingTagger(original))
+    with furigana._checkout_tagger() as current:
+        assert current is not old
+        assert current is furigana.get_tagger()
@@ -0,0 +1,63 @@
+import pytest
+
+from app.services import furigana_pool, reading_overrides
+from app.services.furigana import add_furigana_batch
+from app.services.html_generator import generate_html, generate_html_from_script_txt
+
+
+@pytest.fixture
+def small_threshold(monkeypatch):
+    monkeypatch.setattr(furigana_pool, "FURIGANA_PARALLEL_MIN_CHARS", 50)
+    yield
+    furigana_pool.shutdown_pool()
+
+
+def _paragraphs(n):
+    return [f"第{i}章、東京の大きい都市で漢字を読む" if i % 3 else "ひらがなだけ" for i in range(n)]
+
+
+def test_below_threshold_stays_in_process(monkeypatch):
+    monkeypatch.setattr(furigana_pool, "get_pool", lambda workers=None: pytest.fail("pool used"))
+    paragraphs = _paragraphs(5)
+    assert furigana_pool.furigana_batch(paragraphs, workers=4) == add_furigana_batch(paragraphs)
+
+
+def test_single_worker_stays_in_process(monkeypatch, small_threshold):
+    monkeypatch.setattr(furigana_pool, "get_pool", lambda workers=None: pytest.fail("pool used"))
+    paragraphs = _paragraphs(30)
+    assert furigana_pool.furigana_batch(paragraphs, workers=1) == add_furigana_batch(paragraphs)
+
+
+def test_pool_preserves_order(small_threshold):
+    paragraphs = _paragraphs(45)
+    result = furigana_pool.furigana_batch(paragraphs, workers=2, chunk_size=4)
+    assert result == add_furigana_batch(paragraphs)
+
+
+def test_warm_up_starts_every_worker(small_threshold):
+    pids = furigana_pool.warm_up_pool(workers=2)
+    assert len(pids) == 2
+
+
+def test_generators_use_pool_for_large_documents(small_threshold, monkeypatch):
+    pages = [{"page_num": n, "paragraphs": _paragraphs(n)} for n in range(1, 6)]
+    script = "\n".join(_paragraphs(20) + ["---", "English line"])
+    serial_html = generate_html(pages)
+    serial_txt = generate_html_from_script_txt(script)
+
+    monkeypatch.setattr(furigana_pool, "FURIGANA_WORKERS", 2)
+    monkeypatch.setattr(furigana_pool, "FURIGANA_CHUNK_SIZE", 3)
+    assert generate_html(pages) == serial_html
+    assert generate_html_from_script_txt(script) == serial_txt
+    assert furigana_pool._pool is not None
+
+
+def test_override_change_replaces_pool_without_cancelling(small_threshold, monkeypatch):
+    old = furigana_pool.get_pool(2)
+    paragraphs = _paragraphs(200)
+    futures = [old.submit(add_furigana_batch, paragraphs) for _ in range(4)]
+    monkeypatch.setattr(reading_overrides, "fingerprint", lambda: "changed")
+    assert furigana_pool.get_pool(2) is not old
+    # 舊 pool 上已送出的工作照常完成
+    expected = add_furigana_batch(paragraphs)
+    assert [f.result() for f in futures] == [expected] * 4
@@ -1,4 +1,8 @@
-from app.services.html_generator import generate_html, generate_html_from_script_txt
+from app.services.html_generator import (
+    generate_html,
+    generate_html_from_script_txt,
+    generate_page_html,
+)
 
 
 def test_generate_html_single_page():
@@ -35,6 +39,16 @@ def test_generate_html_preserves_paragraphs():
     assert result.count("<p>") >= 2
 
 
+def test_generate_html_joins_page_sections():
+    pages = [
+        {"page_num": 1, "paragraphs": ["第一頁"]},
+        {"page_num": 2, "paragraphs": []},
+    ]
+    sections = [generate_page_html(page) for page in pages]
+    assert generate_html(pages) == "\n".join(sections)
+    assert sections[1] == '<section class="page" data-page="2">\n<h2>Page 2</h2>\n</section>'
+
+
 # --- generate_html_from_script_txt ---
 
 def test_script_txt_separator_becomes_hr():
@@ -69,3 +83,74 @@ def test_script_txt_wraps_in_section():
     result = generate_html_from_script_txt("テスト")
     assert 'class="page"' in result
     assert 'data-page="1"' in result
+
+
+def test_tokens_round_trip_pdf_pages():
+    from app.services.html_generator import generate_html_from_tokens, generate_tokens
+
+    pages = [
+        {"page_num": 1, "paragraphs": ["東京は大きい都市です", "ひらがな"]},
+        {"page_num": 2, "paragraphs": []},
+        {"page_num": 3, "paragraphs": ["漢字を読む"]},
+    ]
+    tokens = generate_tokens(pages)
+    assert tokens["source"] == "pdf"
+    assert generate_html_from_tokens(tokens) == generate_html(pages)
+    assert generate_html_from_tokens(tokens, 2, 3) == generate_html(pages[1:])
+
+
+def test_tokens_round_trip_script_txt():
+    from app.services.html_generator import generate_html_from_tokens, generate_tokens_from_script_txt
+
+    text = "---\n東京の都市\n\nEnglish line\n漢字"
+    tokens = generate_tokens_from_script_txt(text)
+    assert tokens["pages"][0]["paragraphs"][0] is None
+    assert tokens["pages"][0]["paragraphs"][2] == "English line"
+    assert generate_html_from_tokens(tokens) == generate_html_from_script_txt(text)
+
+
+def test_iter_html_streams_pages_in_batches(monkeypatch):
+    from app.services import html_generator
+
+    pages = [{"page_num": n, "paragraphs": [f"{n}ページ目の漢字", "ひらがな"]} for n in range(1, 6)]
+    expected = generate_html(pages)
+    # 每批只容納一頁：結果仍相同，且逐頁產生
+    monkeypatch.setattr(html_generator, "HTML_STREAM_BATCH_CHARS", 1)
+    fragments = list(html_generator.iter_html(iter(pages)))
+    assert len(fragments) == 5
+    assert "".join(fragments) == expected
+
+
+def test_iter_html_from_script_txt_matches_generate(monkeypatch):
+    from app.services import html_generator
+
+    text = "---\n東京の都市\n\nEnglish line\n漢字\n---"
+    expected = generate_html_from_script_txt(text)
+    monkeypatch.setattr(html_generator, "HTML_STREAM_BATCH_CHARS", 2)
+    assert "".join(html_generator.iter_html_from_script_txt(text)) == expected
+
+
+def test_script_txt_paginate_by_separator():
+    from app.services.html_generator import split_page_sections
+
+    text = "---\n東京の都市\nEnglish\n---\n漢字\n\n---\n"
+    html = generate_html_from_script_txt(text, paginate="separator")
+    sections = split_page_sections(html)
+    assert [num for num, _ in sections] == [1, 2]
+    assert "<hr" not in html
+    assert "English" in sections[0][1] and "漢字" in sections[1][1]
+
+
+def test_script_txt_paginate_by_lines_matches_tokens():
+    from app.services.html_generator import (
+        generate_html_from_tokens,
+        generate_tokens_from_script_txt,
+        split_page_sections,
+    )
+
+    text = "\n".join(f"{i}行目の台詞" for i in range(7))
+    html = generate_html_from_script_txt(text, paginate="lines", page_lines=3)
+    assert [num for num, _ in split_page_sections(html)] == [1, 2, 3]
+    tokens = generate_tokens_from_script_txt(text, paginate="lines", page_lines=3)
+    assert generate_html_from_tokens(tokens) == html
+    assert len(tokens["pages"][2]["paragraphs"]) == 1
@@ -1,15 +1,20 @@
+import gzip
+
 import pytest
 from fastapi.testclient import TestClient
 from app.main import app
 import app.services.library_service as lib_svc
+from app.services.html_generator import split_page_sections
 
 
-@pytest.fixture
-def client(tmp_path, monkeypatch):
+@pytest.fixture(params=["json", "sqlite"])
+def client(request, tmp_path, monkeypatch):
     docs_dir = tmp_path / "documents"
     docs_dir.mkdir()
     monkeypatch.setattr(lib_svc, "DATA_DIR", tmp_path)
     monkeypatch.setattr(lib_svc, "LIBRARY_FILE", tmp_path / "library.json")
+    monkeypatch.setattr(lib_svc, "LIBRARY_DB", tmp_path / "library.db")
+    monkeypatch.setattr(lib_svc, "LIBRARY_BACKEND", request.param)
     monkeypatch.setattr(lib_svc, "DOCUMENTS_DIR", docs_dir)
     return TestClient(app)
 
@@ -163,3 +168,458 @@ def test_get_document_html_returns_correct_page_count_for_multi_page(client):
     resp = client.get(f"/api/library/documents/{doc['id']}/html")
     assert resp.status_code == 200
     assert resp.json()["page_count"] == 3
+
+
+def test_upload_pdf_with_forced_layout(client, mixed_pdf):
+    folder = client.post("/api/library/folders", json={"name": "f"}).json()
+    doc = client.post(
+        "/api/library/documents", json={"name": "d", "folderId": folder["id"]}
+    ).json()
+    with open(mixed_pdf, "rb") as f:
+        resp = client.post(
+            f"/api/library/documents/{doc['id']}/upload",
+            files={"file": ("test.pdf", f, "application/pdf")},
+            data={"layout": "horizontal"},
+        )
+    assert resp.status_code == 200
+    assert resp.json()["page_count"] == 12
+    assert "layout;dur=" in resp.headers["server-timing"]
+
+
+def test_upload_rejects_unknown_layout(client):
+    folder = client.post("/api/library/folders", json={"name": "f"}).json()
+    doc = client.post(
+        "/api/library/documents", json={"name": "d", "folderId": folder["id"]}
+    ).json()
+    resp = client.post(
+        f"/api/library/documents/{doc['id']}/upload",
+        files={"file": ("test.txt", "あいうえお".encode("utf-8"), "text/plain")},
+        data={"layout": "diagonal"},
+    )
+    assert resp.status_code == 400
+
+
+def _upload_lazy(client, pdf_path):
+    folder = client.post("/api/library/folders", json={"name": "f"}).json()
+    doc = client.post(
+        "/api/library/documents", json={"name": "d", "folderId": folder["id"]}
+    ).json()
+    with open(pdf_path, "rb") as f:
+        resp = client.post(
+            f"/api/library/documents/{doc['id']}/upload",
+            files={"file": ("test.pdf", f, "application/pdf")},
+            data={"lazy": "true"},
+        )
+    return resp
+
+
+def test_lazy_upload_stores_source_without_converting(client, mixed_pdf):
+    resp = _upload_lazy(client, mixed_pdf)
+    assert resp.status_code == 200
+    data = resp.json()
+    assert data["lazy"] is True
+    assert data["htmlFile"] is None
+    assert data["page_count"] == 12
+    assert (lib_svc.DOCUMENTS_DIR / f"{data['id']}.pdf").exists()
+    assert not (lib_svc.DOCUMENTS_DIR / f"{data['id']}.pages").exists()
+
+
+def test_lazy_document_converts_window_around_last_page(client, mixed_pdf, monkeypatch):
+    import app.services.converter as converter
+    monkeypatch.setattr(converter, "LAZY_PAGE_WINDOW", 2)
+    doc_id = _upload_lazy(client, mixed_pdf).json()["id"]
+    client.patch(f"/api/library/documents/{doc_id}", json={"lastPage": 6})
+
+    resp = client.get(f"/api/library/documents/{doc_id}/html")
+    data = resp.json()
+    assert data["page_count"] == 12
+    assert (data["start"], data["end"]) == (4, 8)
+    assert [num for num, _ in split_page_sections(data["html"])] == [4, 5, 6, 7, 8]
+    assert len(list((lib_svc.DOCUMENTS_DIR / f"{doc_id}.pages").iterdir())) == 5
+
+
+def test_lazy_document_reuses_converted_pages(client, mixed_pdf, monkeypatch):
+    import app.services.converter as converter
+    doc_id = _upload_lazy(client, mixed_pdf).json()["id"]
+    first = client.get(f"/api/library/documents/{doc_id}/html?start=2&end=3").json()
+
+    def fail(*args, **kwargs):
+        raise AssertionError("已轉換的頁面不應重新擷取")
+
+    monkeypatch.setattr(converter, "extract_text_by_pages", fail)
+    again = client.get(f"/api/library/documents/{doc_id}/html?start=2&end=3").json()
+    assert again["html"] == first["html"]
+
+
+def test_lazy_pages_are_stored_compressed(client, mixed_pdf):
+    doc_id = _upload_lazy(client, mixed_pdf).json()["id"]
+    first = client.get(f"/api/library/documents/{doc_id}/html?start=2&end=3").json()
+    pages_dir = lib_svc.DOCUMENTS_DIR / f"{doc_id}.pages"
+    assert sorted(p.name for p in pages_dir.iterdir()) == ["2.html.gz", "3.html.gz"]
+    # 舊版未壓縮的頁面仍可讀取
+    html = gzip.decompress((pages_dir / "2.html.gz").read_bytes())
+    (pages_dir / "2.html.gz").unlink()
+    (pages_dir / "2.html").write_bytes(html)
+    again = client.get(f"/api/library/documents/{doc_id}/html?start=2&end=3").json()
+    assert again["html"] == first["html"]
+
+
+def test_lazy_page_window_with_one_bound_stays_bounded(monkeypatch):
+    import app.services.converter as converter
+    from app.services.converter import lazy_page_window
+
+    monkeypatch.setattr(converter, "LAZY_PAGE_WINDOW", 2)
+    doc = {"pageCount": 300, "lastPage": 0}
+    assert lazy_page_window(doc, 10, None) == (10, 14)
+    assert lazy_page_window(doc, None, 10) == (6, 10)
+    assert lazy_page_window(doc, 298, None) == (298, 300)
+    assert lazy_page_window(doc, None, 3) == (1, 3)
+
+
+def test_lazy_document_start_only_converts_one_window(client, mixed_pdf, monkeypatch):
+    import app.services.converter as converter
+    monkeypatch.setattr(converter, "LAZY_PAGE_WINDOW", 1)
+    doc_id = _upload_lazy(client, mixed_pdf).json()["id"]
+    data = client.get(f"/api/library/documents/{doc_id}/html?start=4").json()
+    assert (data["start"], data["end"]) == (4, 6)
+    assert len(list((lib_svc.DOCUMENTS_DIR / f"{doc_id}.pages").iterdir())) == 3
+
+
+def test_upload_does_blocking_work_off_the_event_loop(client, mixed_pdf, monkeypatch):
+    import asyncio
+    import app.routers.library as library_router
+
+    on_loop = []
+
+    def tracked(fn):
+        def wrapper(*args, **kwargs):
+            try:
+                asyncio.get_running_loop()
+                on_loop.append(fn.__name__)
+            except RuntimeError:
+                pass
+            return fn(*args, **kwargs)
+        return wrapper
+
+    monkeypatch.setattr(library_router, "count_pages", tracked(library_router.count_pages))
+    for name in ("set_document_source", "get_document_fragment_keys", "get_document_analysis",
+                 "save_document_analysis", "save_document_fragment_keys"):
+        monkeypatch.setattr(lib_svc, name, tracked(getattr(lib_svc, name)))
+    _upload_lazy(client, mixed_pdf)
+    doc = _new_doc(client)
+    _upload(client, doc["id"], "s.txt", _SCRIPT_TXT)
+    _upload(client, doc["id"], "s.txt", _SCRIPT_TXT + "\n追加の行".encode())
+    assert on_loop == []
+
+
+def test_lazy_page_window_explicit_zero_end_is_empty():
+    from app.services.converter import lazy_page_window
+
+    doc = {"pageCount": 12, "lastPage": 0}
+    assert lazy_page_window(doc, 1, 0) == (1, 0)
+    assert lazy_page_window(doc, 3, None) == (3, 12)
+    assert lazy_page_window(doc, 5, 2) == (5, 4)
+
+
+def test_delete_lazy_document_removes_source_and_pages(client, mixed_pdf):
+    doc_id = _upload_lazy(client, mixed_pdf).json()["id"]
+    client.get(f"/api/library/documents/{doc_id}/html")
+    client.delete(f"/api/library/documents/{doc_id}")
+    assert list(lib_svc.DOCUMENTS_DIR.iterdir()) == []
+
+
+def test_get_document_html_page_range(client):
+    folder = client.post("/api/library/folders", json={"name": "f"}).json()
+    doc = client.post(
+        "/api/library/documents", json={"name": "d", "folderId": folder["id"]}
+    ).json()
+    lib_svc.set_document_html(doc["id"], '\n'.join(
+        f'<section class="page" data-page="{n}"><p>Page {n}</p></section>' for n in range(1, 6)
+    ))
+    data = client.get(f"/api/library/documents/{doc['id']}/html?start=2&end=3").json()
+    assert data["page_count"] == 5
+    assert "Page 2" in data["html"] and "Page 3" in data["html"]
+    assert "Page 4" not in data["html"]
+
+
+# ── token 格式 ────────────────────────────────────────
+
+_SCRIPT_TXT = "\n".join(
+    ["---", "Track 1"]
+    + [f"{i}回目、耳元で私の気持ちを囁きます。深呼吸して力を抜いてください。" for i in range(30)]
+    + ["(English translation)"]
+).encode("utf-8")
+
+
+def _new_doc(client):
+    folder = client.post("/api/library/folders", json={"name": "f"}).json()
+    return client.post(
+        "/api/library/documents", json={"name": "d", "folderId": folder["id"]}
+    ).json()
+
+
+def _upload(client, doc_id, filename, content, **data):
+    return client.post(
+        f"/api/library/documents/{doc_id}/upload",
+        files={"file": (filename, content, "application/octet-stream")},
+        data=data,
+    )
+
+
+def test_upload_tokens_format_renders_same_html(client):
+    html_doc, token_doc = _new_doc(client), _new_doc(client)
+    _upload(client, html_doc["id"], "s.txt", _SCRIPT_TXT)
+    resp = _upload(client, token_doc["id"], "s.txt", _SCRIPT_TXT, output="tokens")
+    assert resp.status_code == 200
+    assert resp.json()["htmlFile"] is None
+    assert resp.json()["tokensFile"] == f"{token_doc['id']}.tokens.json.gz"
+
+    expected = client.get(f"/api/library/documents/{html_doc['id']}/html").json()
+    assert client.get(f"/api/library/documents/{token_doc['id']}/html").json() == expected
+
+
+def test_tokens_endpoint_is_much_smaller_than_html(client):
+    doc = _new_doc(client)
+    _upload(client, doc["id"], "s.txt", _SCRIPT_TXT, output="tokens")
+    resp = client.get(f"/api/library/documents/{doc['id']}/tokens")
+    assert resp.status_code == 200
+    assert resp.headers["content-type"] == "application/json"
+    tokens = resp.json()
+    assert tokens["format"] == "furigana-tokens" and tokens["source"] == "txt"
+    html = client.get(f"/api/library/documents/{doc['id']}/html").json()["html"]
+    assert len(resp.content) < len(html.encode("utf-8")) * 0.6
+
+
+def test_tokens_endpoint_passes_gzip_through(client):
+    doc = _new_doc(client)
+    _upload(client, doc["id"], "s.txt", _SCRIPT_TXT, output="tokens")
+    url = f"/api/library/documents/{doc['id']}/tokens"
+    stored = (lib_svc.DOCUMENTS_DIR / f"{doc['id']}.tokens.json.gz").read_bytes()
+
+    # 接受 gzip：原樣送出儲存的位元組
+    resp = client.get(url, headers={"Accept-Encoding": "gzip"})
+    assert resp.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in resp.headers["vary"]
+    assert resp.headers["content-length"] == str(len(stored))
+    assert resp.json()["format"] == "furigana-tokens"
+
+    # 不接受 gzip：伺服器端解壓縮
+    for accept in ("identity", "gzip;q=0"):
+        resp = client.get(url, headers={"Accept-Encoding": accept})
+        assert "content-encoding" not in resp.headers
+        assert resp.content == gzip.decompress(stored)
+
+
+def test_html_raw_endpoint(client):
+    doc = _new_doc(client)
+    assert client.get(f"/api/library/documents/{doc['id']}/html/raw").status_code == 404
+    _upload(client, doc["id"], "s.txt", _SCRIPT_TXT)
+    resp = client.get(f"/api/library/documents/{doc['id']}/html/raw", headers={"Accept-Encoding": "gzip"})
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/html")
+    assert resp.headers["content-encoding"] == "gzip"
+    assert resp.text == client.get(f"/api/library/documents/{doc['id']}/html").json()["html"]
+
+
+def test_html_passes_gzip_through_when_accepting_html(client, mixed_pdf):
+    doc = _new_doc(client)
+    _upload(client, doc["id"], "s.txt", _SCRIPT_TXT)
+    url = f"/api/library/documents/{doc['id']}/html"
+    stored = (lib_svc.DOCUMENTS_DIR / f"{doc['id']}.html.gz").read_bytes()
+    headers = {"Accept": "text/html, application/json;q=0.9", "Accept-Encoding": "gzip"}
+
+    resp = client.get(url, headers=headers)
+    assert resp.headers["content-type"].startswith("text/html")
+    assert resp.headers["content-encoding"] == "gzip"
+    assert resp.headers["content-length"] == str(len(stored))
+    assert "Accept" in resp.headers["vary"]
+    assert resp.text == client.get(url).json()["html"]
+
+    # 指定範圍與延遲轉換的文件仍回傳 JSON
+    assert client.get(f"{url}?start=1&end=1", headers=headers).json()["start"] == 1
+    lazy_id = _upload_lazy(client, mixed_pdf).json()["id"]
+    resp = client.get(f"/api/library/documents/{lazy_id}/html", headers=headers)
+    assert resp.json()["page_count"] == 12
+
+
+@pytest.mark.parametrize("accept, expected", [
+    ("gzip", True),
+    ("*", True),
+    ("*;q=0, gzip", True),
+    ("gzip, *;q=0", True),
+    ("gzip;q=0, *", False),
+    ("*;q=0", False),
+    ("identity", False),
+    (None, False),
+])
+def test_accepts_gzip_prefers_explicit_coding(accept, expected):
+    from app.routers.library import _accepts_gzip
+
+    assert _accepts_gzip(accept) is expected
+
+
+def test_migrate_compress_endpoint(client):
+    doc = _new_doc(client)
+    _upload(client, doc["id"], "s.txt", _SCRIPT_TXT)
+    html = client.get(f"/api/library/documents/{doc['id']}/html").json()["html"]
+    # 模擬舊版的未壓縮檔案
+    (lib_svc.DOCUMENTS_DIR / f"{doc['id']}.html.gz").unlink()
+    (lib_svc.DOCUMENTS_DIR / f"{doc['id']}.html").write_text(html, encoding="utf-8")
+    library = lib_svc.load_library()
+    next(d for d in library["documents"] if d["id"] == doc["id"])["htmlFile"] = f"{doc['id']}.html"
+    lib_svc.save_library(library)
+    assert client.get(f"/api/library/documents/{doc['id']}/html").json()["html"] == html
+
+    assert client.post("/api/library/migrate/compress").json() == {"migrated": 1}
+    assert not (lib_svc.DOCUMENTS_DIR / f"{doc['id']}.html").exists()
+    assert lib_svc.get_document(doc["id"])["htmlFile"] == f"{doc['id']}.html.gz"
+    assert client.get(f"/api/library/documents/{doc['id']}/html").json()["html"] == html
+    assert client.post("/api/library/migrate/compress").json() == {"migrated": 0}
+
+
+def test_tokens_document_page_range(client, mixed_pdf):
+    doc = _new_doc(client)
+    with open(mixed_pdf, "rb") as f:
+        _upload(client, doc["id"], "m.pdf", f.read(), output="tokens")
+    data = client.get(f"/api/library/documents/{doc['id']}/html?start=2&end=3").json()
+    assert data["page_count"] == 12
+    assert (data["start"], data["end"]) == (2, 3)
+    assert [num for num, _ in split_page_sections(data["html"])] == [2, 3]
+
+
+def test_reupload_as_html_removes_tokens(client):
+    doc = _new_doc(client)
+    _upload(client, doc["id"], "s.txt", _SCRIPT_TXT, output="tokens")
+    resp = _upload(client, doc["id"], "s.txt", _SCRIPT_TXT)
+    assert "tokensFile" not in resp.json()
+    assert not (lib_svc.DOCUMENTS_DIR / f"{doc['id']}.tokens.json.gz").exists()
+    assert client.get(f"/api/library/documents/{doc['id']}/tokens").status_code == 404
+
+
+def test_upload_reuses_cached_analysis(client):
+    from app.services import furigana
+
+    furigana.clear_furigana_cache()
+    script = "\n".join(["東京の大きい都市で漢字を読む", "今日は晴れ"] * 100)
+    first, second = _new_doc(client), _new_doc(client)
+    _upload(client, first["id"], "r.txt", script)
+    # 另一份內容不同的文件中，相同的行不再斷詞
+    _upload(client, second["id"], "r.txt", script + "\n漢字を書く")
+    stats = furigana.furigana_cache_stats()["analysis"]
+    assert (stats["misses"], stats["hits"]) == (3, 2)
+
+
+def test_upload_rejects_unknown_output(client):
+    doc = _new_doc(client)
+    resp = _upload(client, doc["id"], "s.txt", _SCRIPT_TXT, output="msgpack")
+    assert resp.status_code == 400
+
+
+# ── 斷詞結果與重新呈現 ────────────────────────────────
+
+
+def test_upload_saves_analysis_next_to_document(client):
+    doc = _new_doc(client)
+    resp = _upload(client, doc["id"], "s.txt", _SCRIPT_TXT)
+    assert resp.json()["analysisFile"] == f"{doc['id']}.analysis.json.gz"
+    analysis = lib_svc.get_document_analysis(doc["id"])
+    assert analysis["format"] == "furigana-analysis"
+    first_ja = analysis["pages"][0]["paragraphs"][2]
+    assert all(len(m) == 3 for m in first_ja)
+
+
+def test_render_endpoint_rerenders_without_tagging(client, monkeypatch):
+    from app.services import furigana
+
+    doc = _new_doc(client)
+    _upload(client, doc["id"], "s.txt", _SCRIPT_TXT)
+    stored = client.get(f"/api/library/documents/{doc['id']}/html").json()["html"]
+
+    def fail():
+        raise AssertionError("重新呈現不應執行 MeCab")
+
+    monkeypatch.setattr(furigana, "_checkout_tagger", fail)
+    url = f"/api/library/documents/{doc['id']}/render"
+    assert client.post(url, json={}).json()["html"] == stored
+
+    data = client.post(url, json={"reading": "katakana", "ruby": "paren", "known_kanji": "回目"}).json()
+    assert data["page_count"] == 1
+    assert "<ruby>" not in data["html"]
+    assert "耳元(ミミモト)" in data["html"]
+    assert "回目(" not in data["html"]
+
+
+def test_render_endpoint_page_range(client, mixed_pdf):
+    doc = _new_doc(client)
+    with open(mixed_pdf, "rb") as f:
+        _upload(client, doc["id"], "m.pdf", f.read())
+    data = client.post(f"/api/library/documents/{doc['id']}/render", json={"start": 3, "end": 4}).json()
+    assert data["page_count"] == 12
+    assert [num for num, _ in split_page_sections(data["html"])] == [3, 4]
+
+
+def test_render_endpoint_errors(client, mixed_pdf):
+    doc = _new_doc(client)
+    url = f"/api/library/documents/{doc['id']}/render"
+    assert client.post(url, json={}).status_code == 404
+    _upload(client, doc["id"], "s.txt", _SCRIPT_TXT)
+    assert client.post(url, json={"ruby": "bold"}).status_code == 400
+    assert client.post(url, json={"reading": "romaji"}).status_code == 400
+
+    lazy_doc = _upload_lazy(client, mixed_pdf).json()
+    assert "analysisFile" not in lazy_doc
+    assert client.post(f"/api/library/documents/{lazy_doc['id']}/render", json={}).status_code == 404
+
+
+def test_reupload_txt_regenerates_only_changed_lines(client):
+    from app.services import converter
+
+    doc = _new_doc(client)
+    first = _upload(client, doc["id"], "s.txt", _SCRIPT_TXT).json()
+    assert first["fragments"] == {"reused": 0, "regenerated": 30}
+
+    edited = _SCRIPT_TXT.replace("13回目".encode(), "13回目の修正".encode())
+    resp = _upload(client, doc["id"], "s.txt", edited)
+    assert resp.json()["fragments"] == {"reused": 29, "regenerated": 1}
+
+    # 沿用片段產生的 HTML 與全新轉換相同
+    fresh = _new_doc(client)
+    _upload(client, fresh["id"], "s.txt", edited)
+    expected = client.get(f"/api/library/documents/{fresh['id']}/html").json()
+    assert client.get(f"/api/library/documents/{doc['id']}/html").json() == expected
+
+
+def test_fragments_not_reused_after_version_change(client, monkeypatch):
+    from app.routers import library
+
+    doc = _new_doc(client)
+    _upload(client, doc["id"], "s.txt", _SCRIPT_TXT)
+    monkeypatch.setattr(library, "fragment_version", lambda: "other")
+    resp = _upload(client, doc["id"], "s.txt", _SCRIPT_TXT + "\n新しい行".encode())
+    assert resp.json()["fragments"] == {"reused": 0, "regenerated": 31}
+
+
+def test_upload_paginated_txt_supports_ranges_and_last_page(client):
+    from app.services import converter
+
+    doc = _new_doc(client)
+    resp = _upload(client, doc["id"], "s.txt", _SCRIPT_TXT, paginate="lines", page_lines="4")
+    assert resp.status_code == 200
+    assert resp.json()["page_count"] == 9  # 33 行，每頁 4 行
+
+    full = client.get(f"/api/library/documents/{doc['id']}/html").json()
+    assert full["page_count"] == 9
+    part = client.get(f"/api/library/documents/{doc['id']}/html?start=3&end=4").json()
+    assert part["html"].startswith('<section class="page" data-page="3">')
+    assert part["html"].count('<section class="page"') == 2
+
+    client.patch(f"/api/library/documents/{doc['id']}", json={"lastPage": 7})
+    window = client.get(f"/api/library/documents/{doc['id']}/html?window=true").json()
+    assert window["start"] == max(1, 7 - converter.LAZY_PAGE_WINDOW)
+    assert window["end"] == 9
+
+
+def test_upload_rejects_unknown_paginate(client):
+    doc = _new_doc(client)
+    resp = _upload(client, doc["id"], "s.txt", _SCRIPT_TXT, paginate="chapters")
+    assert resp.status_code == 400
@@ -3,12 +3,14 @@ from pathlib import Path
 import app.services.library_service as lib_svc
 
 
-@pytest.fixture(autouse=True)
-def tmp_data(tmp_path, monkeypatch):
+@pytest.fixture(autouse=True, params=["json", "sqlite"])
+def tmp_data(request, tmp_path, monkeypatch):
     docs_dir = tmp_path / "documents"
     docs_dir.mkdir()
     monkeypatch.setattr(lib_svc, "DATA_DIR", tmp_path)
     monkeypatch.setattr(lib_svc, "LIBRARY_FILE", tmp_path / "library.json")
+    monkeypatch.setattr(lib_svc, "LIBRARY_DB", tmp_path / "library.db")
+    monkeypatch.setattr(lib_svc, "LIBRARY_BACKEND", request.param)
     monkeypatch.setattr(lib_svc, "DOCUMENTS_DIR", docs_dir)
 
 
@@ -106,6 +108,55 @@ def test_set_and_get_document_html():
     assert html == "<p>content</p>"
 
 
+def test_set_document_html_from_fragments():
+    folder = lib_svc.create_folder("f")
+    doc = lib_svc.create_document("d", folder["id"])
+    lib_svc.set_document_html(doc["id"], (f"<p>{i}</p>" for i in range(3)))
+    assert lib_svc.get_document_html(doc["id"]) == "<p>0</p><p>1</p><p>2</p>"
+    assert [p.name for p in lib_svc.DOCUMENTS_DIR.iterdir()] == [f"{doc['id']}.html.gz"]
+
+
+def test_failed_rewrite_keeps_previous_html():
+    folder = lib_svc.create_folder("f")
+    doc = lib_svc.create_document("d", folder["id"])
+    lib_svc.set_document_html(doc["id"], "<p>old</p>")
+
+    def fragments():
+        # 寫入期間讀取端仍讀得到舊內容
+        assert lib_svc.get_document_html(doc["id"]) == "<p>old</p>"
+        yield "<p>new"
+        raise RuntimeError("render failed")
+
+    with pytest.raises(RuntimeError):
+        lib_svc.set_document_html(doc["id"], fragments())
+    assert lib_svc.get_document_html(doc["id"]) == "<p>old</p>"
+    assert [p.name for p in lib_svc.DOCUMENTS_DIR.iterdir()] == [f"{doc['id']}.html.gz"]
+
+
+def test_switching_format_removes_old_file_after_commit():
+    folder = lib_svc.create_folder("f")
+    doc = lib_svc.create_document("d", folder["id"])
+    lib_svc.set_document_html(doc["id"], "<p>old</p>")
+    updated = lib_svc.set_document_tokens(doc["id"], {"format": "furigana-tokens", "pages": []})
+    assert updated["htmlFile"] is None
+    assert [p.name for p in lib_svc.DOCUMENTS_DIR.iterdir()] == [updated["tokensFile"]]
+
+
+def test_concurrent_rewrites_use_separate_temp_files():
+    folder = lib_svc.create_folder("f")
+    doc = lib_svc.create_document("d", folder["id"])
+
+    def fragments():
+        yield "<p>first"
+        # 第一個寫入進行中，另一個上傳完成
+        lib_svc.set_document_html(doc["id"], "<p>second</p>")
+        yield "</p>"
+
+    lib_svc.set_document_html(doc["id"], fragments())
+    assert lib_svc.get_document_html(doc["id"]) == "<p>first</p>"
+    assert [p.name for p in lib_svc.DOCUMENTS_DIR.iterdir()] == [f"{doc['id']}.html.gz"]
+
+
 def test_get_document_html_not_uploaded():
     folder = lib_svc.create_folder("f")
     doc = lib_svc.create_document("d", folder["id"])
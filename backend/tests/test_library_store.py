@@ -0,0 +1,291 @@
+import json
+import threading
+
+import pytest
+
+import app.services.library_service as lib_svc
+from app.services.library_store import JsonLibraryStore, SqliteLibraryStore, import_json
+
+_LIBRARY = {
+    "folders": [
+        {"id": "f-1", "name": "A", "order": 0, "tagIds": ["t-1", "t-2"]},
+        {"id": "f-2", "name": "B", "order": 1, "tagIds": []},
+    ],
+    "tags": [{"id": "t-1", "name": "x", "color": "#fff"}, {"id": "t-2", "name": "y", "color": "#000"}],
+    "documents": [
+        {
+            "id": f"doc-{i}", "name": f"d{i}", "folderId": "f-1" if i % 2 else "f-2",
+            "tagIds": ["t-2", "t-1"] if i == 1 else [], "htmlFile": None, "lastPage": i,
+            "notes": "メモ", "translations": {"deepl": {"zh-TW": {"p-0": "你好"}}} if i == 1 else {},
+            "createdAt": "2026-01-01T00:00:00", "uploadedAt": None,
+        }
+        for i in range(4)
+    ],
+}
+
+
+@pytest.fixture
+def json_file(tmp_path):
+    path = tmp_path / "library.json"
+    path.write_text(json.dumps(_LIBRARY, ensure_ascii=False), encoding="utf-8")
+    return path
+
+
+def test_import_json_roundtrip(tmp_path, json_file):
+    counts = import_json(json_file, tmp_path / "library.db")
+    assert counts == {"folders": 2, "tags": 2, "documents": 4}
+    store = SqliteLibraryStore(tmp_path / "library.db")
+    assert store.load() == _LIBRARY
+    store.close()
+
+
+def test_import_replaces_existing_rows(tmp_path, json_file):
+    import_json(json_file, tmp_path / "library.db")
+    import_json(json_file, tmp_path / "library.db")
+    store = SqliteLibraryStore(tmp_path / "library.db")
+    assert len(store.load()["documents"]) == 4
+    store.close()
+
+
+@pytest.mark.parametrize("store_class", [JsonLibraryStore, SqliteLibraryStore])
+def test_remove_tag_keeps_other_tag_order(tmp_path, store_class):
+    store = store_class(tmp_path / "library.store")
+    store.save(_LIBRARY)
+    assert store.remove_tag("t-1")
+    assert not store.remove_tag("t-1")
+    library = store.load()
+    assert library["folders"][0]["tagIds"] == ["t-2"]
+    assert library["documents"][1]["tagIds"] == ["t-2"]
+    store.close()
+
+
+@pytest.mark.parametrize("store_class", [JsonLibraryStore, SqliteLibraryStore])
+def test_remove_folder_returns_its_documents(tmp_path, store_class):
+    store = store_class(tmp_path / "library.store")
+    store.save(_LIBRARY)
+    removed = store.remove_folder("f-1")
+    assert [d["id"] for d in removed] == ["doc-1", "doc-3"]
+    assert removed[0]["translations"] == {"deepl": {"zh-TW": {"p-0": "你好"}}}
+    assert [d["id"] for d in store.load()["documents"]] == ["doc-0", "doc-2"]
+    assert store.remove_folder("f-1") is None
+    store.close()
+
+
+def test_sqlite_modify_keeps_translations_and_order(tmp_path):
+    store = SqliteLibraryStore(tmp_path / "library.db")
+    store.save(_LIBRARY)
+    store.modify_document("doc-1", lambda doc: doc.update(lastPage=42))
+    store.merge_translations("doc-1", "deepl", "zh-TW", {"p-1": "再見"})
+    doc = store.get_document("doc-1")
+    assert doc["lastPage"] == 42
+    assert doc["translations"]["deepl"]["zh-TW"] == {"p-0": "你好", "p-1": "再見"}
+    assert [d["id"] for d in store.load()["documents"]] == ["doc-0", "doc-1", "doc-2", "doc-3"]
+    assert store.modify_document("doc-missing", lambda doc: None) is None
+    assert store.merge_translations("doc-missing", "deepl", "zh-TW", {}) is None
+    store.close()
+
+
+@pytest.mark.parametrize("store_class", [JsonLibraryStore, SqliteLibraryStore])
+def test_concurrent_modifications_keep_both_changes(tmp_path, store_class):
+    store = store_class(tmp_path / "library.store")
+    store.save(_LIBRARY)
+    started, release = threading.Event(), threading.Event()
+
+    def slow(doc):
+        doc["notes"] = "慢"
+        doc.pop("uploadedAt")
+        started.set()
+        assert release.wait(5)
+
+    worker = threading.Thread(target=store.modify_document, args=("doc-1", slow))
+    worker.start()
+    assert started.wait(5)
+    # fn 執行期間其他請求修改同一文件的其他欄位
+    store.modify_document("doc-1", lambda doc: doc.update(lastPage=42, tagIds=["t-1"]))
+    store.merge_translations("doc-1", "deepl", "zh-TW", {"p-1": "再見"})
+    release.set()
+    worker.join()
+
+    doc = store.get_document("doc-1")
+    assert (doc["notes"], doc["lastPage"], doc["tagIds"]) == ("慢", 42, ["t-1"])
+    assert "uploadedAt" not in doc
+    assert doc["translations"]["deepl"]["zh-TW"] == {"p-0": "你好", "p-1": "再見"}
+    store.close()
+
+
+def test_service_uses_imported_sqlite_library(tmp_path, json_file, monkeypatch):
+    docs_dir = tmp_path / "documents"
+    docs_dir.mkdir()
+    monkeypatch.setattr(lib_svc, "DATA_DIR", tmp_path)
+    monkeypatch.setattr(lib_svc, "LIBRARY_FILE", json_file)
+    monkeypatch.setattr(lib_svc, "LIBRARY_DB", tmp_path / "library.db")
+    monkeypatch.setattr(lib_svc, "DOCUMENTS_DIR", docs_dir)
+    monkeypatch.setattr(lib_svc, "LIBRARY_BACKEND", "sqlite")
+
+    assert lib_svc.import_library_json() == {"folders": 2, "tags": 2, "documents": 4}
+    assert lib_svc.load_library() == _LIBRARY
+    lib_svc.update_document("doc-2", {"lastPage": 7})
+    assert lib_svc.get_document("doc-2")["lastPage"] == 7
+    # 匯入不會修改原本的 JSON
+    assert json.loads(json_file.read_text(encoding="utf-8")) == _LIBRARY
+
+
+def test_unknown_backend(tmp_path, monkeypatch):
+    monkeypatch.setattr(lib_svc, "DATA_DIR", tmp_path)
+    monkeypatch.setattr(lib_svc, "DOCUMENTS_DIR", tmp_path / "documents")
+    monkeypatch.setattr(lib_svc, "LIBRARY_BACKEND", "mongo")
+    with pytest.raises(ValueError):
+        lib_svc.load_library()
+
+
+# ── 記憶體快取 ──
+
+
+@pytest.fixture(params=["json", "sqlite"])
+def service(request, tmp_path, monkeypatch):
+    docs_dir = tmp_path / "documents"
+    docs_dir.mkdir()
+    monkeypatch.setattr(lib_svc, "DATA_DIR", tmp_path)
+    monkeypatch.setattr(lib_svc, "LIBRARY_FILE", tmp_path / "library.json")
+    monkeypatch.setattr(lib_svc, "LIBRARY_DB", tmp_path / "library.db")
+    monkeypatch.setattr(lib_svc, "DOCUMENTS_DIR", docs_dir)
+    monkeypatch.setattr(lib_svc, "LIBRARY_BACKEND", request.param)
+    lib_svc.save_library(_LIBRARY)
+    return request.param
+
+
+def test_library_json_is_reused_until_changed(service):
+    first = lib_svc.library_json()
+    assert lib_svc.library_json() is first
+    lib_svc.update_document("doc-0", {"lastPage": 9})
+    changed = lib_svc.library_json()
+    assert changed is not first
+    assert json.loads(changed)["documents"][0]["lastPage"] == 9
+
+
+def test_returned_objects_are_copies(service):
+    lib_svc.load_library()["documents"][0]["name"] = "changed"
+    lib_svc.get_document("doc-0")["name"] = "changed"
+    lib_svc.update_document("doc-1", {"lastPage": 5})["name"] = "changed"
+    assert [d["name"] for d in lib_svc.load_library()["documents"][:2]] == ["d0", "d1"]
+
+
+def test_failed_modification_leaves_library_unchanged(service):
+    def fail(doc):
+        doc.pop("htmlFile")
+        raise RuntimeError("conversion failed")
+
+    with pytest.raises(RuntimeError):
+        lib_svc._store().modify_document("doc-0", fail)
+    assert lib_svc.get_document("doc-0")["htmlFile"] is None
+
+
+def test_external_changes_are_detected(service, tmp_path):
+    lib_svc.library_json()
+    assert lib_svc.get_document("doc-0")["name"] == "d0"
+    edited = json.loads(json.dumps(_LIBRARY))
+    edited["documents"][0]["name"] = "edited elsewhere"
+    # 模擬其他行程（或手動）修改書庫
+    if service == "json":
+        (tmp_path / "library.json").write_text(json.dumps(edited, ensure_ascii=False), encoding="utf-8")
+    else:
+        other = SqliteLibraryStore(tmp_path / "library.db")
+        other.save(edited)
+        other.close()
+    assert lib_svc.get_document("doc-0")["name"] == "edited elsewhere"
+    assert json.loads(lib_svc.library_json())["documents"][0]["name"] == "edited elsewhere"
+
+
+# ── 變更日誌 ──
+
+
+def _mutate(store):
+    store.add_document({**_LIBRARY["documents"][0], "id": "doc-new", "name": "新"})
+    store.modify_document("doc-0", lambda doc: doc.update(lastPage=99, notes="更新"))
+    store.modify_document("doc-2", lambda doc: doc.pop("uploadedAt"))
+    store.merge_translations("doc-1", "deepl", "zh-TW", {"p-1": "再見"})
+    store.remove_tag("t-1")
+    store.remove_folder("f-1")
+    store.modify_folder("f-2", lambda folder: folder.update(name="B2"))
+
+
+@pytest.fixture
+def journaled(tmp_path):
+    store = JsonLibraryStore(tmp_path / "library.json")
+    store.save(_LIBRARY)
+    _mutate(store)
+    yield store
+    store.close()
+
+
+def test_mutations_append_to_journal_and_replay(tmp_path, journaled):
+    # 快照不變，變更只寫入日誌
+    assert json.loads((tmp_path / "library.json").read_text(encoding="utf-8")) == _LIBRARY
+    lines = (tmp_path / "library.json.journal").read_text(encoding="utf-8").splitlines()
+    assert len(lines) == 7
+    assert all(len(line) < 400 for line in lines)
+
+    expected = journaled.load()
+    assert [d["id"] for d in expected["documents"]] == ["doc-0", "doc-2", "doc-new"]
+    assert expected["documents"][0]["lastPage"] == 99
+    assert "uploadedAt" not in expected["documents"][1]
+    assert expected["folders"] == [{"id": "f-2", "name": "B2", "order": 1, "tagIds": []}]
+    assert JsonLibraryStore(tmp_path / "library.json").load() == expected
+
+
+def test_unchanged_modification_is_not_journaled(tmp_path, journaled):
+    size = journaled.journal_size()
+    assert journaled.modify_document("doc-0", lambda doc: None)["lastPage"] == 99
+    assert journaled.journal_size() == size
+
+
+def test_incomplete_journal_record_is_discarded(tmp_path, journaled):
+    expected = journaled.load()
+    journal = tmp_path / "library.json.journal"
+    with open(journal, "ab") as f:
+        f.write(b'{"changes":[{"op":"set","kind":"documents","id":"doc-0","fie')  # 寫入中途當機
+
+    store = JsonLibraryStore(tmp_path / "library.json")
+    assert store.load() == expected
+    assert journal.read_bytes().endswith(b"\n")
+    store.modify_document("doc-0", lambda doc: doc.update(lastPage=100))
+    assert JsonLibraryStore(tmp_path / "library.json").get_document("doc-0")["lastPage"] == 100
+
+
+def test_corrupt_journal_record_in_the_middle_is_kept_aside(tmp_path, journaled):
+    expected = journaled.load()
+    journal = tmp_path / "library.json.journal"
+    lines = journal.read_bytes().splitlines(keepends=True)
+    damaged = b"".join(lines[:2] + [b'{"changes":[{"op":"se\x00\n'] + lines[2:])
+    journal.write_bytes(damaged)
+
+    # 損毀記錄之後的變更仍然套用，原始日誌另存一份
+    store = JsonLibraryStore(tmp_path / "library.json")
+    with pytest.warns(RuntimeWarning, match="1 筆損毀"):
+        assert store.load() == expected
+    corrupt = tmp_path / "library.json.journal.corrupt"
+    assert corrupt.read_bytes() == damaged
+    assert journal.read_bytes() == b"".join(lines)
+    assert JsonLibraryStore(tmp_path / "library.json").load() == expected
+    assert corrupt.read_bytes() == damaged
+
+
+def test_compaction_folds_journal_into_snapshot(tmp_path):
+    store = JsonLibraryStore(tmp_path / "library.json", journal_max_bytes=500)
+    store.save(_LIBRARY)
+    _mutate(store)
+    store.close()  # 等待背景壓縮完成
+    expected = store.load()
+    assert store.journal_size() < 500
+    assert not (tmp_path / "library.json.tmp").exists()
+    assert JsonLibraryStore(tmp_path / "library.json").load() == expected
+
+
+def test_replaying_compacted_journal_is_idempotent(tmp_path, journaled):
+    """新快照已寫入、日誌尚未清空時當機：重播已併入的記錄結果不變"""
+    expected = journaled.load()
+    journal = (tmp_path / "library.json.journal").read_bytes()
+    journaled.compact()
+    assert not (tmp_path / "library.json.journal").exists()
+    (tmp_path / "library.json.journal").write_bytes(journal)
+    assert JsonLibraryStore(tmp_path / "library.json").load() == expected
@@ -1,3 +1,5 @@
+import pytest
+
 from app.services.pdf_extractor import extract_text_by_pages
 
 
@@ -55,3 +57,179 @@ def test_extract_vertical_text_reading_order(sample_pdf):
     assert title_idx <= 2, (
         f"標題應在前 3 個段落（右欄優先），實際位置：{title_idx}"
     )
+
+
+def test_iter_text_by_pages_yields_lazily(mixed_pdf):
+    from app.services.pdf_extractor import iter_text_by_pages
+    pages = iter_text_by_pages(mixed_pdf, workers=1)
+    assert next(pages)["page_num"] == 1
+    assert [p["page_num"] for p in pages] == list(range(2, 13))
+
+
+# ── 平行擷取 ─────────────────────────────────────────────────────────────────
+
+def test_parallel_extract_matches_serial(mixed_pdf, monkeypatch):
+    import app.services.pdf_extractor as extractor
+    monkeypatch.setattr(extractor, "PARALLEL_MIN_PAGES", 1)
+    serial = extract_text_by_pages(mixed_pdf, workers=1)
+    parallel = extract_text_by_pages(mixed_pdf, workers=3)
+    assert parallel == serial
+    assert [p["page_num"] for p in parallel] == list(range(1, 13))
+
+
+def test_parallel_extract_detects_both_layouts(mixed_pdf):
+    result = extract_text_by_pages(mixed_pdf, workers=1)
+    assert result[0]["paragraphs"][0] == "第一章の台詞です"
+    assert result[1]["paragraphs"][0].startswith("Page 2 heading")
+    assert result[4]["paragraphs"] == []
+
+
+def test_small_document_uses_serial_path(mixed_pdf, monkeypatch):
+    import app.services.pdf_extractor as extractor
+
+    def fail(*args):
+        raise AssertionError("小文件不應使用 process pool")
+
+    monkeypatch.setattr(extractor, "_iter_parallel", fail)
+    result = extract_text_by_pages(mixed_pdf, workers=4)
+    assert len(result) == 12
+
+
+def test_parallel_extract_from_bytes(mixed_pdf, monkeypatch):
+    import app.services.pdf_extractor as extractor
+    from pathlib import Path
+    monkeypatch.setattr(extractor, "PARALLEL_MIN_PAGES", 1)
+    data = Path(mixed_pdf).read_bytes()
+    assert extract_text_by_pages(data, workers=2) == extract_text_by_pages(mixed_pdf, workers=1)
+
+
+class _InlineExecutor:
+    """在本行程依序執行的 ProcessPoolExecutor 替身，記錄送出的區段"""
+
+    submitted: list = []
+
+    def __init__(self, max_workers, mp_context, initializer, initargs):
+        initializer(*initargs)
+        _InlineExecutor.submitted = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def submit(self, fn, *args):
+        from concurrent.futures import Future
+        _InlineExecutor.submitted.append(args)
+        future = Future()
+        future.set_result(fn(*args))
+        return future
+
+
+def test_parallel_extract_submits_a_bounded_window(mixed_pdf, monkeypatch):
+    import app.services.pdf_extractor as extractor
+    from app.services.pdf_extractor import iter_text_by_pages
+    monkeypatch.setattr(extractor, "PARALLEL_MIN_PAGES", 1)
+    monkeypatch.setattr(extractor, "ProcessPoolExecutor", _InlineExecutor)
+    monkeypatch.setattr(extractor, "_worker_doc", None)
+
+    # 12 頁、2 個 worker：切成 6 個區段，同時最多送出 4 個
+    pages = iter_text_by_pages(mixed_pdf, workers=2)
+    assert next(pages)["page_num"] == 1
+    assert len(_InlineExecutor.submitted) == 5
+    assert [p["page_num"] for p in pages] == list(range(2, 13))
+    assert len(_InlineExecutor.submitted) == 6
+
+
+def test_document_is_closed_when_layout_detection_fails(mixed_pdf, monkeypatch):
+    import app.services.pdf_extractor as extractor
+    opened = []
+    open_pdf = extractor._open_pdf
+
+    def tracking_open(source):
+        doc = open_pdf(source)
+        opened.append(doc)
+        return doc
+
+    def fail(*args):
+        raise RuntimeError("detection failed")
+
+    monkeypatch.setattr(extractor, "_open_pdf", tracking_open)
+    monkeypatch.setattr(extractor, "_detect_document_layout", fail)
+    with pytest.raises(RuntimeError):
+        extract_text_by_pages(mixed_pdf, workers=1)
+    assert opened and opened[0].is_closed
+
+
+# ── 文件層級排版偵測 ─────────────────────────────────────────────────────────
+
+def _vertical_pdf(path, page_count):
+    import fitz
+    doc = fitz.open()
+    for _ in range(page_count):
+        page = doc.new_page()
+        for col, line in enumerate(["縦書きの台詞です", "次の列の文章"]):
+            page.insert_text((500 - col * 30, 72), "\n".join(line), fontsize=12, fontname="japan")
+    doc.save(str(path))
+    doc.close()
+    return str(path)
+
+
+def test_auto_layout_samples_instead_of_checking_every_page(tmp_path, monkeypatch):
+    import app.services.pdf_extractor as extractor
+    pdf = _vertical_pdf(tmp_path / "vertical.pdf", 20)
+    calls = []
+    original = extractor._has_vertical_text
+    monkeypatch.setattr(
+        extractor, "_has_vertical_text", lambda blocks: calls.append(1) or original(blocks)
+    )
+    stats = {}
+    result = extract_text_by_pages(pdf, workers=1, stats=stats)
+    assert len(calls) == extractor.LAYOUT_SAMPLE_PAGES
+    assert stats["layout"] == "vertical"
+    assert stats["detect_ms"] >= 0
+    assert all(p["paragraphs"] == ["縦書きの台詞です", "次の列の文章"] for p in result)
+
+
+def test_auto_layout_rechecks_pages_that_do_not_fit(mixed_pdf):
+    # 縦横交錯的文件：與文件判斷不符的頁面應逐頁重新偵測
+    result = extract_text_by_pages(mixed_pdf, workers=1)
+    assert result[0]["paragraphs"][0] == "第一章の台詞です"
+    assert result[1]["paragraphs"] == ["Page 2 heading", "first line", "second line"]
+
+
+def test_forced_layout_overrides_detection(mixed_pdf):
+    stats = {}
+    forced = extract_text_by_pages(mixed_pdf, workers=1, layout="horizontal", stats=stats)
+    auto = extract_text_by_pages(mixed_pdf, workers=1)
+    assert stats["layout"] == "horizontal"
+    assert forced[1] == auto[1]
+    assert forced[0] != auto[0]
+
+
+def test_invalid_layout_raises(mixed_pdf):
+    import pytest
+    with pytest.raises(ValueError):
+        extract_text_by_pages(mixed_pdf, layout="diagonal")
+
+
+# ── 頁碼範圍 ─────────────────────────────────────────────────────────────────
+
+def test_extract_page_range_matches_full_slice(mixed_pdf):
+    full = extract_text_by_pages(mixed_pdf, workers=1)
+    stats = {}
+    part = extract_text_by_pages(mixed_pdf, workers=1, first_page=3, last_page=7, stats=stats)
+    assert part == full[2:7]
+    assert stats["total_pages"] == 12
+
+
+def test_extract_page_range_clamps_to_document(mixed_pdf):
+    assert [p["page_num"] for p in extract_text_by_pages(mixed_pdf, first_page=11, last_page=99)] == [11, 12]
+    assert extract_text_by_pages(mixed_pdf, first_page=20) == []
+
+
+def test_parallel_extract_page_range(mixed_pdf, monkeypatch):
+    import app.services.pdf_extractor as extractor
+    monkeypatch.setattr(extractor, "PARALLEL_MIN_PAGES", 1)
+    serial = extract_text_by_pages(mixed_pdf, workers=1, first_page=4, last_page=10)
+    assert extract_text_by_pages(mixed_pdf, workers=2, first_page=4, last_page=10) == serial
@@ -0,0 +1,94 @@
+import random
+
+from app.services import furigana, reading_overrides
+from app.services.reading_overrides import Automaton
+
+
+def _find(entries, text):
+    return [(text[s:s + n], r) for s, n, r in Automaton(entries).find(text)]
+
+
+def test_automaton_finds_all_entries():
+    entries = {"奏": "かなで", "東京": "とうきょう"}
+    assert _find(entries, "奏は東京へ、奏も") == [
+        ("奏", "かなで"), ("東京", "とうきょう"), ("奏", "かなで")
+    ]
+
+
+def test_automaton_prefers_leftmost_longest():
+    entries = {"東京": "A", "東京都": "B", "京都": "C"}
+    assert _find(entries, "東京都") == [("東京都", "B")]
+    assert _find(entries, "東京の京都") == [("東京", "A"), ("京都", "C")]
+
+
+def test_automaton_finds_match_hidden_behind_longer_suffix():
+    # 結尾於同一位置的較長詞條（bcd）與已選的 ab 重疊時，仍要找到 cd
+    assert _find({"ab": "1", "bcd": "2", "cd": "3"}, "abcd") == [("ab", "1"), ("cd", "3")]
+
+
+def test_automaton_matches_brute_force():
+    rng = random.Random(0)
+    alphabet = "あいう漢字"
+    entries = {"".join(rng.choices(alphabet, k=rng.randint(1, 4))): str(i) for i in range(40)}
+    automaton = Automaton(entries)
+    for _ in range(200):
+        text = "".join(rng.choices(alphabet, k=30))
+        expected, i = [], 0
+        while i < len(text):
+            lengths = range(1, min(4, len(text) - i) + 1)
+            length = max((n for n in lengths if text[i:i + n] in entries), default=0)
+            if length:
+                expected.append((i, length, entries[text[i:i + length]]))
+                i += length
+            else:
+                i += 1
+        assert automaton.find(text) == expected
+
+
+def test_overrides_persist_and_reload():
+    reading_overrides.set_override("奏", "かなで")
+    reading_overrides.set_override("東京", "とうきょう")
+    assert reading_overrides.delete_override("東京") is True
+    assert reading_overrides.delete_override("東京") is False
+    reading_overrides.reset()
+    assert reading_overrides.list_overrides() == {"奏": "かなで"}
+
+
+def test_split_text_without_overrides_returns_none():
+    assert reading_overrides.fingerprint() == ""
+    assert reading_overrides.split_text("東京") is None
+
+
+def test_add_furigana_applies_override():
+    before = furigana.add_furigana("奏の声")
+    reading_overrides.set_override("奏", "かなで")
+    after = furigana.add_furigana("奏の声")
+    assert before != after
+    assert after.startswith("<ruby>奏<rp>(</rp><rt>かなで</rt><rp>)</rp></ruby>の")
+    reading_overrides.delete_override("奏")
+    assert furigana.add_furigana("奏の声") == before
+
+
+def test_override_without_kanji_gets_ruby():
+    reading_overrides.set_override("ミク", "みく")
+    assert "<rt>みく</rt>" in furigana.add_furigana("ミクの歌")
+
+
+def test_override_reading_in_katakana_renders_as_hiragana():
+    reading_overrides.set_override("奏", "カナデ")
+    assert "<rt>かなで</rt>" in furigana.add_furigana("奏です")
+
+
+def test_tokens_and_analysis_apply_overrides():
+    reading_overrides.replace_overrides({"奏": "かなで", "ミク": "みく"})
+    text = "奏とミクが東京で歌う"
+    html = furigana.add_furigana(text)
+    assert furigana.render_tokens(furigana.furigana_tokens(text)) == html
+
+    analysis = furigana.analyze_furigana(text)
+    assert ["奏", "カナデ", furigana.OVERRIDE_POS] in analysis
+    assert furigana.render_analysis(analysis) == html
+    assert furigana.analysis_to_tokens(analysis) == furigana.furigana_tokens(text)
+    assert "<rt>カナデ</rt>" in furigana.render_analysis(analysis, reading="katakana")
+    # 不含漢字的自訂讀音不受 known_kanji 影響
+    assert "<rt>みく</rt>" in furigana.render_analysis(analysis, known_kanji="奏東京歌")
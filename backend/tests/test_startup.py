@@ -0,0 +1,40 @@
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services import startup
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+def test_importing_app_defers_heavy_modules():
+    code = (
+        "import json, sys\n"
+        "import app.main\n"
+        "from app.services import furigana\n"
+        "heavy = [m for m in ('fitz', 'numpy', 'anthropic', 'httpx') if m in sys.modules]\n"
+        "print(json.dumps({'heavy': heavy, 'tagger': furigana._tagger is not None}))\n"
+    )
+    out = subprocess.run(
+        [sys.executable, "-c", code], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+    )
+    assert json.loads(out.stdout.splitlines()[-1]) == {"heavy": [], "tagger": False}
+
+
+def test_startup_report_after_warmup():
+    with TestClient(app) as client:
+        assert client.get("/api/health").status_code == 200
+        assert startup.wait_for_warmup(timeout=60)
+        report = client.get("/api/health/startup").json()
+
+    assert {"fastapi", "app.routers.convert", "app.routers.translate", "app.routers.library"} <= (
+        report["imports_ms"].keys()
+    )
+    assert [name for name, _ in startup.WARMUP_STEPS] == list(report["warmup_ms"])
+    assert report["warmup_errors"] == {}
+    assert report["warmup_done"] is True
+    assert report["ready_ms"] > 0
@@ -0,0 +1,52 @@
+import pytest
+
+from app.services import furigana, tokenizers
+from app.services.tokenizers import Feature, Word
+
+
+class _UpperTagger:
+    """測試用後端：整段視為一個詞，讀音固定"""
+
+    dictionary_info = [{"filename": "upper", "size": 0, "version": "1"}]
+
+    def __call__(self, text):
+        return [Word(text, Feature("カンジ", "名詞"))]
+
+
+@pytest.fixture
+def restore_backend():
+    original, factory = furigana.get_tagger(), furigana._tagger_factory
+    active = tokenizers._active
+    yield
+    furigana.set_tagger(original, factory)
+    tokenizers._active = active
+    tokenizers._BACKENDS.pop("upper", None)
+
+
+def test_default_backend_is_fugashi():
+    assert tokenizers.active_backend() == "fugashi"
+    assert "fugashi" in tokenizers.available_backends()
+
+
+def test_unknown_backend_raises():
+    with pytest.raises(ValueError):
+        tokenizers.backend_factory("nope")
+
+
+def test_backend_with_missing_module_is_unavailable(restore_backend):
+    tokenizers.register_backend("upper", _UpperTagger, module="no_such_module_xyz")
+    assert "upper" in tokenizers.backend_names()
+    assert "upper" not in tokenizers.available_backends()
+
+
+def test_use_backend_switches_furigana(restore_backend):
+    before = furigana.add_furigana("漢字")
+    tokenizers.register_backend("upper", _UpperTagger)
+    tokenizers.use_backend("upper")
+    assert tokenizers.active_backend() == "upper"
+    assert furigana.add_furigana("漢字") == "<ruby>漢字<rp>(</rp><rt>かんじ</rt><rp>)</rp></ruby>"
+    assert furigana.analyze_furigana("漢字") == [["漢字", "カンジ", "名詞"]]
+    # 新的 tagger 由後端的建構函式建立
+    assert isinstance(furigana.get_tagger(), _UpperTagger)
+    tokenizers.use_backend("fugashi")
+    assert furigana.add_furigana("漢字") == before
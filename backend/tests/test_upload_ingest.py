@@ -0,0 +1,72 @@
+from pathlib import Path
+
+import pytest
+
+import app.services.upload_ingest as ingest
+from app.services.pdf_extractor import extract_text_by_pages
+from benchmarks.bench_pdf_extractor import peak_rss_mb, reset_peak_rss
+
+
+class _FakeUpload:
+    """模擬 UploadFile：以固定內容產生 total 個位元組，本身不保留整份資料"""
+
+    def __init__(self, total: int, fill: bytes = b"\0"):
+        self.remaining = total
+        self.fill = fill
+
+    async def read(self, size: int = -1) -> bytes:
+        if size < 0:
+            size = self.remaining
+        n = min(size, self.remaining)
+        self.remaining -= n
+        return self.fill * n
+
+
+class _BytesUpload:
+    def __init__(self, data: bytes):
+        self.data = data
+        self.pos = 0
+
+    async def read(self, size: int = -1) -> bytes:
+        end = len(self.data) if size < 0 else self.pos + size
+        chunk = self.data[self.pos:end]
+        self.pos += len(chunk)
+        return chunk
+
+
+async def test_small_upload_stays_in_memory(mixed_pdf):
+    data = Path(mixed_pdf).read_bytes()
+    source = await ingest.ingest_pdf_upload(_BytesUpload(data))
+    assert source == data
+    assert extract_text_by_pages(source) == extract_text_by_pages(mixed_pdf)
+    ingest.release_pdf_source(source)
+
+
+async def test_large_upload_spools_to_disk(mixed_pdf, monkeypatch):
+    monkeypatch.setattr(ingest, "CHUNK_SIZE", 512)
+    monkeypatch.setattr(ingest, "SPOOL_THRESHOLD", 1024)
+    data = Path(mixed_pdf).read_bytes()
+    source = await ingest.ingest_pdf_upload(_BytesUpload(data))
+    assert isinstance(source, str)
+    assert Path(source).read_bytes() == data
+    assert extract_text_by_pages(source) == extract_text_by_pages(data)
+    ingest.release_pdf_source(source)
+    assert not Path(source).exists()
+
+
+async def test_spooled_upload_peak_rss_is_bounded(monkeypatch):
+    if not reset_peak_rss():
+        pytest.skip("需要 /proc/self/clear_refs 才能量測 peak RSS")
+    monkeypatch.setattr(ingest, "SPOOL_THRESHOLD", 4 * 1024 * 1024)
+    total = 128 * 1024 * 1024
+
+    before = peak_rss_mb()
+    source = await ingest.ingest_pdf_upload(_FakeUpload(total))
+    peak_growth_mb = peak_rss_mb() - before
+    try:
+        assert Path(source).stat().st_size == total
+    finally:
+        ingest.release_pdf_source(source)
+
+    # 128 MB 上傳只應佔用約 threshold + chunk 的記憶體
+    assert peak_growth_mb < 32, f"peak RSS 增加 {peak_growth_mb:.1f} MB"
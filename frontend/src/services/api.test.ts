@@ -0,0 +1,36 @@
+import { describe, it, expect, vi, beforeEach } from "vitest";
+import { convertFile } from "./api";
+
+const mockFetch = vi.fn();
+vi.stubGlobal("fetch", mockFetch);
+
+function mockResponse(data: unknown, ok = true, status = 200) {
+  mockFetch.mockResolvedValueOnce({
+    ok,
+    status,
+    json: async () => data,
+  });
+}
+
+beforeEach(() => mockFetch.mockReset());
+
+describe("convertFile", () => {
+  const file = new File(["東京"], "script.txt", { type: "text/plain" });
+
+  it("returns html and page_count", async () => {
+    mockResponse({ html: "<p>x</p>", page_count: 1, cached: false });
+    const result = await convertFile(file);
+    expect(result.html).toBe("<p>x</p>");
+    expect(result.page_count).toBe(1);
+  });
+
+  it("throws detail on error status", async () => {
+    mockResponse({ detail: "只接受 PDF 或 TXT 檔案" }, false, 400);
+    await expect(convertFile(file)).rejects.toThrow("只接受 PDF 或 TXT 檔案");
+  });
+
+  it("throws when the streamed response ends with an error field", async () => {
+    mockResponse({ html: "<section>1</section>", page_count: 3, error: "振り仮名處理失敗: x" });
+    await expect(convertFile(file)).rejects.toThrow("振り仮名處理失敗: x");
+  });
+});
@@ -3,6 +3,8 @@ const API_BASE = "http://localhost:8000/api";
 export interface ConvertResponse {
   html: string;
   page_count: number;
+  // HTML 以串流回應送出；振り仮名中途失敗時狀態碼已是 200，改以此欄位回報
+  error?: string;
 }
 
 export async function convertFile(file: File): Promise<ConvertResponse> {
@@ -19,7 +21,11 @@ export async function convertFile(file: File): Promise<ConvertResponse> {
     throw new Error(error.detail || `HTTP ${response.status}`);
   }
 
-  return response.json();
+  const data: ConvertResponse = await response.json();
+  if (data.error) {
+    throw new Error(data.error);
+  }
+  return data;
 }
 
 export async function translateTexts(
@@ -23,6 +23,7 @@ function mockResponse(data: unknown, ok = true, status = 200) {
   mockFetch.mockResolvedValueOnce({
     ok,
     status,
+    headers: new Headers({ "Content-Type": "application/json" }),
     json: async () => data,
   });
 }
@@ -126,6 +127,32 @@ describe("getDocumentHtml", () => {
     expect(result.html).toBe("<p>test</p>");
     expect(result.page_count).toBe(3);
   });
+
+  it("reads text/html responses and counts pages", async () => {
+    const html =
+      '<section class="page" data-page="1"></section>\n<section class="page" data-page="2"></section>';
+    mockFetch.mockResolvedValueOnce({
+      ok: true,
+      status: 200,
+      headers: new Headers({ "Content-Type": "text/html; charset=utf-8" }),
+      text: async () => html,
+    });
+    const result = await getDocumentHtml("doc-001");
+    expect(result).toEqual({ html, page_count: 2 });
+    const [url, init] = mockFetch.mock.calls[0];
+    expect(url).toContain("doc-001/html");
+    expect(init.headers.Accept).toContain("text/html");
+  });
+
+  it("counts an unpaginated text/html document as one page", async () => {
+    mockFetch.mockResolvedValueOnce({
+      ok: true,
+      status: 200,
+      headers: new Headers({ "Content-Type": "text/html; charset=utf-8" }),
+      text: async () => "<p>test</p>",
+    });
+    expect((await getDocumentHtml("doc-001")).page_count).toBe(1);
+  });
 });
 
 describe("saveTranslations", () => {
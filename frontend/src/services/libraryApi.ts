@@ -109,15 +109,26 @@ export async function uploadDocument(
   return resp.json();
 }
 
+// 與後端相同的頁數計算方式：以頁面 section 計數，沒有分頁時視為一頁
+function countPages(html: string): number {
+  return html.split('<section class="page"').length - 1 || 1;
+}
+
 export async function getDocumentHtml(
   id: string,
 ): Promise<{ html: string; page_count: number }> {
+  // 儲存為 HTML 的文件以 text/html 回傳壓縮檔（Content-Encoding: gzip，
+  // 由瀏覽器解壓縮）；延遲轉換與 token 格式的文件仍回傳 JSON
   const resp = await fetch(`${API_BASE}/documents/${id}/html`, {
-    headers: { "Content-Type": "application/json" },
+    headers: { Accept: "text/html, application/json;q=0.9" },
   });
   if (!resp.ok) {
     const err = await resp.json().catch(() => ({ detail: "未知錯誤" }));
     throw new Error(err.detail || `HTTP ${resp.status}`);
   }
+  if (resp.headers.get("Content-Type")?.startsWith("text/html")) {
+    const html = await resp.text();
+    return { html, page_count: countPages(html) };
+  }
   return resp.json();
 }